@@ -1,27 +1,44 @@
 import base64
-from flask import Flask, Response, render_template, request, jsonify
+import gzip
+import json
+import math
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
-import cv2
 import threading
 import time
 from datetime import datetime, timedelta
 import pytz
-from instance.models import db, Zone, ZoneCount, Camera
-from modules.people_counter_new import PeopleCounterNew
+from instance.models import db, Zone, Camera, ZONE_TYPES, upgrade_schema
+from instance.storage import (SQLiteStorage, configure_engine, from_db_time, to_db_time, insert_zone_counts,
+                              query_active_zones, query_latest_counts, backfill_zone_latest, query_range_summary, query_count_series,
+                              upsert_zone_dwell, query_zone_dwell, ingest_zone_counts)
+from instance.retention import RetentionCompactor
+from instance.export import FORMATS as EXPORT_FORMATS, load_pyarrow, stream_export
+from modules.people_counter_new import PeopleCounterNew, load_backends
+from modules.camera_pool import CameraPool, process_rss_mb
+from modules.inference_scheduler import InferenceScheduler
+from modules.hls_output import HLSOutput
+from modules.event_log import EventLog
+from modules.response_cache import ResponseCache
+from modules.occupancy_heatmap import CELL_SIZE, OccupancyHeatmap, render_heatmap
+from modules.frame_broker import BrokerServer, RemoteCounter
+from modules.async_stream_server import AsyncStreamServer
 import os
 from pathlib import Path
-from sqlalchemy.sql import func
-import torch
+
+STARTED_AT = time.time()
 
 app = Flask(__name__, static_folder='static')
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db' # Comment this if you want to use a fresh db
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///test.db') # Comment this if you want to use a fresh db
 # app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///freshdb.db' # Uncomment this line to use a fresh db
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
 # Global variables
 counter = None
+storage = None  # SQLiteStorage: this process's writer thread + read-only connection pool
+compactor = None  # RetentionCompactor applying RETENTION_POLICY to the count history
 lock = threading.Lock()
 camera_url = "https://cctvjss.jogjakota.go.id/malioboro/NolKm_Utara.stream/playlist.m3u8"
 # camera_url = "https://cctvjss.jogjakota.go.id/malioboro/NolKm_GdAgung.stream/playlist.m3u8"
@@ -30,6 +47,42 @@ zones_data = []
 is_running = True
 current_camera_id = None
 
+# Counters are built in the background (loading YOLO and opening the camera takes seconds)
+pipeline_lock = threading.Lock()  # Serializes counter (re)initialization
+pending_lock = threading.Lock()  # Guards pipelines_pending
+pipelines_pending = 0  # Background builds queued or running
+pipeline_states = {}  # {camera_id: {'state': loading|running|failed|stopped, 'since': ..., ...}}
+startup_timings = {}  # Seconds since process start of the startup milestones
+zone_count_thread = None
+pipeline_memory = {}  # {model: largest RSS growth seen while building a pipeline, MB}
+
+# Recently used cameras stay warm in standby (low fps, capture open, tracker state kept)
+# so switching back to them is instant; limited in number and estimated memory
+CAMERA_POOL_CONFIG = {
+    'size': int(os.environ.get('CAMERA_POOL_SIZE', 3)),
+    'memory_mb': float(os.environ['CAMERA_POOL_MEMORY_MB']) if os.environ.get('CAMERA_POOL_MEMORY_MB') else None,
+    'standby_fps': 2.0
+}
+camera_pool = CameraPool(CAMERA_POOL_CONFIG['size'], CAMERA_POOL_CONFIG['memory_mb'], CAMERA_POOL_CONFIG['standby_fps'])
+
+# Running cameras take turns on INFERENCE_SLOTS concurrent inferences, by deadline and priority
+inference_scheduler = InferenceScheduler(slots=int(os.environ.get('INFERENCE_SLOTS', 1)))
+
+# Process roles: 'standalone' counts and serves in one process; 'counter' additionally runs the
+# frame broker so any number of 'web' worker processes can serve from its counter
+APP_ROLE = os.environ.get('APP_ROLE', 'standalone')
+BROKER_SOCKET = os.environ.get('BROKER_SOCKET', os.path.join(app.instance_path, 'counter.sock'))
+broker = None  # BrokerServer of the counting process
+broker_connected = None  # Web workers: whether the last sync reached the counting process
+last_broker_sync = 0
+# asyncio server for /video_feed, /setup-feed and live stats on its own port (thousands of viewers per process)
+STREAM_PORT = os.environ.get('STREAM_PORT')
+stream_server = None
+
+# Counter methods and attributes web workers may use through the broker
+REMOTE_COUNTER_API = {'current_stats', 'annotation_metrics', 'capture_metrics', 'update_zones',
+                      'update_single_zone', 'add_single_zone', 'delete_zone', 'frame_count', 'debug_overlay'}
+
 # Add this near the top with other global variables
 AVAILABLE_MODELS = {
     'yolov8n': {
@@ -49,28 +102,238 @@ AVAILABLE_MODELS = {
 # Default model
 CURRENT_MODEL = 'yolo11s'
 
-DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
-print(f"Using device: {DEVICE}")
-if DEVICE == 'cuda':
-    print(f"GPU: {torch.cuda.get_device_name()}")
+# HLS output of the annotated stream, served from <instance>/hls/<camera_id>/
+HLS_CONFIG = {
+    'enabled': False,
+    'fps': 15,
+    'segment_seconds': 2,
+    'playlist_size': 6,
+    'bitrate': '1500k'
+}
+# Count history retention: raw 1 Hz rows, then minute rollups, then hourly rollups forever
+RETENTION_POLICY = {
+    'raw_days': 7,
+    'minute_days': 90
+}
+
+HLS_ROOT = os.path.join(app.instance_path, 'hls')
+# Decoder threads per camera stream (unset: OpenCV's default of one per CPU, which adds up with many
+# cameras; 1: decode in the capture thread) and hardware decoding where the backend supports it
+DECODE_THREADS = int(os.environ['DECODE_THREADS']) if os.environ.get('DECODE_THREADS') else None
+DECODE_HW_ACCEL = os.environ.get('DECODE_HW_ACCEL', '0') == '1'
+
+hls_output = None
+
+# Per-track entry/exit event logs, one directory per camera under <instance>/events/
+EVENTS_ROOT = os.path.join(app.instance_path, 'events')
+event_logs = {}  # {camera_id: EventLog}
+
+# Shared secret edge workers send in X-Ingest-Token (ingest endpoints are open if unset)
+INGEST_TOKEN = os.environ.get('INGEST_TOKEN')
+
+# Serialized /stats and /graph-data responses. Windows that ended more than HISTORY_SETTLE_SECONDS ago
+# never change and are kept until evicted or invalidated (zone edits, compaction, ingest into the past);
+# windows reaching the live edge are kept for RESPONSE_CACHE_TTL seconds
+RESPONSE_CACHE_MB = float(os.environ.get('RESPONSE_CACHE_MB', 64))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 1))
+HISTORY_SETTLE_SECONDS = 60
+# Web workers don't see the other processes' invalidations, so their historical entries expire too
+WEB_HISTORY_TTL = 300
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * 1024 * 1024))
 
-def init_database():
-    """Initialize database tables"""
+# Occupancy heatmap snapshots, one <camera_id>.npz per camera under <instance>/heatmaps/
+HEATMAP_ROOT = os.path.join(app.instance_path, 'heatmaps')
+HEATMAP_SAVE_INTERVAL = 60  # Seconds between snapshots of the running cameras' heatmaps
+
+
+def init_database(maintenance=True):
+    """Initialize database tables and the storage service (plus backfill and compaction if `maintenance`)"""
+    global storage, compactor
+    
     try:
         with app.app_context():
+            configure_engine(db.engine)  # WAL and pragmas for the ORM connections too
             db.create_all()
+            upgrade_schema()
+            storage = SQLiteStorage(db.engine.url.database)
+            storage.start()
+            if maintenance:
+                filled = storage.write(backfill_zone_latest)
+                if filled:
+                    print(f"Backfilled latest counts for {filled} zones")
+                compactor = RetentionCompactor(storage, RETENTION_POLICY)
+                # Rollups replace raw rows, which changes the answers for compacted windows
+                compactor.on_compacted.append(response_cache.invalidate)
+                compactor.start()
+            startup_timings['database_ready_s'] = round(time.time() - STARTED_AT, 3)
             print(f"Database initialized successfully.")
     except Exception as e:
         print(f"Error initializing database: {e}")
         raise
 
-def initialize_counter():
-    """Initialize or reinitialize the people counter"""
-    global counter, camera_url, is_running, current_camera_id
+def validate_zone_geometry(zone_type, points):
+    """Check that a zone's points fit its type (polygon or tripwire line)"""
+    if zone_type not in ZONE_TYPES:
+        raise ValueError(f"Invalid zone type: {zone_type}")
+    if zone_type == 'line' and len(points) != 2:
+        raise ValueError("A line zone needs exactly 2 points")
+    if zone_type == 'polygon' and len(points) < 3:
+        raise ValueError("A polygon zone needs at least 3 points")
+
+def get_event_log(camera_id):
+    """Get (and start on first use) the event log a camera's counter writes to"""
+    if camera_id not in event_logs:
+        event_log = EventLog(os.path.join(EVENTS_ROOT, str(camera_id)))
+        event_log.start()
+        event_logs[camera_id] = event_log
+    return event_logs[camera_id]
+
+def query_event_log(camera_id):
+    """The event log of a camera for queries: the running one, else a read-only one that creates nothing"""
+    return event_logs.get(camera_id) or EventLog(os.path.join(EVENTS_ROOT, str(camera_id)), read_only=True)
+
+def heatmap_path(camera_id):
+    return os.path.join(HEATMAP_ROOT, f"{camera_id}.npz")
+
+def get_heatmap(camera_id):
+    """Broker handler too: the live heatmap grid of a pooled camera, else its last snapshot (None if neither)"""
+    pooled = dict(camera_pool.counters()).get(camera_id)
+    if pooled is not None:
+        return pooled.heatmap.snapshot()
+    heatmap = OccupancyHeatmap()
+    return heatmap.snapshot() if heatmap.load(heatmap_path(camera_id)) else None
+
+def parse_iso_time(value):
+    """Parse an ISO 8601 timestamp (with optional 'Z') into an aware UTC datetime"""
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return dt.replace(tzinfo=pytz.UTC) if dt.tzinfo is None else dt.astimezone(pytz.UTC)
+
+def cached_response(key, camera_id, start_dt, end_dt, build):
+    """Serve the JSON of build() through the response cache; `end_dt` None means the window reaches now"""
+    body = response_cache.get(key)
+    if body is not None:
+        return Response(body, mimetype='application/json', headers={'X-Cache': 'hit'})
     
-    if counter is not None:
-        counter.stop()
+    generation = response_cache.generation
+    response = jsonify(build())
+    epoch = lambda dt: (dt if dt.tzinfo else dt.replace(tzinfo=pytz.UTC)).timestamp()
+    historical = end_dt is not None and epoch(end_dt) < time.time() - HISTORY_SETTLE_SECONDS
+    if historical:
+        ttl = WEB_HISTORY_TTL if APP_ROLE == 'web' else None
+    else:
+        ttl, end_dt = RESPONSE_CACHE_TTL, None
+    response_cache.put(key, response.get_data(), generation, ttl=ttl, camera_id=camera_id,
+                       start=epoch(start_dt) if start_dt else None, end=epoch(end_dt) if end_dt else None)
+    response.headers['X-Cache'] = 'miss'
+    return response
+
+def set_pipeline_state(camera_id, state, **details):
+    """Record a camera pipeline's lifecycle state for /readyz"""
+    if state in ('loading', 'running'):
+        # Only one camera is current: the others are either warm in the camera pool or stopped
+        for other_id, other in list(pipeline_states.items()):
+            if other_id != camera_id and other['state'] in ('loading', 'running'):
+                set_pipeline_state(other_id, 'standby' if other_id in camera_pool else 'stopped')
+    pipeline_states[camera_id] = dict(state=state, since=datetime.now(pytz.UTC).isoformat(), **details)
+
+def start_pipeline():
+    """(Re)build the counter for the current camera on a background thread"""
+    global pipelines_pending
+    
+    if APP_ROLE == 'web':
+        # The counting process owns the pipeline
+        counter.call('switch_pipeline', current_camera_id, CURRENT_MODEL)
+        return
+    
+    def build():
+        global pipelines_pending
+        try:
+            with pipeline_lock:
+                initialize_counter()
+        except Exception as e:
+            print(f"Error initializing pipeline: {e}")
+        finally:
+            with pending_lock:
+                pipelines_pending -= 1
+    
+    with pending_lock:
+        pipelines_pending += 1
+    threading.Thread(target=build, daemon=True).start()
+
+def stop_pipeline(camera_id):
+    """Stop counting when no camera is left"""
+    global counter
+    
+    if APP_ROLE == 'web':
+        counter.call('switch_pipeline', None)
+        return
+    with pipeline_lock:
+        detach_hls_output()
+        counter = None
+        stop_counters(camera_pool.clear())
+        set_pipeline_state(camera_id, 'stopped')
+
+def stop_counters(evicted):
+    """Stop the counters evicted from the camera pool"""
+    for camera_id, evicted_counter in evicted:
+        evicted_counter.stop()
+        evicted_counter.heatmap.save(heatmap_path(camera_id))
+        if pipeline_states.get(camera_id, {}).get('state') in ('running', 'standby'):
+            set_pipeline_state(camera_id, 'stopped')
+        print(f"Stopped pipeline of camera {camera_id}")
+
+def load_zone_configs(camera_id):
+    """Zone configurations of a camera with their last known counts, as PeopleCounterNew takes them (app context)"""
+    # Get zones for the camera
+    active_zones = Zone.query.filter_by(
+        active=True, 
+        camera_id=camera_id
+    ).order_by(Zone.id).all()
+    
+    active_zone_ids = [zone.id for zone in active_zones]
+
+    # Last known counts by zone_id, one primary-key lookup per zone
+    restore_start = time.perf_counter()
+    last_counts_dict = query_latest_counts(storage, active_zone_ids)
+    last_dwell = query_zone_dwell(storage, active_zone_ids)
+    print(f"Restored counts of {len(last_counts_dict)} zones in {(time.perf_counter() - restore_start) * 1000:.1f} ms")
+    # print("LAST COUNT: ", last_counts_dict[14].exits)
+    
+    zones_data = []
+    for zone in active_zones:
+        zone_data = {
+            'id': zone.id,
+            'points': zone.points,
+            'name': zone.name,
+            'type': zone.zone_type
+        }
+        
+        # Add last known counts if available from joined results
+        if zone.id in last_counts_dict:
+            last_count = last_counts_dict[zone.id]
+            zone_data.update({
+                'initial_entries': last_count['entries'],
+                'initial_exits': last_count['exits'],
+                'initial_count': last_count['current_count']
+            })
+            # print("ZONE DATA: ", zone_data)
+        else:
+            # If no previous counts exist, start from 0
+            zone_data.update({
+                'initial_entries': 0,
+                'initial_exits': 0,
+                'initial_count': 0
+            })
+        if zone.id in last_dwell:
+            zone_data['initial_dwell'] = json.loads(last_dwell[zone.id]['sketch'])
         
+        zones_data.append(zone_data)
+    return zones_data
+
+def initialize_counter():
+    """Initialize or reinitialize the people counter, reusing a warm one from the camera pool"""
+    global counter, camera_url, is_running, current_camera_id, zone_count_thread
+    
     # Retrieve zones and their last counts from the database
     with app.app_context():
         # Get current camera
@@ -87,105 +350,166 @@ def initialize_counter():
                 print("Selected camera not available")
                 return
         
-        # Get zones for current camera
-        active_zones = Zone.query.filter_by(
-            active=True, 
-            camera_id=current_camera_id
-        ).order_by(Zone.id).all()
-        
-        active_zone_ids = [zone.id for zone in active_zones]
-
-        latest_counts = db.session.query(
-            ZoneCount,
-            Zone.name,
-            Zone.camera_id
-        ).join(
-            Zone,
-            ZoneCount.zone_id == Zone.id
-        ).filter(
-            Zone.id.in_(active_zone_ids),
-            Zone.camera_id == current_camera_id
-        ).filter(
-            ZoneCount.id.in_(
-                db.session.query(func.max(ZoneCount.id))
-                .group_by(ZoneCount.zone_id)
-            )
-        ).all()
+        # Deleted cameras don't stay warm
+        stop_counters(camera_pool.retain({c.id for c in Camera.query.filter_by(active=True)}))
         
-        # Create a dictionary of last counts by zone_id using joined results
-        last_counts_dict = {count[0].zone_id: count[0] for count in latest_counts}
-        # print("LAST COUNT: ", last_counts_dict[14].exits)
+        # A pooled counter built for the same URL and model is already running: just swap it in
+        switch_start = time.perf_counter()
+        pool_config = (camera.url, CURRENT_MODEL)
+        pooled = camera_pool.get(camera.id, pool_config)
+        if pooled is not None:
+            activate_counter(camera.id, pooled)
+            set_pipeline_state(camera.id, 'running', model=CURRENT_MODEL, source='pool',
+                               switch_ms=round((time.perf_counter() - switch_start) * 1000, 2))
+            print(f"Switched to pooled pipeline of camera {camera.id}")
+            return
         
-        zones_data = []
-        for zone in active_zones:
-            zone_data = {
-                'id': zone.id,
-                'points': zone.points,
-                'name': zone.name
-            }
-            
-            # Add last known counts if available from joined results
-            if zone.id in last_counts_dict:
-                last_count = last_counts_dict[zone.id]
-                zone_data.update({
-                    'initial_entries': last_count.entries,
-                    'initial_exits': last_count.exits,
-                    'initial_count': last_count.current_count
-                })
-                # print("ZONE DATA: ", zone_data)
-            else:
-                # If no previous counts exist, start from 0
-                zone_data.update({
-                    'initial_entries': 0,
-                    'initial_exits': 0,
-                    'initial_count': 0
-                })
-            
-            zones_data.append(zone_data)
-
-    counter = PeopleCounterNew(
-        video_source=camera.url,
-        model_path=AVAILABLE_MODELS[CURRENT_MODEL]['path'],
-        target_fps=30,
-        buffer_size=5,
-        zones=zones_data
-    )
+        zones_data = load_zone_configs(current_camera_id)
+
+    # The previous counter goes to standby while the new one is built
+    build_start = time.time()
+    activate_counter(None, None)
+    set_pipeline_state(camera.id, 'loading', model=CURRENT_MODEL)
+    try:
+        load_backends()  # Imported once per process, so not part of the pipeline's memory
+        rss_before = process_rss_mb()
+        new_counter = PeopleCounterNew(
+            video_source=camera.url,
+            model_path=AVAILABLE_MODELS[CURRENT_MODEL]['path'],
+            target_fps=camera.target_fps,
+            buffer_size=5,
+            zones=zones_data,
+            decode_threads=DECODE_THREADS,
+            hw_accel=DECODE_HW_ACCEL
+        )
+        # RSS growth underestimates builds that reuse memory freed by evicted pipelines
+        if rss_before is not None:
+            pipeline_memory[CURRENT_MODEL] = max(pipeline_memory.get(CURRENT_MODEL, 0.0), process_rss_mb() - rss_before)
+        memory_mb = pipeline_memory.get(CURRENT_MODEL, 0.0)
+    except Exception as e:
+        set_pipeline_state(camera.id, 'failed', model=CURRENT_MODEL, error=str(e))
+        raise
+    new_counter.event_sink = get_event_log(camera.id).append
+    new_counter.heatmap.load(heatmap_path(camera.id))
+    new_counter.inference_budget = inference_scheduler.register(
+        camera.id, camera.target_fps, camera.min_fps, camera.priority)
+    activate_counter(camera.id, new_counter, pool_config, memory_mb)
     if is_running:
-        counter.start()
-        # Start database update thread
-        threading.Thread(target=update_zone_counts, daemon=True).start()
+        # Start the database update thread once; it follows the pooled counters
+        if zone_count_thread is None:
+            zone_count_thread = threading.Thread(target=update_zone_counts, daemon=True)
+            zone_count_thread.start()
+    set_pipeline_state(camera.id, 'running' if is_running else 'stopped', model=CURRENT_MODEL,
+                       source='build', init_s=round(time.time() - build_start, 3))
+    startup_timings.setdefault('first_pipeline_ready_s', round(time.time() - STARTED_AT, 3))
+
+def activate_counter(camera_id, new_counter, pool_config=None, memory_mb=0.0):
+    """Make a counter the current one (None: no current counter) and put the other pooled counters in standby
+
+    `pool_config` adds a newly built counter to the camera pool.
+    """
+    global counter
+    
+    detach_hls_output()
+    with lock:
+        counter = new_counter
+    evicted = camera_pool.activate(camera_id, new_counter if pool_config else None, pool_config, memory_mb)
+    if new_counter is not None:
+        if HLS_CONFIG['enabled']:
+            attach_hls_output()
+        if is_running and new_counter.start_time is None:
+            new_counter.start()
+    stop_counters(evicted)
+
+def apply_camera_budget(camera_id):
+    """Apply a camera's stored fps budget and priority to its running counter, if any"""
+    with app.app_context():
+        camera = Camera.query.get(camera_id)
+        if camera is None:
+            return
+        for pooled_id, pooled_counter in camera_pool.counters():
+            if pooled_id == camera_id and pooled_counter.inference_budget is not None:
+                pooled_counter.target_fps = camera.target_fps
+                pooled_counter.inference_budget.update(camera.target_fps, min(camera.min_fps, camera.target_fps),
+                                                       camera.priority)
+
+def attach_hls_output():
+    """Attach an HLS output for the current camera to the counter using HLS_CONFIG"""
+    global hls_output
+    
+    if hls_output is not None and counter is not None:
+        counter.remove_output(hls_output)
+    hls_output = HLSOutput(
+        os.path.join(HLS_ROOT, str(current_camera_id)),
+        fps=HLS_CONFIG['fps'],
+        segment_seconds=HLS_CONFIG['segment_seconds'],
+        playlist_size=HLS_CONFIG['playlist_size'],
+        bitrate=HLS_CONFIG['bitrate']
+    )
+    counter.add_output(hls_output)
 
-def generate_frames():
+def detach_hls_output():
+    """Stop HLS output for the current counter"""
+    global hls_output
+    
+    if hls_output is not None:
+        if counter is not None:
+            counter.remove_output(hls_output)
+        else:
+            hls_output.close()
+        hls_output = None
+
+def generate_frames(width=None, quality=None, max_fps=None):
     """Generate video frames for streaming"""
     global counter, is_running
     
-    # Ensure counter is initialized
-    if counter is None:
-        initialize_counter()
+    # Wait for the background pipeline build (starting one if nothing is building)
+    if counter is None and pipelines_pending == 0:
+        start_pipeline()
+    while counter is None:
+        if pipelines_pending == 0 and pipeline_states.get(current_camera_id, {}).get('state') != 'running':
+            return  # Build failed or no camera available
+        time.sleep(0.1)
     
     # Make sure processing is started
     if not is_running:
         counter.start()
         is_running = True
     
-    while True:
-        # Get processed frame
-        frame, _ = counter.process_frame()
-        
-        # If no frame is available, wait a bit
-        if frame is None:
-            time.sleep(0.01)
-            continue
-        
-        # Encode frame to JPEG
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
+    # Register as a viewer of this variant so the counter annotates and encodes it
+    subscribed = counter
+    variant = subscribed.broadcaster.subscribe(width, quality)
+    min_interval = 1.0 / max_fps if max_fps else 0
+    last_seq = 0
+    last_sent = 0
+    try:
+        while True:
+            # Follow the counter across camera/model switches
+            if counter is not subscribed and counter is not None:
+                subscribed.broadcaster.unsubscribe(variant)
+                subscribed = counter
+                variant = subscribed.broadcaster.subscribe(width, quality)
+                last_seq = 0
+            
+            # Respect the client's frame rate cap
+            wait = last_sent + min_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            
+            # Block until the next frame is encoded for this variant
+            item = subscribed.broadcaster.wait_for_frame(variant, last_seq, timeout=1.0)
+            if item is None:
+                continue
+            last_seq, frame_bytes, trace = item
+            last_sent = time.time()
             
-        # Yield frame for streaming
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            # Yield frame for streaming
+            subscribed.tracer.complete(trace, "display")
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    finally:
+        # Client disconnected
+        subscribed.broadcaster.unsubscribe(variant)
 
 @app.route('/')
 def index():
@@ -194,8 +518,11 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
-    """Video streaming route"""
-    return Response(generate_frames(),
+    """Video streaming route, optionally downscaled, recompressed or rate limited per client"""
+    return Response(generate_frames(
+                        width=request.args.get('width', type=int),
+                        quality=request.args.get('quality', type=int),
+                        max_fps=request.args.get('max_fps', type=float)),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/stats')
@@ -215,12 +542,11 @@ def get_stats():
                 return jsonify({"error": "No active camera"}), 400
                 
             # Get active zones for current camera
-            active_zones = Zone.query.filter_by(
-                active=True, 
-                camera_id=current_camera_id
-            ).order_by(Zone.id).all()
+            active_zones = query_active_zones(storage, current_camera_id)
             
-            active_zone_ids = [zone.id for zone in active_zones]
+            active_zone_ids = [zone['id'] for zone in active_zones]
+            # Zone IDs and names are part of the responses, so renames in any process make new keys
+            zones_key = tuple((zone['id'], zone['name']) for zone in active_zones)
             
             if time_range or (start_time and end_time):
                 # Calculate time range
@@ -241,71 +567,75 @@ def get_stats():
                 else:
                     start_dt = end_dt - timedelta(minutes=int(time_range))
                 
-                stats = {}
-                for zone in active_zones:
-                    # Get counts within the time range
-                    counts_in_range = db.session.query(ZoneCount).filter(
-                        ZoneCount.zone_id == zone.id,
-                        ZoneCount.timestamp.between(start_dt, end_dt)
-                    ).order_by(ZoneCount.timestamp.asc()).all()
+                def range_stats():
+                    stats = {}
+                    for zone in active_zones:
+                        # First/last rows and peak within the time range, via the (zone_id, timestamp) index
+                        summary = query_range_summary(storage, zone['id'], start_dt, end_dt)
                     
-                    if counts_in_range:
-                        first_count = counts_in_range[0]
-                        last_count = counts_in_range[-1]
+                        if summary:
+                            first_count, last_count, peak_count = summary
                         
-                        entries_diff = last_count.entries - first_count.entries
-                        exits_diff = last_count.exits - first_count.exits
-                        peak_count = max(c.current_count for c in counts_in_range)
+                            entries_diff = last_count['entries'] - first_count['entries']
+                            exits_diff = last_count['exits'] - first_count['exits']
                         
-                        stats[zone.id] = {
-                            'name': zone.name,
-                            'entry': entries_diff,
-                            'exit': exits_diff,
-                            'peak': peak_count,
-                            'current': last_count.current_count,
-                            'camera_id': zone.camera_id
-                        }
-                    else:
-                        stats[zone.id] = {
-                            'name': zone.name,
-                            'entry': 0,
-                            'exit': 0,
-                            'peak': 0,
-                            'current': None,
-                            'camera_id': zone.camera_id
-                        }
+                            stats[zone['id']] = {
+                                'name': zone['name'],
+                                'entry': entries_diff,
+                                'exit': exits_diff,
+                                'peak': peak_count,
+                                'current': last_count['current_count'],
+                                'camera_id': zone['camera_id']
+                            }
+                        else:
+                            stats[zone['id']] = {
+                                'name': zone['name'],
+                                'entry': 0,
+                                'exit': 0,
+                                'peak': 0,
+                                'current': None,
+                                'camera_id': zone['camera_id']
+                            }
                 
-                return jsonify(stats)
+                    return stats
+                
+                if start_time and end_time:
+                    key = ('stats', current_camera_id, zones_key, start_dt.isoformat(), end_dt.isoformat())
+                    return cached_response(key, current_camera_id, start_dt, end_dt, range_stats)
+                key = ('stats', current_camera_id, zones_key, 'range', time_range)
+                return cached_response(key, current_camera_id, start_dt, None, range_stats)
             else:
-                # Get latest counts for current camera's zones
-                latest_counts = db.session.query(
-                    ZoneCount,
-                    Zone.name,
-                    Zone.camera_id
-                ).join(
-                    Zone,
-                    ZoneCount.zone_id == Zone.id
-                ).filter(
-                    Zone.id.in_(active_zone_ids),
-                    Zone.camera_id == current_camera_id
-                ).filter(
-                    ZoneCount.id.in_(
-                        db.session.query(func.max(ZoneCount.id))
-                        .group_by(ZoneCount.zone_id)
-                    )
-                ).all()
-
-                stats = {}
-                for count, zone_name, camera_id in latest_counts:
-                    stats[count.zone_id] = {
-                        'name': zone_name,
-                        'entry': count.entries,
-                        'exit': count.exits,
-                        'current': count.current_count,
-                        'camera_id': camera_id
-                    }
+                def latest_stats():
+                    # Get latest counts for current camera's zones
+                    latest_counts = query_latest_counts(storage, active_zone_ids)
+                    latest_dwell = query_zone_dwell(storage, active_zone_ids)
+
+                    stats = {}
+                    for zone in active_zones:
+                        count = latest_counts.get(zone['id'])
+                        if count is None:
+                            continue
+                        stats[zone['id']] = {
+                            'name': zone['name'],
+                            'entry': count['entries'],
+                            'exit': count['exits'],
+                            'current': count['current_count'],
+                            'camera_id': zone['camera_id']
+                        }
+                        dwell = latest_dwell.get(zone['id'])
+                        if dwell is not None:
+                            stats[zone['id']]['dwell'] = {
+                                'count': dwell['count'],
+                                'mean_s': dwell['mean_seconds'],
+                                'p50_s': dwell['p50_seconds'],
+                                'p90_s': dwell['p90_seconds'],
+                                'p99_s': dwell['p99_seconds']
+                            }
+                
+                    return stats
                 
-                return jsonify(stats)
+                key = ('stats', current_camera_id, zones_key, 'latest')
+                return cached_response(key, current_camera_id, None, None, latest_stats)
                     
         except Exception as e:
             print(f"Error in get_stats: {str(e)}")
@@ -354,12 +684,15 @@ def manage_zones():
                             
                             zone_name = zone_data.get('name', f'Zone {len(zones_to_update)+1}')
                             zone_id = zone_data.get('id')
+                            zone_type = zone_data.get('type', 'polygon')
+                            validate_zone_geometry(zone_type, points)
                             
                             if zone_id and zone_id in existing_zones:
                                 # Update existing zone
                                 zone = existing_zones[zone_id]
                                 zone.points = points
                                 zone.name = zone_name
+                                zone.zone_type = zone_type
                                 zone.active = True
                                 zones_to_update.append(zone)
                             else:
@@ -367,6 +700,7 @@ def manage_zones():
                                 zone = Zone(
                                     name=zone_name,
                                     points=points,
+                                    zone_type=zone_type,
                                     active=True,
                                     camera_id=current_camera_id
                                 )
@@ -384,6 +718,7 @@ def manage_zones():
                     
                     # Commit changes
                     db.session.commit()
+                    response_cache.invalidate(current_camera_id)
                     
                     # Update counter with active zones
                     with lock:
@@ -391,7 +726,8 @@ def manage_zones():
                             zone_configs = [{
                                 'points': zone.points,
                                 'name': zone.name,
-                                'id': zone.id
+                                'id': zone.id,
+                                'type': zone.zone_type
                             } for zone in zones_to_update]
                             counter.update_zones(zone_configs)
                     
@@ -408,7 +744,7 @@ def manage_zones():
     elif request.method == 'GET':
         try:
             with app.app_context():
-                zones = current_camera_id.all()
+                zones = Zone.query.filter_by(camera_id=current_camera_id, active=True).all()
                 return jsonify([zone.to_dict() for zone in zones])
         except Exception as e:
             print(f"Error fetching zones: {str(e)}")
@@ -432,6 +768,7 @@ def manage_single_zone(zone_id):
                 # Deactivate zone instead of deleting
                 zone.active = False
                 db.session.commit()
+                response_cache.invalidate(current_camera_id)
                 
                 # Update counter
                 with lock:
@@ -454,22 +791,16 @@ def manage_single_zone(zone_id):
                             points.append([int(float(point['x'])), int(float(point['y']))])
                         elif isinstance(point, list):
                             points.append([int(float(point[0])), int(float(point[1]))])
+                    validate_zone_geometry(zone.zone_type, points)
                     zone.points = points
                     
                 db.session.commit()
+                response_cache.invalidate(current_camera_id)
                 
-                # Update counter
+                # Update counter; the zone keeps its live counts
                 with lock:
                     if counter is not None:
-                        last_count = ZoneCount.query.filter_by(zone_id=zone_id).order_by(ZoneCount.timestamp.desc()).first()
-                        counter.update_single_zone(
-                            zone_id,
-                            name=zone.name,
-                            points=zone.points,
-                            initial_entries=last_count.entries if last_count else 0,
-                            initial_exits=last_count.exits if last_count else 0,
-                            initial_count=last_count.current_count if last_count else 0
-                        )
+                        counter.update_single_zone(zone_id, name=zone.name, points=zone.points)
                 
                 return jsonify({"status": "success"})
                 
@@ -493,23 +824,29 @@ def add_zone():
                     points.append([int(point[0]), int(point[1])])
                 else:
                     raise ValueError(f"Invalid point format: {point}")
+            zone_type = data.get('type', 'polygon')
+            validate_zone_geometry(zone_type, points)
             # Create new zone in database
             zone = Zone(
                 name=data.get('name', f'Zone {Zone.query.filter_by(camera_id=current_camera_id).count() + 1}'),
                 points=points,
+                zone_type=zone_type,
                 active=True,
                 camera_id=current_camera_id  # Add this line
             )
             db.session.add(zone)
             db.session.commit()
             
+            response_cache.invalidate(current_camera_id)
+            
             # Add to counter
             with lock:
                 if counter is not None:
                     counter.add_single_zone(
                         points=zone.points,
                         name=zone.name,
-                        id=zone.id
+                        id=zone.id,
+                        zone_type=zone.zone_type
                     )
             
             return jsonify({"status": "success", "zone_id": zone.id})
@@ -536,45 +873,50 @@ def setup_polygons():
 @app.route('/setup-feed')
 def setup_feed():
     """Video streaming route for setup page with current zones overlay"""
-    def generate():
-        while True:
-            frame, _ = counter.process_frame()  # This already includes zone visualization
-            if frame is not None:
-                ret, buffer = cv2.imencode('.jpg', frame)
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.01)
-            
-    return Response(generate(),
+    # The annotated feed already includes zone visualization
+    return Response(generate_frames(),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
 # Database update thread
 def update_zone_counts():
     """Update zone counts in database periodically"""
+    last_heatmap_save = time.time()
+    dwell_written = {}  # {zone_id: dwell count last stored}, so unchanged sketches aren't rewritten
     while True:
-        if counter and is_running:
+        # Standby cameras in the pool keep counting too, so their history has no gaps
+        for camera_id, pooled_counter in camera_pool.counters() if is_running else []:
             try:
+                # Read the live counts without consuming frames meant for viewers
                 with lock:
-                    _, stats = counter.process_frame()
+                    stats, trace = pooled_counter.current_stats()
                     # print("STATS FROM COUNTER", stats)
                 
-                current_time = datetime.now(pytz.UTC)
-                        
-                with app.app_context():
-                    for zone_id, zone_data in stats.items():
-                        count = ZoneCount(
-                            zone_id=zone_id,
-                            timestamp=current_time,
-                            entries=zone_data['entry'],
-                            exits=zone_data['exit'],
-                            current_count=zone_data['current']
-                        )
-                        db.session.add(count)
-                    db.session.commit()
+                current_time = to_db_time(datetime.now(pytz.UTC))
+                
+                # Queue the rows for the storage writer thread
+                write = storage.submit(insert_zone_counts, current_time, stats)
+                write.add_done_callback(
+                    lambda done, tracer=pooled_counter.tracer, trace=trace:
+                        done.exception() is None and tracer.complete(trace, "persist"))
+                
+                # Dwell summaries of the zones where a track left since the last write
+                dwell = {zone_id: data['dwell'] for zone_id, data in stats.items()
+                         if data.get('dwell', {}).get('count') and data['dwell']['count'] != dwell_written.get(zone_id)}
+                if dwell:
+                    zone_dwell = pooled_counter.zones.dwell
+                    sketches = {zone_id: zone_dwell[zone_id].to_dict() for zone_id in dwell if zone_id in zone_dwell}
+                    storage.submit(upsert_zone_dwell, current_time, dwell, sketches)
+                    dwell_written.update((zone_id, summary['count']) for zone_id, summary in dwell.items())
             except Exception as e:
-                print(f"Error updating database: {e}")
+                print(f"Error updating database for camera {camera_id}: {e}")
+        
+        if time.time() - last_heatmap_save >= HEATMAP_SAVE_INTERVAL:
+            last_heatmap_save = time.time()
+            for camera_id, pooled_counter in camera_pool.counters():
+                try:
+                    pooled_counter.heatmap.save(heatmap_path(camera_id))
+                except Exception as e:
+                    print(f"Error saving heatmap of camera {camera_id}: {e}")
                 
         time.sleep(1.0)  # Update every second
         
@@ -585,43 +927,378 @@ def get_graph_data():
         start_time = request.args.get('start_time')
         end_time = request.args.get('end_time')
         
-        with app.app_context():
-            # Get active zones first
-            active_zones = Zone.query.filter_by(active=True, camera_id=current_camera_id).all()
-            
-            # Convert times to UTC datetime
-            start_dt = datetime.fromisoformat(start_time).replace(tzinfo=pytz.UTC) if start_time else None
-            end_dt = datetime.fromisoformat(end_time).replace(tzinfo=pytz.UTC) if end_time else None
-            
-            # Build query
-            query = ZoneCount.query
-            if start_dt:
-                query = query.filter(ZoneCount.timestamp >= start_dt)
-            if end_dt:
-                query = query.filter(ZoneCount.timestamp <= end_dt)
-            
+        # Get active zones first
+        active_zones = query_active_zones(storage, current_camera_id)
+        
+        # Convert times to UTC datetime
+        start_dt = datetime.fromisoformat(start_time).replace(tzinfo=pytz.UTC) if start_time else None
+        end_dt = datetime.fromisoformat(end_time).replace(tzinfo=pytz.UTC) if end_time else None
+        
+        def graph_data():
             # Get data for each zone
             data = {}
             for zone in active_zones:
-                zone_counts = query.filter_by(zone_id=zone.id).order_by(ZoneCount.timestamp).all()
-                data[zone.id] = {
-                    'name': zone.name,
-                    'entries': [{'t': count.timestamp.isoformat(), 'y': count.entries} for count in zone_counts],
-                    'exits': [{'t': count.timestamp.isoformat(), 'y': count.exits} for count in zone_counts],
-                    'current': [{'t': count.timestamp.isoformat(), 'y': count.current_count} for count in zone_counts]
+                zone_counts = query_count_series(storage, zone['id'], start_dt, end_dt)
+                times = [from_db_time(count['timestamp']).isoformat() for count in zone_counts]
+                data[zone['id']] = {
+                    'name': zone['name'],
+                    'entries': [{'t': t, 'y': count['entries']} for t, count in zip(times, zone_counts)],
+                    'exits': [{'t': t, 'y': count['exits']} for t, count in zip(times, zone_counts)],
+                    'current': [{'t': t, 'y': count['current_count']} for t, count in zip(times, zone_counts)]
                 }
-            
-            return jsonify(data)
+            return data
+        
+        key = ('graph-data', current_camera_id, tuple((zone['id'], zone['name']) for zone in active_zones),
+               start_dt.isoformat() if start_dt else None, end_dt.isoformat() if end_dt else None)
+        return cached_response(key, current_camera_id, start_dt, end_dt, graph_data)
             
     except Exception as e:
         print(f"Error getting graph data: {e}")
         return jsonify({"error": str(e)}), 500
     
+@app.route('/export', methods=['GET'])
+def export_counts():
+    """Stream the count history of zones or cameras (raw counts and rollups) as CSV or Parquet"""
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": f"Unknown format: {export_format}"}), 400
+        if export_format == 'parquet':
+            try:
+                load_pyarrow()
+            except ImportError:
+                return jsonify({"error": "Parquet export requires pyarrow (pip install pyarrow)"}), 400
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        filters = {
+            'zone_ids': request.args.getlist('zone_id', type=int),
+            'camera_ids': request.args.getlist('camera_id', type=int),
+            'start': parse_iso_time(start_time) if start_time else None,
+            'end': parse_iso_time(end_time) if end_time else None
+        }
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def generate():
+        try:
+            yield from stream_export(storage, export_format, **filters)
+        except Exception as e:
+            # Headers are already sent; the truncated download is the only signal left
+            print(f"Error exporting counts: {e}")
+    
+    return Response(generate(), mimetype=EXPORT_FORMATS[export_format], headers={
+        'Content-Disposition': f'attachment; filename=zone_counts.{export_format}'
+    })
+
+@app.route('/events', methods=['GET'])
+def get_events():
+    """Get exact entry/exit counts (optionally bucketed, or the raw events) for a time range"""
+    try:
+        camera_id = request.args.get('camera_id', default=current_camera_id, type=int)
+        if camera_id is None:
+            return jsonify({"error": "No active camera"}), 400
+        
+        end_dt = parse_iso_time(request.args['end_time']) if 'end_time' in request.args else datetime.now(pytz.UTC)
+        start_dt = parse_iso_time(request.args['start_time']) if 'start_time' in request.args else end_dt - timedelta(hours=1)
+        zone_ids = request.args.getlist('zone_id', type=int) or None
+        bucket = request.args.get('bucket', type=int)
+        if bucket is not None and bucket <= 0:
+            return jsonify({"error": "bucket must be positive"}), 400
+        
+        event_log = query_event_log(camera_id)
+        if request.args.get('raw') in ('1', 'true'):
+            limit = request.args.get('limit', default=1000, type=int)
+            events = event_log.query(start_dt.timestamp(), end_dt.timestamp(), zone_ids)
+            return jsonify({
+                'total': int(events.size),
+                'events': [{
+                    't': datetime.fromtimestamp(event['timestamp'], pytz.UTC).isoformat(),
+                    'track_id': int(event['track_id']),
+                    'zone_id': int(event['zone_id']),
+                    'kind': 'entry' if event['kind'] > 0 else 'exit'
+                } for event in events[:limit]]
+            })
+        
+        return jsonify(event_log.aggregate(start_dt.timestamp(), end_dt.timestamp(), zone_ids, bucket))
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error getting events: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+@app.route('/heatmap', methods=['GET'])
+def get_heatmap_image():
+    """Get where people linger on a camera, as a color-mapped PNG or the raw grid of person-seconds"""
+    try:
+        camera_id = request.args.get('camera_id', default=current_camera_id, type=int)
+        if camera_id is None:
+            return jsonify({"error": "No active camera"}), 400
+        
+        # The pooled counters live in the counting process
+        grid = counter.call('heatmap', camera_id) if APP_ROLE == 'web' else get_heatmap(camera_id)
+        if grid is None:
+            return jsonify({"error": f"No heatmap for camera {camera_id}"}), 404
+        
+        if request.args.get('format') == 'json':
+            return jsonify({
+                'camera_id': camera_id,
+                'cell': CELL_SIZE,
+                'rows': grid.shape[0],
+                'columns': grid.shape[1],
+                'grid': grid.round(3).tolist()
+            })
+        png = render_heatmap(grid, request.args.get('width', type=int))
+        return Response(png, mimetype='image/png')
+        
+    except Exception as e:
+        print(f"Error getting heatmap: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+def check_ingest_token():
+    """Error response if the request lacks the configured ingest token, else None"""
+    if INGEST_TOKEN and request.headers.get('X-Ingest-Token') != INGEST_TOKEN:
+        return jsonify({"error": "Invalid ingest token"}), 403
+    return None
+
+@app.route('/ingest/config', methods=['GET'])
+def get_ingest_config():
+    """Cameras and zones (with last known counts) an edge worker should count"""
+    denied = check_ingest_token()
+    if denied:
+        return denied
+    try:
+        camera_ids = request.args.getlist('camera_id', type=int)
+        with app.app_context():
+            cameras = Camera.query.filter(Camera.id.in_(camera_ids), Camera.active == True).all()
+            return jsonify({'cameras': [dict(camera.to_dict(), zones=load_zone_configs(camera.id))
+                                        for camera in cameras]})
+    except Exception as e:
+        print(f"Error getting ingest config: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/ingest/bulk', methods=['POST'])
+def ingest_bulk():
+    """Store a batch of zone counts pushed by an edge worker (gzip-compressed JSON), once per batch_id"""
+    denied = check_ingest_token()
+    if denied:
+        return denied
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        batch = json.loads(body)
+        rows = [(int(zone_id), to_db_time(datetime.fromtimestamp(float(timestamp), pytz.UTC)),
+                 int(entries), int(exits), int(current))
+                for zone_id, timestamp, entries, exits, current in batch['rows']]
+        batch_id, worker = str(batch['batch_id']), str(batch['worker'])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": f"Invalid batch: {e}"}), 400
+    
+    try:
+        inserted = storage.write(ingest_zone_counts, batch_id, worker, to_db_time(datetime.now(pytz.UTC)), rows)
+        if inserted:
+            # Batches buffered during an outage land in windows that were already complete
+            timestamps = [float(row[1]) for row in batch['rows']]
+            response_cache.invalidate(start=min(timestamps), end=max(timestamps))
+        return jsonify({"status": "success", "batch_id": batch_id,
+                        "inserted": inserted or 0, "duplicate": inserted is None})
+    except Exception as e:
+        print(f"Error ingesting batch {batch_id} from {worker}: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/graph')
 def show_graph():
     """Render graph visualization page"""
     return render_template('graph.html')
 
+@app.before_request
+def record_first_request():
+    if 'first_request_s' not in startup_timings:
+        startup_timings['first_request_s'] = round(time.time() - STARTED_AT, 3)
+
+@app.before_request
+def sync_with_counting_process():
+    """Web workers: mirror the counting process's camera, model and pipeline states (at most once a second)"""
+    global current_camera_id, CURRENT_MODEL, pipeline_states, pipelines_pending, broker_connected, last_broker_sync
+    
+    if APP_ROLE != 'web' or time.time() - last_broker_sync < 1.0:
+        return
+    last_broker_sync = time.time()
+    try:
+        status = counter.call('status')
+        current_camera_id = status['current_camera_id']
+        CURRENT_MODEL = status['model']
+        pipeline_states = status['pipelines']
+        pipelines_pending = status['pending']
+        broker_connected = True
+    except Exception as e:
+        if broker_connected is not False:
+            print(f"Counting process unavailable: {e}")
+        broker_connected = False
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the web server is up, whatever the state of the pipelines"""
+    return jsonify({'status': 'ok', 'uptime_s': round(time.time() - STARTED_AT, 1)})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: database initialized and the current camera's pipeline running"""
+    # Build threads add cameras meanwhile, so iterate over a copy
+    pipelines = {camera_id: dict(state) for camera_id, state in list(pipeline_states.items())}
+    active_counter = counter
+    if active_counter is not None and current_camera_id in pipelines:
+        pipelines[current_camera_id]['frames_processed'] = active_counter.frame_count
+    
+    current_state = pipelines.get(current_camera_id, {}).get('state')
+    ready = (storage is not None and pipelines_pending == 0 and broker_connected is not False
+             and (current_camera_id is None or current_state == 'running'))
+    return jsonify({
+        'ready': ready,
+        'database': storage is not None,
+        'current_camera_id': current_camera_id,
+        'pipelines': pipelines,
+        'startup': startup_timings
+    }), 200 if ready else 503
+
+@app.route('/metrics')
+def get_metrics():
+    """Get pipeline and storage metrics for the current camera"""
+    return jsonify({
+        'camera_id': current_camera_id,
+        'latency': counter.tracer.summary() if counter is not None else None,
+        'annotation': counter.annotation_metrics() if counter is not None else None,
+        'capture': counter.capture_metrics() if counter is not None else None,
+        'storage': storage.metrics() if storage is not None else None,
+        'response_cache': response_cache.metrics(),
+        'broker': broker_metrics(),
+        'stream_server': stream_server.metrics() if stream_server is not None else None,
+        'camera_pool': camera_pool.metrics() if APP_ROLE != 'web' else None,
+        'scheduler': inference_scheduler.metrics() if APP_ROLE != 'web' else None
+    })
+
+@app.route('/debug-overlay', methods=['POST'])
+def set_debug_overlay():
+    """Toggle the per-frame trace overlay on the video feed"""
+    if counter is None:
+        return jsonify({"error": "Counter not initialized"}), 400
+    
+    data = request.json or {}
+    counter.debug_overlay = bool(data.get('enabled', not counter.debug_overlay))
+    return jsonify({"status": "success", "enabled": counter.debug_overlay})
+
+def parse_number(data, key, cast=int):
+    """data[key] as an int or float; ValueError if it isn't one (a 400, not a 500)"""
+    value = data[key]
+    kind = "an integer" if cast is int else "a number"
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"{key} must be {kind}")
+    try:
+        number = cast(value)
+    except ValueError:
+        raise ValueError(f"{key} must be {kind}") from None
+    if not math.isfinite(number):
+        raise ValueError(f"{key} must be {kind}")
+    return number
+
+@app.route('/retention', methods=['GET', 'POST'])
+def manage_retention():
+    """Get compaction progress, or update the retention policy and run a pass"""
+    if compactor is None:
+        return jsonify({"error": "Database not initialized"}), 400
+    
+    if request.method == 'POST':
+        data = request.json or {}
+        try:
+            days = {key: parse_number(data, key) for key in ('raw_days', 'minute_days') if key in data}
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        for key, value in days.items():
+            if value < 1:
+                return jsonify({"error": f"{key} must be at least 1"}), 400
+        for key, value in days.items():
+            RETENTION_POLICY[key] = compactor.policy[key] = value
+        if data.get('convert_to_incremental_vacuum'):
+            compactor.convert_to_incremental()
+        compactor.trigger()
+    
+    return jsonify({
+        'policy': compactor.policy,
+        'progress': compactor.progress
+    })
+
+def parse_camera_pool_settings(data):
+    """Camera pool limits from a request body; ValueError if one is invalid"""
+    settings = {}
+    if 'size' in data:
+        settings['size'] = parse_number(data, 'size')
+        if settings['size'] < 1:
+            raise ValueError("size must be at least 1")
+    if 'memory_mb' in data:
+        settings['memory_mb'] = parse_number(data, 'memory_mb', float) if data['memory_mb'] else None
+    if 'standby_fps' in data:
+        settings['standby_fps'] = parse_number(data, 'standby_fps', float)
+        if settings['standby_fps'] <= 0:
+            raise ValueError("standby_fps must be positive")
+    return settings
+
+def configure_camera_pool(data=None):
+    """Apply camera pool limits from a request body (if any) and return the pool's state"""
+    if data is not None:
+        CAMERA_POOL_CONFIG.update(parse_camera_pool_settings(data))
+        stop_counters(camera_pool.configure(CAMERA_POOL_CONFIG['size'], CAMERA_POOL_CONFIG['memory_mb'] or 0,
+                                            CAMERA_POOL_CONFIG['standby_fps']))
+    return camera_pool.metrics()
+
+@app.route('/camera-pool', methods=['GET', 'POST'])
+def manage_camera_pool():
+    """Get the warm camera pool, or change its size, memory cap and standby frame rate"""
+    data = (request.json or {}) if request.method == 'POST' else None
+    try:
+        if APP_ROLE == 'web':
+            if data is not None:
+                parse_camera_pool_settings(data)  # Rejected here, not as an error of the counting process
+            return jsonify(counter.call('camera_pool', data))  # The pool lives in the counting process
+        return jsonify(configure_camera_pool(data))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error configuring camera pool: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def parse_scheduler_slots(data):
+    """Number of inference slots from a request body (None if not given); ValueError if invalid"""
+    if 'slots' not in data:
+        return None
+    slots = parse_number(data, 'slots')
+    if slots < 1:
+        raise ValueError("slots must be at least 1")
+    return slots
+
+def configure_scheduler(data=None):
+    """Apply the number of inference slots from a request body (if any) and return per-camera achieved fps"""
+    slots = parse_scheduler_slots(data) if data is not None else None
+    if slots is not None:
+        inference_scheduler.set_slots(slots)
+    return inference_scheduler.metrics()
+
+@app.route('/scheduler', methods=['GET', 'POST'])
+def manage_scheduler():
+    """Get achieved vs target fps per running camera, or change the number of inference slots"""
+    data = (request.json or {}) if request.method == 'POST' else None
+    try:
+        if APP_ROLE == 'web':
+            if data is not None:
+                parse_scheduler_slots(data)  # Rejected here, not as an error of the counting process
+            return jsonify(counter.call('scheduler', data))  # Inference runs in the counting process
+        return jsonify(configure_scheduler(data))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error configuring scheduler: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/model', methods=['GET', 'POST'])
 def manage_model():
     """Get or set the model configuration"""
@@ -637,11 +1314,8 @@ def manage_model():
             
             CURRENT_MODEL = model_key
             
-            # Reinitialize counter with new model
-            with lock:
-                if counter is not None:
-                    counter.stop()
-                initialize_counter()
+            # Reinitialize counter with new model in the background
+            start_pipeline()
             
             return jsonify({
                 'status': 'success',
@@ -672,15 +1346,18 @@ def manage_cameras():
                     name=data['name'],
                     url=data['url']
                 )
+                set_camera_budget(camera, data)
                 db.session.add(camera)
                 db.session.commit()
                 
                 # Set as current if no camera is selected
                 if current_camera_id is None:
                     current_camera_id = camera.id
-                    initialize_counter()
+                    start_pipeline()
                 
                 return jsonify(camera.to_dict())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
@@ -715,28 +1392,47 @@ def manage_single_camera(camera_id):
                     another_camera = Camera.query.filter_by(active=True).first()
                     if another_camera:
                         current_camera_id = another_camera.id
-                        initialize_counter()
+                        start_pipeline()
                     else:
                         current_camera_id = None
-                        if counter:
-                            counter.stop()
+                        stop_pipeline(camera_id)
                 
                 return jsonify({"status": "success"})
                 
             elif request.method == 'PUT':
                 data = request.json
+                budget_changed = set_camera_budget(camera, data)  # Validated before anything changes
                 if 'name' in data:
                     camera.name = data['name']
                 if 'url' in data:
                     camera.url = data['url']
                     if current_camera_id == camera_id:
-                        initialize_counter()  # Reinitialize with new URL
+                        start_pipeline()  # Reinitialize with new URL
                 db.session.commit()
+                if budget_changed:
+                    if APP_ROLE == 'web':
+                        counter.call('camera_budget', camera_id)
+                    else:
+                        apply_camera_budget(camera_id)
                 return jsonify(camera.to_dict())
                 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+def set_camera_budget(camera, data):
+    """Set a camera's target_fps, min_fps and priority from request data; returns whether any was given"""
+    budget = {key: parse_number(data, key, cast) for key, cast in
+              (('target_fps', float), ('min_fps', float), ('priority', int)) if key in data}
+    if budget.get('target_fps', 1) <= 0:
+        raise ValueError("target_fps must be positive")
+    if budget.get('min_fps', 0) < 0:
+        raise ValueError("min_fps can't be negative")
+    for key, value in budget.items():
+        setattr(camera, key, value)
+    return bool(budget)
+
 @app.route('/cameras/switch/<int:camera_id>', methods=['POST'])
 def switch_camera(camera_id):
     """Switch to a different camera"""
@@ -749,7 +1445,7 @@ def switch_camera(camera_id):
                 return jsonify({"error": "Camera not found"}), 404
             
             current_camera_id = camera.id
-            initialize_counter()
+            start_pipeline()
             
             return jsonify({
                 "status": "success",
@@ -759,6 +1455,67 @@ def switch_camera(camera_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def parse_hls_settings(data):
+    """Integer HLS settings from a request body; ValueError if one is below 1"""
+    settings = {}
+    for key in ('fps', 'segment_seconds', 'playlist_size'):
+        if key in data:
+            settings[key] = parse_number(data, key)
+            if settings[key] < 1:
+                raise ValueError(f"{key} must be at least 1")
+    return settings
+
+def configure_hls(data=None):
+    """Apply HLS settings from a request body (if any) and return the HLS configuration and status"""
+    if data is not None:
+        settings = parse_hls_settings(data)
+        try:
+            HLS_CONFIG.update(settings)
+            if 'bitrate' in data:
+                HLS_CONFIG['bitrate'] = str(data['bitrate'])
+            HLS_CONFIG['enabled'] = bool(data.get('enabled', HLS_CONFIG['enabled']))
+            
+            with lock:
+                if counter is not None:
+                    if HLS_CONFIG['enabled']:
+                        attach_hls_output()  # (Re)start with the new settings
+                    else:
+                        detach_hls_output()
+        except Exception:
+            HLS_CONFIG['enabled'] = False
+            raise
+    
+    return {
+        'config': HLS_CONFIG,
+        'playlist': f'/hls/{current_camera_id}/{HLSOutput.PLAYLIST}' if HLS_CONFIG['enabled'] else None,
+        'status': hls_output.status() if hls_output is not None else None
+    }
+
+@app.route('/hls', methods=['GET', 'POST'])
+def manage_hls():
+    """Get or set the HLS output configuration"""
+    data = (request.json or {}) if request.method == 'POST' else None
+    try:
+        if APP_ROLE == 'web':
+            if data is not None:
+                parse_hls_settings(data)  # Rejected here, not as an error of the counting process
+            return jsonify(counter.call('configure_hls', data))  # HLS is written by the counting process
+        return jsonify(configure_hls(data))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"Error configuring HLS output: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/hls/<int:camera_id>/<path:filename>')
+def serve_hls(camera_id, filename):
+    """Serve the HLS playlist and segments"""
+    response = send_from_directory(os.path.join(HLS_ROOT, str(camera_id)), filename)
+    if filename.endswith('.m3u8'):
+        # The playlist changes every segment, segments themselves never change
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # @app.route('/start', methods=['POST'])
 # def start_processing():
 #     """Start people counting process"""
@@ -803,15 +1560,106 @@ def switch_camera(camera_id):
     
 #     return jsonify({"status": "success", "message": f"Streaming to {stream_url}"})
 
-if __name__ == '__main__':
-    # Initialize database
-    init_database()
+# Counting process side of the frame broker (APP_ROLE=counter)
+
+def counter_call(attribute, /, *args, **kwargs):
+    """Broker handler: call a counter method, or read a counter attribute"""
+    if attribute not in REMOTE_COUNTER_API:
+        raise ValueError(f"{attribute} is not available remotely")
+    with lock:
+        if counter is None:
+            return None
+        value = getattr(counter, attribute)
+        return value(*args, **kwargs) if callable(value) else value
+
+def switch_pipeline(camera_id, model=None):
+    """Broker handler: build the pipeline for another camera or model, or stop counting (camera None)"""
+    global current_camera_id, CURRENT_MODEL
     
-    # Initialize counter
-    initialize_counter()
+    if model in AVAILABLE_MODELS:
+        CURRENT_MODEL = model
+    if camera_id is None:
+        stop_pipeline(current_camera_id)
+    current_camera_id = camera_id
+    if camera_id is not None:
+        start_pipeline()
+
+def set_remote_debug_overlay(enabled):
+    """Broker handler: toggle the trace overlay"""
+    if counter is None:
+        raise ValueError("Counter not initialized")
+    counter.debug_overlay = bool(enabled)
+
+def pipeline_status():
+    """Broker handler: what web workers mirror in sync_with_counting_process"""
+    return {
+        'current_camera_id': current_camera_id,
+        'model': CURRENT_MODEL,
+        'pipelines': dict(list(pipeline_states.items())),  # Serialized after returning, while builds go on
+        'pending': pipelines_pending
+    }
+
+def broker_metrics():
+    if broker is not None:
+        return {'role': APP_ROLE, 'streams': broker.streams, 'calls': broker.calls}
+    if APP_ROLE == 'web':
+        return {'role': APP_ROLE, 'connected': broker_connected}
+    return None
+
+def start_broker():
+    """Serve frames and counter calls to web worker processes over a Unix socket"""
+    global broker
+    
+    broker = BrokerServer(BROKER_SOCKET, lambda: counter, {
+        'status': pipeline_status,
+        'counter': counter_call,
+        'latency': lambda: counter.tracer.summary() if counter is not None else None,
+        'switch_pipeline': switch_pipeline,
+        'set_debug_overlay': set_remote_debug_overlay,
+        'configure_hls': configure_hls,
+        'camera_pool': configure_camera_pool,
+        'scheduler': configure_scheduler,
+        'camera_budget': apply_camera_budget,
+        'heatmap': get_heatmap
+    })
+    broker.start()
+
+def start_stream_server():
+    """Serve the video feeds and live stats from the asyncio server if STREAM_PORT is set"""
+    global stream_server
+    
+    if STREAM_PORT and stream_server is None:
+        stream_server = AsyncStreamServer(lambda: counter, port=int(STREAM_PORT))
+        stream_server.start()
+
+def init_web_worker():
+    """Set up a web worker process serving from the counting process (APP_ROLE=web)"""
+    global counter
+    
+    init_database(maintenance=False)  # Backfill and compaction run in the counting process
+    counter = RemoteCounter(BROKER_SOCKET)
+    start_stream_server()
+
+def create_web_worker():
+    """App factory for WSGI servers running web workers, e.g. gunicorn 'app:create_web_worker()'"""
+    init_web_worker()
+    return app
+
+if __name__ == '__main__':
+    if APP_ROLE == 'web':
+        init_web_worker()
+    else:
+        # Initialize database
+        init_database()
+        if APP_ROLE == 'counter':
+            start_broker()
+        
+        # Build the counter in the background so the web UI and history APIs serve right away
+        start_pipeline()
+        start_stream_server()
     
     # Run Flask app
-    app.run(host='0.0.0.0', port=5000, threaded=True)
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), threaded=True)
     
     # Cleanup on exit
     if counter is not None:
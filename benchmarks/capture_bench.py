@@ -0,0 +1,126 @@
+"""Capture CPU of reading a source faster than the processing rate: read() every frame vs CaptureEngine.
+
+The baseline keeps the stream live by calling read() (decode and convert) on
+every source frame, then resizes the ones due at the target fps.
+CaptureEngine grabs every frame but only retrieves and resizes the due ones.
+Both play the video in real time at its own fps, so the process CPU they use
+is what a live camera would cost. Without --video, a 1080p clip of moving
+shapes is generated first.
+
+    python -m benchmarks.capture_bench --target-fps 15,30
+    python -m benchmarks.capture_bench --video clip.mp4 --target-fps 10 --decode-threads 1,2
+"""
+import argparse
+import os
+import resource
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from modules.capture_engine import CaptureEngine
+
+
+def make_video(path, seconds, fps, size=(1920, 1080)):
+    """Write a clip of shapes moving over a noisy background, so every frame has something to decode."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        for j in range(8):
+            x = int((i * (4 + j) + j * 200) % size[0])
+            cv2.rectangle(frame, (x, 100 + j * 110), (x + 120, 200 + j * 110), (40 * j, 200, 255 - 30 * j), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def process_cpu():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_baseline(path, target_fps, decode_threads):
+    """read() every frame in real time, resizing those due at target_fps."""
+    params = [cv2.CAP_PROP_N_THREADS, decode_threads] if decode_threads else []
+    cap = cv2.VideoCapture(path, cv2.CAP_ANY, params)
+    interval = 1.0 / cap.get(cv2.CAP_PROP_FPS)
+    start = next_frame = time.time()
+    next_due = 0.0  # Same schedule as CaptureEngine.read
+    frames = processed = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames += 1
+        now = time.time()
+        if now >= next_due - interval / 2:
+            cv2.resize(frame, (1280, 720))
+            processed += 1
+            next_due = next_due + 1.0 / target_fps if next_due + 1.0 / target_fps >= now else now + 1.0 / target_fps
+        next_frame += interval
+        time.sleep(max(0.0, next_frame - time.time()))
+    cap.release()
+    return frames, processed, time.time() - start
+
+
+def run_engine(path, target_fps, decode_threads):
+    engine = CaptureEngine(path, decode_threads)
+    engine.open()
+    start = time.time()
+    processed = 0
+    while True:
+        ret, frame = engine.read(1.0 / target_fps)
+        if not ret:
+            break
+        if frame is not None:
+            cv2.resize(frame, (1280, 720))
+            processed += 1
+    engine.release()
+    return engine.grabbed, processed, time.time() - start
+
+
+def measure(run, path, target_fps, decode_threads):
+    """Run in a thread of its own (like capture_frames); returns frames, processed, seconds, CPU %."""
+    result = []
+    cpu = process_cpu()
+    thread = threading.Thread(target=lambda: result.extend(run(path, target_fps, decode_threads)))
+    thread.start()
+    thread.join()
+    frames, processed, seconds = result
+    return frames, processed, seconds, (process_cpu() - cpu) / seconds * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='Video file (default: a generated 1080p clip)')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Length of the generated clip')
+    parser.add_argument('--fps', type=float, default=60.0, help='Frame rate of the generated clip')
+    parser.add_argument('--target-fps', default='15,30', help='Comma-separated processing rates')
+    parser.add_argument('--decode-threads', default='0', help="Comma-separated decoder threads (0: OpenCV's default)")
+    args = parser.parse_args()
+
+    path = args.video
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f'capture_bench_{args.fps:g}fps_{args.seconds:g}s.mp4')
+        if not os.path.exists(path):
+            print(f"Generating {path}")
+            make_video(path, args.seconds, args.fps)
+
+    for decode_threads in (int(value) for value in args.decode_threads.split(',')):
+        for target_fps in (float(value) for value in args.target_fps.split(',')):
+            print(f"decode threads {decode_threads or 'default'}, target {target_fps:g} fps")
+            results = {}
+            for name, run in (('read() every frame', run_baseline), ('CaptureEngine', run_engine)):
+                frames, processed, seconds, cpu = measure(run, path, target_fps, decode_threads or None)
+                results[name] = cpu
+                print(f"  {name:20s} {frames} frames, {processed} processed in {seconds:.1f}s, "
+                      f"CPU {cpu:.1f}% ({cpu * seconds / 100 / frames * 1000:.2f}ms per source frame)")
+            baseline, engine = results.values()
+            print(f"  CPU saved: {(1 - engine / baseline) * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""Helpers shared by the benchmarks."""
+
+
+def process_usage():
+    """Return (OS threads, RSS in MB) of this process."""
+    with open('/proc/self/status') as f:
+        fields = dict(line.split(':', 1) for line in f)
+    return int(fields['Threads']), int(fields['VmRSS'].split()[0]) / 1024
@@ -0,0 +1,240 @@
+"""Counting engine under thousands of concurrent tracks, with exact ground truth.
+
+Simulates `--tracks` pedestrians walking at constant velocity over a 1280x720
+scene. There is no video or detector: each frame's centroids and track IDs go
+straight into PeopleCounterNew._count_detections, the counting stage of
+generate_output. A pedestrian that ends its walk (or leaves the frame) is
+replaced by a new one until `--frames`. The run then drains until everybody
+is gone, so every walk is complete.
+
+There are `--zones` zones. A `--line-fraction` of them are tripwire lines, the
+rest axis-aligned rectangular polygons. Ground truth comes from the true path
+of each pedestrian, frame by frame:
+  - rectangles: every transition between two consecutive frames is an entry
+    or exit
+  - tripwires: a walk counts when its first and last positions are more than
+    the hysteresis away from the line, on opposite sides, and the walk passes
+    between the endpoints
+
+With no churn and no occlusion, the counted values must match exactly. The
+tracker's imperfections can be added:
+  - `--churn`: per-frame probability that a pedestrian gets a new track ID
+  - `--occlusion`: per-frame probability of an occlusion gap of up to
+    `--max-gap` frames without a detection
+
+The report covers counting throughput (tracks/s and frames/s), the exact count
+error per zone type, the per-track state left in the counter once it has been
+idle long enough to drop every lost track, and RSS growth.
+
+    python -m benchmarks.crowd_sim --tracks 1000 --zones 20
+    python -m benchmarks.crowd_sim --tracks 10000 --zones 100 --frames 60
+    python -m benchmarks.crowd_sim --tracks 2000 --zones 40 --churn 0.002 --occlusion 0.01
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks.common import process_usage
+from modules.people_counter_new import TRACK_IDLE_SECONDS, TRACK_PRUNE_INTERVAL, PeopleCounterNew
+
+WIDTH, HEIGHT = 1280, 720
+BOX_SIZE = (40, 100)
+
+
+def make_zones(count, line_fraction, rng):
+    """Return (rectangles {zone_id: (x0, y0, x1, y1)}, lines {zone_id: ((x1, y1), (x2, y2))})."""
+    rectangles, lines = {}, {}
+    for zone_id in range(1, count + 1):
+        if zone_id <= round(count * line_fraction):
+            start = rng.uniform((0, 0), (WIDTH, HEIGHT))
+            angle, length = rng.uniform(0, np.pi), rng.uniform(100, 500)
+            end = start + length * np.array([np.cos(angle), np.sin(angle)])
+            lines[zone_id] = (tuple(start.astype(int)), tuple(end.astype(int)))
+        else:
+            w, h = rng.integers(60, 300), rng.integers(60, 300)
+            x0, y0 = rng.integers(0, WIDTH - w), rng.integers(0, HEIGHT - h)
+            rectangles[zone_id] = (x0, y0, x0 + w, y0 + h)
+    return rectangles, lines
+
+
+def signed_distance(points, line):
+    """Distance of points to a line as TripwireCounter measures it (positive on its right-hand side)."""
+    (x1, y1), (x2, y2) = line
+    dx, dy = x2 - x1, y2 - y1
+    return (dx * (points[..., 1] - y1) - dy * (points[..., 0] - x1)) / max(np.hypot(dx, dy), 1e-9)
+
+
+def line_crossings(starts, ends, line, hysteresis):
+    """Ground-truth (entries, exits) of straight walks from `starts` to `ends` over one tripwire."""
+    d0, d1 = signed_distance(starts, line), signed_distance(ends, line)
+    crossed = ((d0 > hysteresis) & (d1 < -hysteresis)) | ((d0 < -hysteresis) & (d1 > hysteresis))
+    # The walk must pass between the tripwire's endpoints
+    (x1, y1), (x2, y2) = line
+    motion = ends - starts
+    side_of_start = motion[:, 0] * (y1 - starts[:, 1]) - motion[:, 1] * (x1 - starts[:, 0])
+    side_of_end = motion[:, 0] * (y2 - starts[:, 1]) - motion[:, 1] * (x2 - starts[:, 0])
+    crossed &= side_of_start * side_of_end <= 0
+    return int(np.count_nonzero(crossed & (d0 > 0))), int(np.count_nonzero(crossed & (d0 < 0)))
+
+
+class Crowd:
+    """`size` pedestrians with constant velocities, replaced as they finish their walks."""
+
+    def __init__(self, size, speed, lifetime, churn, occlusion, max_gap, rng):
+        self.rng = rng
+        self.speed = speed
+        self.lifetime = lifetime
+        self.churn = churn
+        self.occlusion = occlusion
+        self.max_gap = max_gap
+        # float32 like detector boxes, so the ground truth sees the same centroids as the counter
+        self.positions = np.zeros((size, 2), dtype=np.float32)
+        self.velocities = np.zeros((size, 2), dtype=np.float32)
+        self.starts = np.zeros((size, 2), dtype=np.float32)  # Where each walk began
+        self.frames_left = np.zeros(size, dtype=int)
+        self.track_ids = np.zeros(size, dtype=int)
+        self.hidden_until = np.zeros(size, dtype=int)
+        self.alive = np.zeros(size, dtype=bool)
+        self.next_track_id = 1
+        self.walks = 0
+
+    def spawn(self, slots):
+        count = len(slots)
+        if not count:
+            return
+        angles = self.rng.uniform(0, 2 * np.pi, count)
+        speeds = self.rng.uniform(*self.speed, count)
+        self.positions[slots] = self.rng.uniform((0, 0), (WIDTH, HEIGHT), (count, 2))
+        self.starts[slots] = self.positions[slots]
+        self.velocities[slots] = np.stack([np.cos(angles), np.sin(angles)], axis=1) * speeds[:, None]
+        self.frames_left[slots] = self.rng.integers(*self.lifetime, count)
+        self.track_ids[slots] = np.arange(self.next_track_id, self.next_track_id + count)
+        self.next_track_id += count
+        self.hidden_until[slots] = 0
+        self.alive[slots] = True
+        self.walks += count
+
+    def step(self, frame):
+        """Advance one frame; return the slots whose walk ended, with the last position of each."""
+        moved = self.positions + self.velocities
+        in_frame = (moved[:, 0] >= 0) & (moved[:, 0] < WIDTH) & (moved[:, 1] >= 0) & (moved[:, 1] < HEIGHT)
+        self.frames_left -= 1
+        ended = np.nonzero(self.alive & ((self.frames_left <= 0) | ~in_frame))[0]
+        self.alive[ended] = False
+        self.positions = np.where(self.alive[:, None], moved, self.positions)
+
+        walking = np.nonzero(self.alive)[0]
+        if self.churn:
+            switched = walking[self.rng.random(len(walking)) < self.churn]
+            self.track_ids[switched] = np.arange(self.next_track_id, self.next_track_id + len(switched))
+            self.next_track_id += len(switched)
+        if self.occlusion:
+            occluded = walking[(self.rng.random(len(walking)) < self.occlusion) & (self.hidden_until[walking] <= frame)]
+            self.hidden_until[occluded] = frame + 1 + self.rng.integers(0, self.max_gap, len(occluded))
+        return ended
+
+    def visible(self, frame):
+        return np.nonzero(self.alive & (self.hidden_until <= frame))[0]
+
+
+def inside(positions, rectangles):
+    """(N, Z) membership of the integer centroids in each rectangle, edges included like pointPolygonTest."""
+    centroids = positions.astype(int)
+    bounds = np.array(list(rectangles.values())).reshape(-1, 4)
+    x, y = centroids[:, 0:1], centroids[:, 1:2]
+    return (x >= bounds[:, 0]) & (x <= bounds[:, 2]) & (y >= bounds[:, 1]) & (y <= bounds[:, 3])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=1000, help='Concurrent pedestrians')
+    parser.add_argument('--zones', type=int, default=20)
+    parser.add_argument('--line-fraction', type=float, default=0.3, help='Share of the zones that are tripwires')
+    parser.add_argument('--frames', type=int, default=300, help='Frames during which pedestrians are replaced')
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--speed', type=float, nargs=2, default=(2.0, 8.0), help='Pixels per frame (min max)')
+    parser.add_argument('--lifetime', type=int, nargs=2, default=(30, 150), help='Frames per walk (min max)')
+    parser.add_argument('--churn', type=float, default=0.0, help='Per-frame probability of a track ID switch')
+    parser.add_argument('--occlusion', type=float, default=0.0, help='Per-frame probability of an occlusion gap')
+    parser.add_argument('--max-gap', type=int, default=10, help='Longest occlusion gap, in frames')
+    parser.add_argument('--hysteresis', type=float, default=8.0, help='Tripwire hysteresis, in pixels')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    rectangles, lines = make_zones(args.zones, args.line_fraction, rng)
+    zones = ([{'id': zone_id, 'type': 'polygon', 'points': [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]}
+              for zone_id, (x0, y0, x1, y1) in rectangles.items()] +
+             [{'id': zone_id, 'type': 'line', 'points': [list(start), list(end)]}
+              for zone_id, (start, end) in lines.items()])
+    counter = PeopleCounterNew(model=SimpleNamespace(), zones=zones, tripwire_hysteresis=args.hysteresis)
+
+    crowd = Crowd(args.tracks, args.speed, args.lifetime, args.churn, args.occlusion, args.max_gap, rng)
+    crowd.spawn(np.arange(args.tracks))
+    truth = {zone_id: [0, 0] for zone_id in list(rectangles) + list(lines)}
+    previous_inside = inside(crowd.positions, rectangles)
+    _, rss_start = process_usage()
+
+    frame, detections, counting_times = 0, 0, []
+    while crowd.alive.any():
+        # What the tracker would report: centroid boxes and IDs of the visible pedestrians
+        visible = crowd.visible(frame)
+        boxes = np.column_stack([crowd.positions[visible], np.tile(BOX_SIZE, (len(visible), 1))]).astype(np.float32)
+        start = time.perf_counter()
+        counter._count_detections(boxes, crowd.track_ids[visible], timestamp=frame / args.fps)
+        counting_times.append(time.perf_counter() - start)
+        detections += len(visible)
+
+        frame += 1
+        ended = crowd.step(frame)
+
+        # Ground truth: rectangle transitions of the pedestrians still walking, finished tripwire crossings
+        now_inside = inside(crowd.positions, rectangles)
+        walking = crowd.alive[:, None]
+        for column, zone_id in enumerate(rectangles):
+            truth[zone_id][0] += int(np.count_nonzero(walking[:, 0] & ~previous_inside[:, column] & now_inside[:, column]))
+            truth[zone_id][1] += int(np.count_nonzero(walking[:, 0] & previous_inside[:, column] & ~now_inside[:, column]))
+        for zone_id, line in lines.items():
+            entries, exits = line_crossings(crowd.starts[ended], crowd.positions[ended], line, args.hysteresis)
+            truth[zone_id][0] += entries
+            truth[zone_id][1] += exits
+        if frame <= args.frames:
+            crowd.spawn(ended)
+            now_inside[ended] = inside(crowd.positions[ended], rectangles)
+        previous_inside = now_inside
+
+    # Idle frames, until the counter and tripwires have dropped the state of every lost track
+    idle_frames = max(int((TRACK_IDLE_SECONDS + TRACK_PRUNE_INTERVAL) * args.fps),
+                      counter.tripwires.max_idle_frames + 100) + 1
+    for idle in range(idle_frames):
+        counter._count_detections(np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=int),
+                                  timestamp=(frame + idle) / args.fps)
+
+    _, rss_end = process_usage()
+    counting = sum(counting_times)
+    frame_ms = np.array(counting_times) * 1000
+    print(f"{args.tracks} concurrent tracks, {len(rectangles)} polygons + {len(lines)} tripwires, "
+          f"{frame} frames ({args.frames} spawning), {crowd.walks} walks, {crowd.next_track_id - 1} track IDs")
+    print(f"  counting: {detections / counting:,.0f} tracks/s, {frame / counting:.1f} frames/s, "
+          f"ms per frame p50 {np.percentile(frame_ms, 50):.1f}, p99 {np.percentile(frame_ms, 99):.1f}, "
+          f"max {frame_ms.max():.1f}")
+    for kind, zone_ids in (('polygons', list(rectangles)), ('tripwires', list(lines))):
+        if not zone_ids:
+            continue
+        expected = np.array([truth[zone_id] for zone_id in zone_ids])
+        counted = np.array([[counter.zones.counts[zone_id]['entry'], counter.zones.counts[zone_id]['exit']]
+                            for zone_id in zone_ids])
+        error = counted - expected
+        print(f"  {kind}: entries {counted[:, 0].sum()} counted vs {expected[:, 0].sum()} true, "
+              f"exits {counted[:, 1].sum()} vs {expected[:, 1].sum()}; "
+              f"absolute error {np.abs(error).sum()} ({100 * np.abs(error).sum() / max(1, expected.sum()):.2f}%), "
+              f"worst zone {np.abs(error).max()}")
+    print(f"  state left after {idle_frames} idle frames: track_history {len(counter.track_history)} tracks, "
+          f"tripwires {len(counter.tripwires._tracks)} tracks")
+    print(f"  RSS: {rss_start:.0f} -> {rss_end:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
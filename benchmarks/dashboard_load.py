@@ -0,0 +1,199 @@
+"""Dashboard endpoints under many concurrent control-room screens.
+
+Starts the Flask app in this process against a temporary SQLite database that
+is seeded with `--history` seconds of 1 Hz counts per zone. A fake counter
+stands in for the pipeline and publishes frames through a real
+FrameBroadcaster. The real update_zone_counts thread keeps writing its counts
+every second. A separate client process then runs two kinds of clients for
+`--duration` seconds:
+
+  - `--viewers` MJPEG viewers reading /video_feed
+  - `--pollers` dashboard pollers requesting /stats, /graph-data (last hour)
+    and /zones, once per second each, which is index.html's refresh cadence
+
+The report covers:
+  - latency percentiles and errors per endpoint
+  - frames per second delivered to each viewer
+  - server CPU (in cores), threads and RSS
+
+    python -m benchmarks.dashboard_load --viewers 20 --pollers 40
+    python -m benchmarks.dashboard_load --viewers 0 --pollers 200 --history 604800
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytz
+
+from benchmarks.common import process_usage
+from benchmarks.stream_load import SyntheticCounter, free_port, viewer
+from instance.storage import backfill_zone_latest, to_db_time
+
+POLL_PATHS = ('/stats', '/graph-data', '/zones')
+
+
+class DashboardCounter(SyntheticCounter):
+    """SyntheticCounter with rising counts for the seeded zones, pooled like a real counter."""
+
+    def __init__(self, fps, zone_ids, start_count):
+        super().__init__(fps)
+        self.zone_ids = zone_ids
+        self.start_count = start_count
+        self.started = time.time()
+
+    def current_stats(self):
+        count = self.start_count + int(time.time() - self.started)
+        return {zone_id: {'name': f'Zone {zone_id}', 'entry': count, 'exit': count, 'current': count % 10}
+                for zone_id in self.zone_ids}, None
+
+    def set_standby(self, standby_fps=None):
+        pass
+
+
+def seed(flask_app, zones, history):
+    """Create a camera with `zones` zones and `history` seconds of 1 Hz counts each; return the camera and zone IDs."""
+    from instance.models import Camera, Zone, db
+    with flask_app.app.app_context():
+        camera = Camera(name='Load test', url='synthetic')
+        db.session.add(camera)
+        db.session.flush()
+        zone_rows = [Zone(name=f'Zone {i + 1}', points=[[100 * i, 0], [100 * i + 80, 0], [100 * i + 80, 720], [100 * i, 720]],
+                          camera_id=camera.id) for i in range(zones)]
+        db.session.add_all(zone_rows)
+        db.session.commit()
+        camera_id, zone_ids = camera.id, [zone.id for zone in zone_rows]
+
+    start = datetime.now(pytz.UTC) - timedelta(seconds=history)
+    def insert_history(connection):
+        rows = ((zone_id, to_db_time(start + timedelta(seconds=second)), second, second, second % 10)
+                for second in range(history) for zone_id in zone_ids)
+        connection.executemany(
+            "INSERT INTO zone_count (zone_id, timestamp, entries, exits, current_count) VALUES (?, ?, ?, ?, ?)", rows)
+    flask_app.storage.write(insert_history)
+    flask_app.storage.write(backfill_zone_latest)
+    return camera_id, zone_ids
+
+
+def start_server(flask_app, port):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # No access log line per request
+    server = make_server('127.0.0.1', port, flask_app.app, threaded=True)
+    server.socket.listen(4096)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+async def get(port, path):
+    """Request `path` on a new connection, like a browser fetch; return (status, seconds)."""
+    start = time.monotonic()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=1 << 20)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    while await reader.read(65536):
+        pass
+    writer.close()
+    return int(status_line.split()[1]), time.monotonic() - start
+
+
+async def poller(port, duration, results):
+    """Refresh the dashboard once per second until `duration` is over."""
+    await asyncio.sleep(np.random.uniform(0, 1.0))  # Screens are not opened in lockstep
+    deadline = time.monotonic() + duration
+    while (tick := time.monotonic()) < deadline:
+        end = datetime.now(pytz.UTC).replace(tzinfo=None)
+        paths = {'/stats': '/stats', '/zones': '/zones',
+                 '/graph-data': f"/graph-data?start_time={(end - timedelta(hours=1)).isoformat(timespec='minutes')}"
+                                f"&end_time={end.isoformat(timespec='minutes')}"}
+        responses = await asyncio.gather(*(get(port, path) for path in paths.values()), return_exceptions=True)
+        for name, response in zip(paths, responses):
+            results[name].append(None if isinstance(response, Exception) or response[0] != 200 else response[1])
+        await asyncio.sleep(max(0.0, tick + 1.0 - time.monotonic()))
+
+
+def run_clients(port, viewers, pollers, duration, width, quality, queue):
+    async def main():
+        frames, polls = [], {path: [] for path in POLL_PATHS}
+        path = f"/video_feed?width={width}&quality={quality}"
+        await asyncio.gather(*(viewer(port, path, duration, frames) for _ in range(viewers)),
+                             *(poller(port, duration, polls) for _ in range(pollers)))
+        return frames, polls
+    queue.put(asyncio.run(main()))
+
+
+def percentiles(latencies):
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms, max {values.max():.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--viewers', type=int, default=20)
+    parser.add_argument('--pollers', type=int, default=40)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--zones', type=int, default=4)
+    parser.add_argument('--history', type=int, default=86400, help='Seconds of 1 Hz history to seed per zone')
+    parser.add_argument('--fps', type=float, default=15.0, help='Frames published per second')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--quality', type=int, default=70)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'dashboard.db')}"
+        import app as flask_app
+        flask_app.init_database(maintenance=False)
+        camera_id, zone_ids = seed(flask_app, args.zones, args.history)
+
+        # The fake counter takes the place of a built pipeline
+        counter = DashboardCounter(args.fps, zone_ids, args.history)
+        flask_app.current_camera_id = camera_id
+        flask_app.camera_pool.activate(camera_id, counter)
+        flask_app.counter = counter
+        flask_app.set_pipeline_state(camera_id, 'running')
+        threading.Thread(target=flask_app.update_zone_counts, daemon=True).start()
+
+        port = free_port()
+        start_server(flask_app, port)
+        time.sleep(1.0)
+        threads_idle, rss_idle = process_usage()
+
+        queue = multiprocessing.Queue()
+        client = multiprocessing.Process(target=run_clients, args=(port, args.viewers, args.pollers, args.duration,
+                                                                   args.width, args.quality, queue))
+        cpu_start, wall_start = sum(os.times()[:2]), time.monotonic()
+        client.start()
+        threads_peak, rss_peak = threads_idle, rss_idle
+        while client.is_alive() and queue.empty():
+            threads, rss = process_usage()
+            threads_peak, rss_peak = max(threads_peak, threads), max(rss_peak, rss)
+            time.sleep(0.5)
+        cpu = (sum(os.times()[:2]) - cpu_start) / (time.monotonic() - wall_start)
+        frames, polls = queue.get()
+        client.join()
+        flask_app.storage.stop()
+
+    print(f"{args.viewers} viewers ({args.width}px q{args.quality}, {args.fps:g} fps published), "
+          f"{args.pollers} pollers, {args.zones} zones with {args.history} s of history, {args.duration:g} s")
+    for path, latencies in polls.items():
+        ok = [latency for latency in latencies if latency is not None]
+        summary = percentiles(ok) if ok else 'no successful requests'
+        print(f"  {path}: {len(ok) / args.duration:.1f} req/s, {summary}, errors {len(latencies) - len(ok)}")
+    rates = sorted(result[0] for result in frames if result is not None)
+    if rates:
+        print(f"  delivered fps per viewer: median {statistics.median(rates):.2f}, "
+              f"p5 {rates[int(len(rates) * 0.05)]:.2f}, min {rates[0]:.2f}, failed {len(frames) - len(rates)}")
+    print(f"  server CPU: {cpu:.2f} cores")
+    print(f"  server threads: {threads_idle} idle, {threads_peak} peak")
+    print(f"  server RSS: {rss_idle:.0f} MB idle, {rss_peak:.0f} MB peak")
+
+
+if __name__ == '__main__':
+    main()
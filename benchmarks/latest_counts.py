@@ -0,0 +1,82 @@
+"""Cost of restoring the latest count of every zone on a large history.
+
+Compares the original `max(id) ... GROUP BY zone_id` lookup over zone_count
+with primary-key lookups on zone_latest, both for the zones of one camera
+(counter startup, camera switch, live /stats) and with a cold page cache
+(fresh connection, as right after a restart). Also times the one-off
+zone_latest backfill that runs when an existing database is upgraded.
+
+    python -m benchmarks.latest_counts --zones 40 --history 200000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.storage_load import seed
+from instance.storage import SQLiteStorage, backfill_zone_latest, query_latest_counts
+
+GROUP_BY_SQL = (
+    "SELECT zone_id, timestamp, entries, exits, current_count FROM zone_count "
+    "WHERE id IN (SELECT max(id) FROM zone_count WHERE zone_id IN ({placeholders}) GROUP BY zone_id)")
+
+
+def time_calls(function, repeat):
+    """Median and max wall time of `repeat` calls, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3), round(max(timings), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--zones', type=int, default=40)
+    parser.add_argument('--history', type=int, default=200000, help='Seconds of 1 Hz history to seed per zone')
+    parser.add_argument('--camera-zones', type=int, default=8, help='Zones restored per counter startup')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'history.db')
+        seed(path, args.zones, args.history)
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE zone (id INTEGER PRIMARY KEY)")
+        connection.executemany("INSERT INTO zone (id) VALUES (?)", [(i,) for i in range(1, args.zones + 1)])
+        connection.commit()
+        connection.close()
+        print(f"{args.zones * args.history} zone_count rows, {os.path.getsize(path) / 1e6:.0f} MB")
+
+        storage = SQLiteStorage(path)
+        storage.start()
+        start = time.perf_counter()
+        filled = storage.write(backfill_zone_latest, timeout=600)
+        print(f"backfill: {filled} zones in {(time.perf_counter() - start) * 1000:.1f} ms (one-off)")
+
+        zone_ids = tuple(range(1, args.camera_zones + 1))
+        group_by = GROUP_BY_SQL.format(placeholders=",".join("?" * len(zone_ids)))
+        assert ({row['zone_id']: tuple(row) for row in storage.read(group_by, zone_ids)}
+                == {zone_id: tuple(row) for zone_id, row in query_latest_counts(storage, zone_ids).items()})
+
+        print(f"warm, {len(zone_ids)} zones (median ms, max ms)")
+        print(f"  max(id) GROUP BY: {time_calls(lambda: storage.read(group_by, zone_ids), args.repeat)}")
+        print(f"  zone_latest:      {time_calls(lambda: query_latest_counts(storage, zone_ids), args.repeat)}")
+        storage.stop()
+
+        def cold(sql):
+            connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            connection.execute(sql, zone_ids).fetchall()
+            connection.close()
+
+        latest_sql = f"SELECT * FROM zone_latest WHERE zone_id IN ({','.join('?' * len(zone_ids))})"
+        print("cold connection (median ms, max ms)")
+        print(f"  max(id) GROUP BY: {time_calls(lambda: cold(group_by), max(3, args.repeat // 4))}")
+        print(f"  zone_latest:      {time_calls(lambda: cold(latest_sql), max(3, args.repeat // 4))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Throughput, queueing, drops, memory growth and count correctness of PeopleCounterNew.
+
+Runs the real pipeline threads (capture_frames, process_frames,
+generate_output) on a SyntheticVideo with a StubDetector, so no camera, model
+weights or GPU are needed. There are two zones, both crossed by every figure:
+a vertical tripwire across the middle of the frame and a polygon band on the
+right. The pipeline is sampled once per second. After the spawn period, the
+run drains until the last figure has left the frame. It then reports:
+
+  - throughput of every stage (frames/s read, inferred, counted, annotated, delivered)
+  - queue occupancy (mean and max of each queue)
+  - drops: source frames never read, frames replaced before inference, results dropped
+  - memory: RSS growth and its slope after warmup, per-track state still held
+  - count correctness: tripwire and zone entries/exits against the ground truth
+
+`--latency-ms` takes a comma-separated list to sweep detector latencies.
+`--json` prints one JSON object per run, for comparing runs between commits.
+
+    python -m benchmarks.pipeline_bench --latency-ms 30 --duration 60
+    python -m benchmarks.pipeline_bench --latency-ms 20,40,80,160 --duration 30
+    python -m benchmarks.pipeline_bench --duration 1800 --figures-per-minute 300   # long run: memory
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.common import process_usage
+from benchmarks.synthetic import StubDetector, SyntheticVideo
+from modules.people_counter_new import PeopleCounterNew
+
+FRAME_SIZE = (1280, 720)  # capture_frames resizes every frame to this
+TRIPWIRE_ID, BAND_ID = 1, 2
+BAND = (900, 1000)  # x range of the polygon zone, in frame coordinates
+
+
+def zones():
+    width, height = FRAME_SIZE
+    return [
+        # Drawn top to bottom, so walking left to right is an entry (see TripwireCounter)
+        {'id': TRIPWIRE_ID, 'name': 'Tripwire', 'type': 'line', 'points': [[width // 2, 0], [width // 2, height]]},
+        {'id': BAND_ID, 'name': 'Band', 'type': 'polygon',
+         'points': [[BAND[0], 0], [BAND[1], 0], [BAND[1], height], [BAND[0], height]]},
+    ]
+
+
+def watch(counter, delivered, stop_event):
+    """A viewer: count the frames the broadcaster delivers."""
+    variant = counter.broadcaster.subscribe()
+    last_seq = 0
+    try:
+        while not stop_event.is_set():
+            item = counter.broadcaster.wait_for_frame(variant, last_seq, timeout=0.5)
+            if item is not None:
+                last_seq = item[0]
+                delivered[0] += 1
+    finally:
+        counter.broadcaster.unsubscribe(variant)
+
+
+def run(args, latency_ms):
+    video = SyntheticVideo(args.width, args.height, args.fps, args.figures_per_minute, args.crossing_seconds,
+                           spawn_seconds=args.duration, seed=args.seed)
+    detector = StubDetector(video, latency_ms, args.jitter_ms, args.miss_rate, args.detector, seed=args.seed)
+    counter = PeopleCounterNew(video_source=video, model=detector, target_fps=args.target_fps,
+                               buffer_size=args.buffer_size, zones=zones(), trace_sample_rate=1.0)
+
+    # Count the frames reaching the counting stage
+    counted = [0]
+    count_detections = counter._count_detections
+    def counting(*a, **kw):
+        counted[0] += 1
+        return count_detections(*a, **kw)
+    counter._count_detections = counting
+
+    _, rss_start = process_usage()
+    stop_viewers = threading.Event()
+    delivered = [[0] for _ in range(args.viewers)]
+    for viewer in delivered:
+        threading.Thread(target=watch, args=(counter, viewer, stop_viewers), daemon=True).start()
+
+    # The monitor thread prints every few seconds; keep it out of the report unless asked for
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        counter.start()
+        start = time.perf_counter()
+        run_seconds = video.duration + args.drain_seconds
+        samples = []  # (t, rss MB, frame queue, results queue)
+        while (elapsed := time.perf_counter() - start) < run_seconds:
+            time.sleep(1.0)
+            samples.append((elapsed, process_usage()[1], counter.frame_queue.qsize(),
+                            counter.results_queue.qsize()))
+        elapsed = time.perf_counter() - start
+        stop_viewers.set()
+        counter.stop()
+
+    samples = np.array(samples)
+    warm = samples[samples[:, 0] >= min(args.warmup_seconds, elapsed / 2)]
+    slope = float(np.polyfit(warm[:, 0] / 60, warm[:, 1], 1)[0]) if len(warm) > 2 else None
+
+    left_to_right, right_to_left = video.expected_crossings(video.width * 0.5)
+    band_passes = sum(video.expected_crossings(video.width * BAND[1] / FRAME_SIZE[0]))
+    tripwire, band = counter.zones.counts[TRIPWIRE_ID], counter.zones.counts[BAND_ID]
+    latency = counter.tracer.summary()
+    return {
+        'latency_ms': latency_ms,
+        'seconds': round(elapsed, 1),
+        'throughput_fps': {
+            'source': args.fps,
+            'read': round(video.frames_served / elapsed, 2),
+            'inferred': round(counter.frame_count / elapsed, 2),
+            'counted': round(counted[0] / elapsed, 2),
+            'annotated': round(counter.annotated_frames / elapsed, 2),
+            'delivered_per_viewer': round(float(np.mean([d[0] for d in delivered])) / elapsed, 2) if delivered else None,
+        },
+        'queues': {name: {'mean': round(float(samples[:, col].mean()), 2), 'max': int(samples[:, col].max())}
+                   for col, name in ((2, 'frame'), (3, 'results'))},
+        'drops': {
+            'source_missed': video.frames_missed,
+            'stale_replaced': counter.stale_frames,
+            'results_dropped': counter.dropped_results,
+            'source_missed_pct': round(100 * video.frames_missed / max(1, video.frames_missed + video.frames_served), 1),
+            'inference_skip_pct': round(100 * counter.stale_frames / max(1, video.frames_served), 1),
+        },
+        'memory': {
+            'rss_start_mb': round(rss_start, 1),
+            'rss_end_mb': round(float(samples[-1, 1]), 1),
+            'rss_peak_mb': round(float(samples[:, 1].max()), 1),
+            'rss_slope_mb_per_min': round(slope, 3) if slope is not None else None,
+            'tracks_seen': len(video.spawn_times),
+            'track_history_entries': len(counter.track_history),
+            'tripwire_track_states': len(counter.tripwires._tracks),
+        },
+        'counts': {
+            'tripwire': {'expected': [left_to_right, right_to_left], 'counted': [tripwire['entry'], tripwire['exit']]},
+            'band': {'expected': [band_passes, band_passes], 'counted': [band['entry'], band['exit']]},
+            'correct': ([tripwire['entry'], tripwire['exit']] == [left_to_right, right_to_left]
+                        and [band['entry'], band['exit']] == [band_passes, band_passes]),
+        },
+        'stage_latency_p50_ms': {span: values['p50_ms'] for span, values in latency.items() if values},
+    }
+
+
+def report(result):
+    throughput, queues, drops = result['throughput_fps'], result['queues'], result['drops']
+    memory, counts = result['memory'], result['counts']
+    print(f"detector {result['latency_ms']:g} ms, {result['seconds']} s")
+    print("  throughput fps: " + ", ".join(f"{stage} {value}" for stage, value in throughput.items()))
+    print("  queues (mean/max): " + ", ".join(f"{name} {q['mean']}/{q['max']}" for name, q in queues.items()))
+    print(f"  drops: {drops['source_missed']} source frames never read ({drops['source_missed_pct']}%), "
+          f"{drops['stale_replaced']} replaced before inference ({drops['inference_skip_pct']}% of read), "
+          f"{drops['results_dropped']} results dropped")
+    print(f"  memory: RSS {memory['rss_start_mb']} -> {memory['rss_end_mb']} MB (peak {memory['rss_peak_mb']}), "
+          f"{memory['rss_slope_mb_per_min']} MB/min after warmup; per-track state held for "
+          f"{memory['track_history_entries']} (zones) / {memory['tripwire_track_states']} (tripwires) "
+          f"of {memory['tracks_seen']} tracks")
+    print(f"  counts (entries, exits): tripwire {counts['tripwire']['counted']} vs {counts['tripwire']['expected']}, "
+          f"band {counts['band']['counted']} vs {counts['band']['expected']} -> "
+          f"{'correct' if counts['correct'] else 'MISMATCH'}")
+    if result['stage_latency_p50_ms']:
+        print("  stage latency p50 ms: " + ", ".join(f"{span} {value}" for span, value in result['stage_latency_p50_ms'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', default='30', help='Detector latency; a comma-separated list runs a sweep')
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--miss-rate', type=float, default=0.0, help='Probability of missing each box')
+    parser.add_argument('--detector', choices=['sleep', 'cpu'], default='sleep',
+                        help='sleep releases the CPU like GPU inference; cpu keeps a core busy')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds during which figures appear')
+    parser.add_argument('--drain-seconds', type=float, default=3.0, help='Extra seconds after the last figure left')
+    parser.add_argument('--warmup-seconds', type=float, default=10.0, help='Ignored for the memory slope')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=25.0, help='Source frame rate')
+    parser.add_argument('--target-fps', type=float, default=30.0, help='PeopleCounterNew target_fps')
+    parser.add_argument('--buffer-size', type=int, default=5)
+    parser.add_argument('--figures-per-minute', type=float, default=60.0)
+    parser.add_argument('--crossing-seconds', type=float, default=6.0)
+    parser.add_argument('--viewers', type=int, default=1, help='Simulated /video_feed viewers (0 skips annotation)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help="Show the pipeline's own monitor output")
+    args = parser.parse_args()
+
+    for latency_ms in (float(value) for value in args.latency_ms.split(',')):
+        result = run(args, latency_ms)
+        print(json.dumps(result)) if args.json else report(result)
+
+
+if __name__ == '__main__':
+    main()
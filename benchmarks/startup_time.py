@@ -0,0 +1,87 @@
+"""Time from process start until the web server answers, and until the pipeline is ready.
+
+Starts `python app.py` against a copy of the database on a free port, then
+polls /healthz (time to first request) and /readyz (time until the current
+camera's counter is built and running). Repeats a few times and reports each
+run plus the startup milestones the app recorded itself.
+
+    python -m benchmarks.startup_time --runs 3
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get(url):
+    """Return (status, JSON body), or None if the server is not accepting connections yet."""
+    try:
+        with urllib.request.urlopen(url, timeout=1.0) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+
+def measure(database, ready_timeout):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', PORT=str(port))
+    start = time.time()
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        while get(f'{base}/healthz') is None:
+            if process.poll() is not None:
+                raise RuntimeError('app.py exited during startup')
+            time.sleep(0.01)
+        first_request = time.time() - start
+
+        ready, body = None, None
+        while time.time() - start < ready_timeout:
+            status, body = get(f'{base}/readyz')
+            if status == 200:
+                ready = time.time() - start
+                break
+            time.sleep(0.05)
+        return first_request, ready, body
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--database', default=os.path.join(ROOT, 'instance', 'test.db'))
+    parser.add_argument('--ready-timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for run in range(args.runs):
+            database = os.path.join(directory, f'run{run}.db')
+            shutil.copy(args.database, database)
+            first_request, ready, body = measure(database, args.ready_timeout)
+            ready_text = f'{ready:.2f} s' if ready is not None else f'not ready after {args.ready_timeout:.0f} s'
+            print(f"run {run + 1}: first request {first_request:.2f} s, ready {ready_text}")
+            print(f"       app milestones {body.get('startup')}, pipelines {body.get('pipelines')}")
+
+
+if __name__ == '__main__':
+    main()
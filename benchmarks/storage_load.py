@@ -0,0 +1,148 @@
+"""Read/write latency of the zone count storage under concurrent load.
+
+Seeds a temporary database with ZoneCount history, then runs one writer
+inserting a row per zone at a fixed cadence while reader threads issue the
+/stats queries as fast as they can. Compares plain per-thread connections in
+SQLite's default rollback-journal mode ("baseline") with SQLiteStorage (WAL,
+single writer thread, read-only pool).
+
+    python -m benchmarks.storage_load --zones 20 --history 500000 --readers 8
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from instance.storage import (LatencyWindow, SQLiteStorage, insert_zone_counts, query_latest_counts,
+                              query_range_summary, to_db_time)
+
+SCHEMA = """
+CREATE TABLE zone_count (
+    id INTEGER NOT NULL PRIMARY KEY,
+    zone_id INTEGER NOT NULL,
+    timestamp DATETIME NOT NULL,
+    entries INTEGER,
+    exits INTEGER,
+    current_count INTEGER
+);
+CREATE INDEX idx_zone_timestamp ON zone_count (zone_id, timestamp);
+CREATE INDEX ix_zone_count_timestamp ON zone_count (timestamp);
+CREATE TABLE zone_latest (
+    zone_id INTEGER NOT NULL PRIMARY KEY,
+    timestamp DATETIME NOT NULL,
+    entries INTEGER,
+    exits INTEGER,
+    current_count INTEGER
+);
+"""
+
+
+def seed(path, zones, history):
+    """Create a database with `history` seconds of 1 Hz counts for every zone."""
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    start = datetime.now(pytz.UTC) - timedelta(seconds=history)
+    rows = ((zone_id, to_db_time(start + timedelta(seconds=second)), second, second, second % 10)
+            for second in range(history) for zone_id in range(1, zones + 1))
+    connection.executemany(
+        "INSERT INTO zone_count (zone_id, timestamp, entries, exits, current_count) VALUES (?, ?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+
+
+class PlainStorage:
+    """Baseline: a fresh default-journal connection per thread, like per-request sessions."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.read_latency = LatencyWindow()
+        self.write_latency = LatencyWindow()
+
+    def _connection(self):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = sqlite3.connect(self.path, timeout=30)
+            self.local.connection.row_factory = sqlite3.Row
+        return self.local.connection
+
+    def read(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return self._connection().execute(sql, params).fetchall()
+        finally:
+            self.read_latency.add(time.perf_counter() - start)
+
+    def write(self, job, *args):
+        start = time.perf_counter()
+        connection = self._connection()
+        result = job(connection, *args)
+        connection.commit()
+        self.write_latency.add(time.perf_counter() - start)
+        return result
+
+
+def run(store, zones, readers, duration, write_interval):
+    stop = threading.Event()
+    zone_ids = list(range(1, zones + 1))
+    errors = []
+
+    def writer():
+        while not stop.is_set():
+            stats = {zone_id: {'entry': 1, 'exit': 1, 'current': 1} for zone_id in zone_ids}
+            try:
+                store.write(insert_zone_counts, to_db_time(datetime.now(pytz.UTC)), stats)
+            except Exception as e:
+                errors.append(e)
+            time.sleep(write_interval)
+
+    def reader():
+        while not stop.is_set():
+            end = datetime.now(pytz.UTC)
+            try:
+                query_latest_counts(store, zone_ids)
+                query_range_summary(store, zone_ids[0], end - timedelta(minutes=60), end)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {'read': store.read_latency.summary(), 'write': store.write_latency.summary(), 'errors': len(errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--zones', type=int, default=20)
+    parser.add_argument('--history', type=int, default=50000, help='Seconds of 1 Hz history to seed per zone')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--write-interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ('baseline', 'storage'):
+            path = os.path.join(directory, f'{mode}.db')
+            seed(path, args.zones, args.history)
+            if mode == 'baseline':
+                store = PlainStorage(path)
+            else:
+                store = SQLiteStorage(path, readers=args.readers)
+                store.start()
+            result = run(store, args.zones, args.readers, args.duration, args.write_interval)
+            if mode == 'storage':
+                store.stop()
+            print(f"{mode:>8}: read {result['read']}")
+            print(f"{'':>8}  write {result['write']}, errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
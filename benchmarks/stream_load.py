@@ -0,0 +1,162 @@
+"""Concurrent MJPEG viewers: asyncio stream server vs the threaded Flask route.
+
+A synthetic counter publishes frames through a real FrameBroadcaster. The
+server under test runs in this process; a separate client process opens
+`--clients` /video_feed connections, reads them for `--duration` seconds
+and reports the frame rate each viewer received and how long its first frame
+took. Server threads and RSS are sampled throughout and reported at peak.
+
+    python -m benchmarks.stream_load --server async --clients 2000
+    python -m benchmarks.stream_load --server flask --clients 500
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import statistics
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.common import process_usage
+from modules.frame_broadcaster import FrameBroadcaster
+from modules.frame_tracer import LatencyTracer
+
+
+class SyntheticCounter:
+    """Publishes a moving test pattern at `fps` through a FrameBroadcaster."""
+
+    def __init__(self, fps):
+        self.broadcaster = FrameBroadcaster()
+        self.tracer = LatencyTracer(sample_rate=0.1)
+        self.fps = fps
+        threading.Thread(target=self._publish, daemon=True).start()
+
+    def current_stats(self):
+        return {1: {'name': 'Zone A', 'entry': int(time.time()) % 100, 'exit': 0, 'current': 1}}, None
+
+    def _publish(self):
+        frame_index = 0
+        while True:
+            frame = np.full((720, 1280, 3), 40, dtype=np.uint8)
+            x = (frame_index * 8) % 1180
+            cv2.rectangle(frame, (x, 300), (x + 100, 420), (0, 200, 255), -1)
+            self.broadcaster.publish(frame, self.tracer.new_trace())
+            frame_index += 1
+            time.sleep(1.0 / self.fps)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, counter, port):
+    if kind == 'async':
+        from modules.async_stream_server import AsyncStreamServer
+        server = AsyncStreamServer(lambda: counter, host='127.0.0.1', port=port)
+        server.start()
+        return
+    import app as flask_app
+    from werkzeug.serving import make_server
+    flask_app.counter = counter
+    server = make_server('127.0.0.1', port, flask_app.app, threaded=True)
+    server.socket.listen(4096)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+async def viewer(port, path, duration, results):
+    """Read one MJPEG stream and record (frames per second, seconds to first frame, start, end)."""
+    frames, carry, first_frame = 0, b'', None
+    try:
+        start = time.monotonic()
+        reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=1 << 20)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        deadline = time.monotonic() + duration
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            data = carry + chunk
+            frames += data.count(b'--frame\r\n')
+            carry = data[-9:]  # A boundary may straddle two reads
+            if frames and first_frame is None:
+                first_frame = time.monotonic() - start
+        writer.close()
+        results.append((frames / duration, first_frame, start, time.monotonic()))
+    except OSError:
+        results.append(None)
+
+
+def run_clients(port, path, clients, duration, ramp, queue):
+    async def main():
+        results = []
+        tasks = []
+        for i in range(clients):
+            tasks.append(asyncio.create_task(viewer(port, path, duration, results)))
+            if ramp:
+                await asyncio.sleep(ramp / clients)
+        await asyncio.gather(*tasks)
+        return results
+    queue.put(asyncio.run(main()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['async', 'flask'], default='async')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds each viewer reads')
+    parser.add_argument('--ramp', type=float, default=5.0, help='Seconds over which viewers connect')
+    parser.add_argument('--fps', type=float, default=10.0, help='Frames published per second')
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--quality', type=int, default=60)
+    args = parser.parse_args()
+
+    counter = SyntheticCounter(args.fps)
+    port = free_port()
+    start_server(args.server, counter, port)
+    time.sleep(1.0)
+    threads_before, rss_before = process_usage()
+
+    path = f"/video_feed?width={args.width}&quality={args.quality}"
+    queue = multiprocessing.Queue()
+    client = multiprocessing.Process(target=run_clients,
+                                     args=(port, path, args.clients, args.duration, args.ramp, queue))
+    client.start()
+    threads_peak, rss_peak = threads_before, rss_before
+    while client.is_alive() and queue.empty():
+        threads, rss = process_usage()
+        threads_peak, rss_peak = max(threads_peak, threads), max(rss_peak, rss)
+        time.sleep(0.5)
+    results = queue.get()
+    client.join()
+
+    rates = sorted(result[0] for result in results if result is not None)
+    first_frames = sorted(result[1] for result in results if result is not None and result[1] is not None)
+    failed = len(results) - len(rates)
+    # Most viewers connected at the same time (connecting is slower than --ramp under heavy load)
+    edges = sorted([(result[2], 1) for result in results if result is not None] +
+                   [(result[3], -1) for result in results if result is not None])
+    concurrent = max(np.cumsum([step for _, step in edges]), default=0)
+    print(f"{args.server}: {args.clients} viewers ({concurrent} at once), {args.fps:g} fps published, "
+          f"{args.width}px q{args.quality}")
+    if rates:
+        print(f"  received fps per viewer: median {statistics.median(rates):.2f}, "
+              f"p5 {rates[int(len(rates) * 0.05)]:.2f}, min {rates[0]:.2f}")
+    if first_frames:
+        print(f"  seconds to first frame: median {statistics.median(first_frames):.2f}, "
+              f"p99 {first_frames[int(len(first_frames) * 0.99)]:.2f}, max {first_frames[-1]:.2f}")
+    print(f"  failed connections: {failed}")
+    print(f"  server threads: {threads_before} idle, {threads_peak} peak")
+    print(f"  server RSS: {rss_before:.0f} MB idle, {rss_peak:.0f} MB peak")
+
+
+if __name__ == '__main__':
+    main()
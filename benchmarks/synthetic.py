@@ -0,0 +1,202 @@
+"""Synthetic camera and stub detector for benchmarking PeopleCounterNew without a camera or YOLO.
+
+SyntheticVideo behaves like a live cv2.VideoCapture: frames of figures walking
+across the scene are produced at a fixed rate whether or not anyone reads
+them, and a reader that falls behind gets the newest frame (the frames it
+missed are counted). Every frame carries its index in a pixel block in the
+top-left corner, so StubDetector can emit the exact boxes and track IDs of the
+figures in it, after an artificial inference latency. Since every figure walks
+from one side to the other, the expected tripwire and zone counts are known.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+INDEX_BLOCK = 24  # Pixel size of each of the 3 blocks encoding the frame index
+FIGURE_SIZE = (40, 100)  # Width, height of a figure at 720p
+
+
+class SyntheticVideo:
+    """Live source of figures crossing the frame horizontally at a constant speed.
+
+    New figures appear at `figures_per_minute` for `spawn_seconds`, each in a
+    random lane, walking left to right or right to left and taking
+    `crossing_seconds` to cross. After the spawn period the scene empties, so
+    every figure has fully crossed by the end of a run.
+    """
+
+    def __init__(self, width=1280, height=720, fps=25.0, figures_per_minute=60, crossing_seconds=6.0,
+                 spawn_seconds=60.0, seed=0, realtime=True):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.crossing_seconds = crossing_seconds
+        self.realtime = realtime
+        self.start_time = None
+        self.frames_served = 0
+        self.frames_missed = 0  # Produced by the live source but never read
+        self._last_index = -1
+        self._lock = threading.Lock()
+        self._background = self._draw_background()
+
+        rng = np.random.default_rng(seed)
+        count = int(figures_per_minute * spawn_seconds / 60)
+        scale = height / 720
+        self.figure_size = (int(FIGURE_SIZE[0] * scale), int(FIGURE_SIZE[1] * scale))
+        # One row per figure: spawn time, lane (centre y), direction (+1 left to right)
+        self.spawn_times = np.sort(rng.uniform(0, spawn_seconds, count))
+        self.lanes = rng.uniform(INDEX_BLOCK * 2 + self.figure_size[1] / 2,
+                                 height - self.figure_size[1] / 2, count)
+        self.directions = rng.choice([-1, 1], count)
+        self.duration = spawn_seconds + crossing_seconds  # Until the last figure has left
+
+    # cv2.VideoCapture interface used by CaptureEngine
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+    def grab(self):
+        self._next_index()
+        return True
+
+    def retrieve(self):
+        return True, self.render(self._last_index)
+
+    def read(self):
+        return True, self.render(self._next_index())
+
+    # Ground truth
+
+    def positions(self, index):
+        """Return (figure IDs, centres (N, 2)) of the figures visible in frame `index`."""
+        t = index / self.fps
+        progress = (t - self.spawn_times) / self.crossing_seconds
+        visible = np.nonzero((progress >= 0) & (progress <= 1))[0]
+        half_width = self.figure_size[0] / 2
+        start = np.where(self.directions[visible] > 0, -half_width, self.width + half_width)
+        x = start + self.directions[visible] * progress[visible] * (self.width + 2 * half_width)
+        return visible + 1, np.stack([x, self.lanes[visible]], axis=1)
+
+    def expected_crossings(self, line_x, until=None):
+        """Figures that fully crossed the vertical line x = `line_x` by `until` (seconds): (left to right, right to left)."""
+        until = self.duration if until is None else until
+        half_width = self.figure_size[0] / 2
+        # Time at which each figure's centre reaches the line
+        fraction = np.where(self.directions > 0, line_x + half_width, self.width + half_width - line_x)
+        crossed = self.spawn_times + fraction / (self.width + 2 * half_width) * self.crossing_seconds <= until
+        return int(np.count_nonzero(crossed & (self.directions > 0))), int(np.count_nonzero(crossed & (self.directions < 0)))
+
+    # Rendering
+
+    def render(self, index):
+        frame = self._background.copy()
+        _, centres = self.positions(index)
+        w, h = self.figure_size
+        for x, y in centres.astype(int):
+            cv2.rectangle(frame, (x - w // 2, y - h // 3), (x + w // 2, y + h // 2), (60, 120, 200), -1)
+            cv2.circle(frame, (x, y - h // 3 - w // 4), w // 3, (140, 170, 220), -1)
+        for i in range(3):  # Frame index, one byte per block
+            value = (index >> (8 * i)) & 0xFF
+            frame[:INDEX_BLOCK, i * INDEX_BLOCK:(i + 1) * INDEX_BLOCK] = value
+        return frame
+
+    def _draw_background(self):
+        frame = np.full((self.height, self.width, 3), 90, dtype=np.uint8)
+        for y in range(0, self.height, 40):
+            cv2.line(frame, (0, y), (self.width, y), (80, 80, 80), 1)
+        return frame
+
+    def _next_index(self):
+        """Index of the frame to return now: the newest one produced, after waiting for one not yet served."""
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = time.perf_counter()
+            if self.realtime:
+                index = int((time.perf_counter() - self.start_time) * self.fps)
+                if index <= self._last_index:
+                    index = self._last_index + 1
+                    time.sleep(max(0.0, self.start_time + index / self.fps - time.perf_counter()))
+            else:
+                index = self._last_index + 1
+            self.frames_missed += index - self._last_index - 1
+            self._last_index = index
+            self.frames_served += 1
+            return index
+
+
+def read_frame_index(frame, scale=1.0):
+    """Decode the frame index drawn by SyntheticVideo.render from a frame resized by `scale`."""
+    block = INDEX_BLOCK * scale
+    return sum(int(frame[int(block / 2), int(block * (i + 0.5)), 0]) << (8 * i) for i in range(3))
+
+
+class _Tensor:
+    """Just enough of a torch tensor for PeopleCounterNew._extract_detections."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _Boxes:
+    def __init__(self, xywh, ids):
+        self.xywh = _Tensor(xywh)
+        self.id = _Tensor(ids) if len(ids) else None
+
+
+class _Result:
+    def __init__(self, xywh, ids):
+        self.boxes = _Boxes(xywh, ids)
+
+
+class StubDetector:
+    """Drop-in for the YOLO model: returns the ground-truth figures of a SyntheticVideo frame.
+
+    Each call takes `latency_ms` (plus normally distributed `jitter_ms`), either
+    sleeping like a GPU inference (`mode='sleep'`) or keeping a CPU core busy
+    (`mode='cpu'`). `miss_rate` drops each box with that probability.
+    """
+
+    def __init__(self, video, latency_ms=30.0, jitter_ms=0.0, miss_rate=0.0, mode='sleep', seed=0):
+        self.video = video
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.miss_rate = miss_rate
+        self.mode = mode
+        self.calls = 0
+        self._rng = np.random.default_rng(seed)
+        self._work = np.random.default_rng(seed).random((256, 256), dtype=np.float32)
+
+    def track(self, frame, **kwargs):
+        start = time.perf_counter()
+        self.calls += 1
+        height, width = frame.shape[:2]
+        scale_x, scale_y = width / self.video.width, height / self.video.height
+        ids, centres = self.video.positions(read_frame_index(frame, scale_x))
+        if self.miss_rate:
+            keep = self._rng.random(len(ids)) >= self.miss_rate
+            ids, centres = ids[keep], centres[keep]
+        w, h = self.video.figure_size
+        xywh = np.column_stack([centres[:, 0] * scale_x, centres[:, 1] * scale_y,
+                                np.full(len(ids), w * scale_x), np.full(len(ids), h * scale_y)]).astype(np.float32)
+
+        latency = max(0.0, self.latency_ms + (self._rng.normal(0, self.jitter_ms) if self.jitter_ms else 0.0)) / 1000
+        if self.mode == 'cpu':
+            while time.perf_counter() - start < latency:
+                self._work @ self._work
+        else:
+            time.sleep(max(0.0, latency - (time.perf_counter() - start)))
+        return [_Result(xywh, ids.astype(np.float32))]
@@ -0,0 +1,195 @@
+"""Headless edge worker: counts people on this site's cameras and pushes the counts to a central app.
+
+Runs only PeopleCounterNew for the cameras given by ID, with no Flask,
+templates or local database. Their URLs and zones come from the central app's
+/ingest/config. That config is cached in the spool directory, so the worker
+can start while the central app is unreachable.
+
+Each zone's counts are sampled once a second. Only rows that changed are kept,
+plus one every `--keepalive` seconds. Every `--batch-seconds` the kept rows
+are sealed into a gzip-compressed batch on disk and pushed to /ingest/bulk.
+Batches stay on disk until the central app acknowledges them, so an outage
+only delays the history. On restart, counting resumes from the last counts
+spooled if they are ahead of the config's.
+
+    python edge_worker.py --central http://central:5000 --cameras 3,4
+    CENTRAL_URL=http://central:5000 EDGE_CAMERAS=3,4 INGEST_TOKEN=secret python edge_worker.py
+"""
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from modules.count_spool import CountSpool
+from modules.inference_scheduler import InferenceScheduler
+from modules.people_counter_new import PeopleCounterNew
+
+
+def request_central(url, token, data=None, timeout=10.0):
+    """GET (or POST gzip-compressed `data` to) the central app; returns the decoded JSON response."""
+    headers = {'X-Ingest-Token': token} if token else {}
+    if data is not None:
+        headers.update({'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    request = urllib.request.Request(url, data=data, headers=headers, method='POST' if data is not None else 'GET')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def load_config(central, camera_ids, token, cache_path):
+    """Cameras and zones from the central app, or from the last cached copy if it is unreachable."""
+    query = '&'.join(f'camera_id={camera_id}' for camera_id in camera_ids)
+    try:
+        config = request_central(f'{central}/ingest/config?{query}', token)
+        with open(cache_path, 'w') as f:
+            json.dump(config, f)
+        return config['cameras']
+    except (urllib.error.URLError, OSError) as e:
+        if not os.path.exists(cache_path):
+            raise RuntimeError(f"Central app unreachable and no cached config: {e}")
+        print(f"Central app unreachable ({e}), using cached config")
+        with open(cache_path) as f:
+            return json.load(f)['cameras']
+
+
+def resume_counts(cameras, last_counts):
+    """Start each zone's cumulative counts from the larger of the config's and those last spooled.
+
+    The config may be cached, or the central app may not have received the
+    spooled batches yet; counting up from lower values would store a regression.
+    """
+    for camera in cameras:
+        for zone in camera['zones']:
+            if zone['id'] in last_counts:
+                entries, exits, _ = last_counts[zone['id']]
+                zone['initial_entries'] = max(zone.get('initial_entries', 0), entries)
+                zone['initial_exits'] = max(zone.get('initial_exits', 0), exits)
+    return cameras
+
+
+def changed_rows(stats, timestamp, last_sent, keepalive):
+    """Rows of the zones whose counts changed since last sent (or not sent for `keepalive` seconds)."""
+    rows = []
+    for zone_id, data in stats.items():
+        counts = (data['entry'], data['exit'], data['current'])
+        previous = last_sent.get(zone_id)
+        if previous is None or previous[1] != counts or timestamp - previous[0] >= keepalive:
+            rows.append((zone_id, timestamp, *counts))
+            last_sent[zone_id] = (timestamp, counts)
+    return rows
+
+
+def send_batches(spool, central, token, stop_event):
+    """Thread function pushing sealed batches in order, backing off while the central app is unreachable."""
+    backoff = 1.0
+    while not stop_event.is_set():
+        sent = False
+        for path in spool.pending():
+            try:
+                response = request_central(f'{central}/ingest/bulk', token, spool.read(path))
+            except urllib.error.HTTPError as e:
+                if 400 <= e.code < 500:
+                    # Retrying a rejected batch would block the ones behind it
+                    print(f"Central app rejected batch {os.path.basename(path)} ({e.code}), dropping it")
+                    spool.ack(path)
+                    continue
+                print(f"Central app error {e.code}, retrying in {backoff:.0f}s")
+                break
+            except FileNotFoundError:
+                continue  # Dropped by the spool size limit
+            except (urllib.error.URLError, OSError) as e:
+                print(f"Central app unreachable ({e}), retrying in {backoff:.0f}s")
+                break
+            spool.ack(path)
+            sent = True
+            if response.get('duplicate'):
+                print(f"Batch {response['batch_id']} was already ingested")
+        else:
+            backoff = 1.0
+            stop_event.wait(1.0)
+            continue
+        backoff = 1.0 if sent else min(backoff * 2, 60.0)
+        stop_event.wait(backoff)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--central', default=os.environ.get('CENTRAL_URL', 'http://localhost:5000'))
+    parser.add_argument('--cameras', default=os.environ.get('EDGE_CAMERAS', ''), help='Comma-separated camera IDs')
+    parser.add_argument('--model', default=os.environ.get('EDGE_MODEL', 'yolo11s.pt'))
+    parser.add_argument('--worker-id', default=os.environ.get('EDGE_WORKER_ID', socket.gethostname()))
+    parser.add_argument('--spool', default=os.environ.get('EDGE_SPOOL', os.path.join('instance', 'edge-spool')))
+    parser.add_argument('--max-spool-mb', type=float, default=200.0)
+    parser.add_argument('--batch-seconds', type=float, default=10.0)
+    parser.add_argument('--keepalive', type=float, default=60.0, help='Send unchanged counts at least this often')
+    parser.add_argument('--inference-slots', type=int, default=int(os.environ.get('INFERENCE_SLOTS', 1)))
+    parser.add_argument('--decode-threads', type=int,
+                        default=int(os.environ['DECODE_THREADS']) if os.environ.get('DECODE_THREADS') else None,
+                        help="Decoder threads per camera (default: OpenCV's, one per CPU)")
+    args = parser.parse_args()
+
+    camera_ids = [int(camera_id) for camera_id in args.cameras.split(',') if camera_id.strip()]
+    if not camera_ids:
+        parser.error('no cameras given (--cameras or EDGE_CAMERAS)')
+    central = args.central.rstrip('/')
+    token = os.environ.get('INGEST_TOKEN')
+    spool = CountSpool(args.spool, args.worker_id, int(args.max_spool_mb * 1024 * 1024))
+    cameras = load_config(central, camera_ids, token, os.path.join(args.spool, 'config.json'))
+    cameras = resume_counts(cameras, spool.last_counts())
+    missing = set(camera_ids) - {camera['id'] for camera in cameras}
+    if missing:
+        print(f"Cameras {sorted(missing)} are unknown or inactive on the central app")
+
+    # The cameras share this machine's inference capacity by deadline and priority
+    scheduler = InferenceScheduler(slots=args.inference_slots)
+    counters = {}
+    for camera in cameras:
+        counter = PeopleCounterNew(video_source=camera['url'], model_path=args.model,
+                                   target_fps=camera['target_fps'], zones=camera['zones'],
+                                   decode_threads=args.decode_threads)
+        counter.inference_budget = scheduler.register(camera['id'], camera['target_fps'], camera['min_fps'],
+                                                      camera['priority'])
+        counter.start()
+        counters[camera['id']] = counter
+        print(f"Counting camera {camera['id']} ({camera['name']}) with {len(camera['zones'])} zones")
+
+    stop_event = threading.Event()
+    sender = threading.Thread(target=send_batches, args=(spool, central, token, stop_event), daemon=True)
+    sender.start()
+
+    last_sent = {}  # {zone_id: (timestamp, counts)}
+    last_seal = last_report = time.time()
+    try:
+        while True:
+            now = time.time()
+            for counter in counters.values():
+                stats, _ = counter.current_stats()
+                spool.append(changed_rows(stats, now, last_sent, args.keepalive))
+            if now - last_seal >= args.batch_seconds:
+                spool.seal()
+                last_seal = now
+            if now - last_report >= 60:
+                print(f"Spool: {spool.metrics()}, inference: {scheduler.metrics()['cameras']}")
+                for camera_id, counter in counters.items():
+                    capture = counter.capture_metrics()
+                    if capture is not None:
+                        print(f"Camera {camera_id} decode CPU: {capture['decode_cpu_percent']:.0f}% "
+                              f"({capture['decode_cpu_ms_per_frame']:.1f}ms per frame, "
+                              f"{capture['skipped_retrieves']} frames not retrieved)")
+                last_report = now
+            time.sleep(max(0.0, now + 1.0 - time.time()))
+    except KeyboardInterrupt:
+        print("Stopping")
+    finally:
+        for counter in counters.values():
+            counter.stop()
+        spool.seal()  # Sent on the next start if the central app is unreachable now
+        stop_event.set()
+        sender.join(timeout=5.0)
+
+
+if __name__ == '__main__':
+    main()
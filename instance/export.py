@@ -0,0 +1,212 @@
+"""Streaming export of the zone count history as CSV or Parquet.
+
+Rows are read with a cursor in fixed-size batches and written out one batch
+at a time, so memory stays constant however long the time range is. Each zone
+is exported in time order: its minute/hour rollups (where compaction has
+replaced the raw rows), then its raw 1 Hz counts.
+
+    python -m instance.export --camera 3 --start 2025-03-01 --end 2025-04-01 -o march.csv
+    python -m instance.export --zone 7 --zone 8 --format parquet -o counts.parquet
+
+Parquet output needs pyarrow (pip install pyarrow).
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+from instance.storage import SQLiteStorage, to_db_time
+
+EXPORT_COLUMNS = ('zone_id', 'camera_id', 'timestamp', 'resolution', 'entries', 'exits', 'current_count',
+                  'peak_count')
+FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+BATCH_SIZE = 50000  # Rows per cursor fetch, and per Parquet row group
+
+
+def load_pyarrow():
+    """Import pyarrow (optional, only needed for Parquet output)."""
+    import pyarrow
+    import pyarrow.parquet
+    return pyarrow, pyarrow.parquet
+
+
+def _select_zones(connection, zone_ids=None, camera_ids=None):
+    """[(zone_id, camera_id)] of the given zones and cameras' zones (all zones if neither), inactive ones included."""
+    where, params = [], []
+    if zone_ids:
+        where.append(f"id IN ({','.join('?' * len(zone_ids))})")
+        params.extend(zone_ids)
+    if camera_ids:
+        where.append(f"camera_id IN ({','.join('?' * len(camera_ids))})")
+        params.extend(camera_ids)
+    sql = "SELECT id, camera_id FROM zone" + (f" WHERE {' OR '.join(where)}" if where else "") + " ORDER BY id"
+    return connection.execute(sql, params).fetchall()
+
+
+def _zone_queries(zone_id, camera_id, start=None, end=None, iso_timestamps=True):
+    """[(sql, params)] reading a zone's rollups, then raw counts, in time order along the (zone_id, timestamp) indexes."""
+    where = "zone_id = ?"
+    params = [zone_id]
+    if start is not None:
+        where += " AND timestamp >= ?"
+        params.append(to_db_time(start))
+    if end is not None:
+        where += " AND timestamp <= ?"
+        params.append(to_db_time(end))
+    timestamp = "strftime('%Y-%m-%dT%H:%M:%fZ', timestamp)" if iso_timestamps else "timestamp"
+    return [
+        (f"SELECT zone_id, ?, {timestamp}, resolution, entries, exits, current_count, peak_count "
+         f"FROM zone_count_rollup WHERE {where} ORDER BY timestamp", (camera_id, *params)),
+        (f"SELECT zone_id, ?, {timestamp}, 'raw', entries, exits, current_count, current_count "
+         f"FROM zone_count WHERE {where} ORDER BY timestamp", (camera_id, *params)),
+    ]
+
+
+def export_batches(storage, zone_ids=None, camera_ids=None, start=None, end=None, iso_timestamps=True,
+                   batch_size=BATCH_SIZE):
+    """Yield lists of at most `batch_size` rows (EXPORT_COLUMNS) from one consistent database snapshot."""
+    with storage.read_snapshot() as connection:
+        for zone_id, camera_id in _select_zones(connection, zone_ids, camera_ids):
+            for sql, params in _zone_queries(zone_id, camera_id, start, end, iso_timestamps):
+                cursor = connection.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+
+
+def stream_csv(batches):
+    """Yield the rows as UTF-8 CSV, header first, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()  # Just the header if there were no rows
+
+
+class _ChunkSink:
+    """Write-only file object collecting what ParquetWriter writes until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def stream_parquet(batches):
+    """Yield the rows as a Parquet file (raw timestamps expected), one row group per batch."""
+    pa, pq = load_pyarrow()
+    schema = pa.schema([
+        ('zone_id', pa.int32()),
+        ('camera_id', pa.int32()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('resolution', pa.string()),
+        ('entries', pa.int64()),
+        ('exits', pa.int64()),
+        ('current_count', pa.int32()),
+        ('peak_count', pa.int32()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for rows in batches:
+            columns = list(zip(*rows))
+            # Stored timestamps are naive UTC; numpy parses them in C
+            columns[2] = np.array(columns[2], dtype='datetime64[us]')
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(storage, export_format='csv', **filters):
+    """Yield the encoded export of the zone count history matching `filters` (see export_batches)."""
+    if export_format == 'parquet':
+        return stream_parquet(export_batches(storage, iso_timestamps=False, **filters))
+    return stream_csv(export_batches(storage, **filters))
+
+
+def default_db_path():
+    """The database the web app uses: DATABASE_URL's SQLite path, relative paths under instance/."""
+    path = os.environ.get('DATABASE_URL', 'sqlite:///test.db').split('sqlite:///', 1)[-1]
+    return path if os.path.isabs(path) else os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+
+def parse_time(value):
+    """Parse an ISO 8601 date or timestamp, naive values being UTC."""
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return dt.replace(tzinfo=pytz.UTC) if dt.tzinfo is None else dt.astimezone(pytz.UTC)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=default_db_path(), help='SQLite database (default: from DATABASE_URL)')
+    parser.add_argument('--zone', type=int, action='append', help='Zone ID; repeat for several')
+    parser.add_argument('--camera', type=int, action='append', help="Export all of a camera's zones; repeat for several")
+    parser.add_argument('--start', type=parse_time, help='ISO 8601 start (UTC unless an offset is given)')
+    parser.add_argument('--end', type=parse_time, help='ISO 8601 end, inclusive')
+    parser.add_argument('--format', choices=sorted(FORMATS), default=None, help='Default: from the output extension')
+    parser.add_argument('-o', '--output', default='-', help="Output file ('-' for stdout, CSV only)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    export_format = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+    if export_format == 'parquet' and args.output == '-':
+        parser.error('Parquet output needs an output file')
+    if not os.path.exists(args.db):
+        parser.error(f'database {args.db} not found')
+    storage = SQLiteStorage(args.db)
+    chunks = stream_export(storage, export_format, zone_ids=args.zone, camera_ids=args.camera,
+                           start=args.start, end=args.end, batch_size=args.batch_size)
+
+    if args.output == '-':
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        return
+    # Written next to the output and renamed at the end, so a failed export leaves no partial file
+    temporary = f"{args.output}.tmp"
+    written = 0
+    try:
+        with open(temporary, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(temporary, args.output)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    print(f"Exported {written / 1024 / 1024:.1f} MB to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,12 @@
 from datetime import datetime
 import pytz
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 
 db = SQLAlchemy()
 
+ZONE_TYPES = ('polygon', 'line')
+
 class Camera(db.Model):
     """Camera source configuration"""
     id = db.Column(db.Integer, primary_key=True)
@@ -11,20 +14,28 @@ class Camera(db.Model):
     url = db.Column(db.String(500), nullable=False)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(pytz.UTC))
+    # Inference budget shared with the other running cameras (see InferenceScheduler)
+    target_fps = db.Column(db.Float, nullable=False, default=30.0, server_default='30')
+    min_fps = db.Column(db.Float, nullable=False, default=2.0, server_default='2')
+    priority = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Higher degrades last
     
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
             'url': self.url,
-            'active': self.active
+            'active': self.active,
+            'target_fps': self.target_fps,
+            'min_fps': self.min_fps,
+            'priority': self.priority
         }
 
 class Zone(db.Model):
     """Zone configuration model"""
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    points = db.Column(db.JSON, nullable=False)
+    points = db.Column(db.JSON, nullable=False)  # Polygon vertices, or the two endpoints of a line
+    zone_type = db.Column(db.String(20), nullable=False, default='polygon', server_default='polygon')  # 'polygon' or 'line' (tripwire)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(pytz.UTC))
     active = db.Column(db.Boolean, default=True) # To soft delete zones
     camera_id = db.Column(db.Integer, db.ForeignKey('camera.id'), nullable=False) # Camera source
@@ -33,7 +44,8 @@ class Zone(db.Model):
         return {
             'id': self.id,
             'name': self.name,
-            'points': self.points
+            'points': self.points,
+            'type': self.zone_type
         }
 
 class ZoneCount(db.Model):
@@ -67,4 +79,74 @@ class ZoneCount(db.Model):
                 .distinct(ZoneCount.zone_id)
                 .order_by(ZoneCount.zone_id, ZoneCount.timestamp.desc())
                 .all())
-    
\ No newline at end of file
+    
+
+class ZoneCountRollup(db.Model):
+    """Downsampled zone count history produced by the retention compactor"""
+    id = db.Column(db.Integer, primary_key=True)
+    zone_id = db.Column(db.Integer, db.ForeignKey('zone.id'), nullable=False)
+    resolution = db.Column(db.String(10), nullable=False)  # 'minute' or 'hour'
+    timestamp = db.Column(db.DateTime, nullable=False)  # Bucket start
+    entries = db.Column(db.Integer, default=0)  # Last cumulative value in the bucket
+    exits = db.Column(db.Integer, default=0)
+    current_count = db.Column(db.Integer, default=0)
+    peak_count = db.Column(db.Integer, default=0)  # Highest current_count in the bucket
+
+    __table_args__ = (
+        db.UniqueConstraint('resolution', 'zone_id', 'timestamp', name='uq_rollup_bucket'),
+        db.Index('idx_rollup_zone_timestamp', 'zone_id', 'timestamp'),
+    )
+
+class ZoneLatest(db.Model):
+    """Most recent counts of each zone, upserted with every ZoneCount write"""
+    __tablename__ = 'zone_latest'
+    zone_id = db.Column(db.Integer, db.ForeignKey('zone.id'), primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    entries = db.Column(db.Integer, default=0)
+    exits = db.Column(db.Integer, default=0)
+    current_count = db.Column(db.Integer, default=0)
+
+class ZoneDwell(db.Model):
+    """Dwell-time summary of each polygon zone, upserted with every ZoneCount write"""
+    __tablename__ = 'zone_dwell'
+    zone_id = db.Column(db.Integer, db.ForeignKey('zone.id'), primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, default=0)  # Tracks that entered and left again
+    mean_seconds = db.Column(db.Float)
+    p50_seconds = db.Column(db.Float)
+    p90_seconds = db.Column(db.Float)
+    p99_seconds = db.Column(db.Float)
+    sketch = db.Column(db.JSON, nullable=False)  # DwellSketch.to_dict(), restored when the counter starts
+
+class IngestBatch(db.Model):
+    """Zone-count batches received from edge workers, so a batch retried after a lost response is applied once"""
+    __tablename__ = 'ingest_batch'
+    batch_id = db.Column(db.String(100), primary_key=True)
+    worker = db.Column(db.String(100), nullable=False)
+    received_at = db.Column(db.DateTime, nullable=False)
+    rows = db.Column(db.Integer, default=0)
+
+# Columns added after the first release: {table: [(column, DDL)]}
+ADDED_COLUMNS = {
+    'zone': [('zone_type', "VARCHAR(20) NOT NULL DEFAULT 'polygon'")],
+    'camera': [('target_fps', "FLOAT NOT NULL DEFAULT 30"),
+               ('min_fps', "FLOAT NOT NULL DEFAULT 2"),
+               ('priority', "INTEGER NOT NULL DEFAULT 0")],
+}
+
+def upgrade_schema():
+    """Add columns missing from databases created before they existed.
+
+    db.create_all() only creates missing tables, so new columns on existing
+    tables are added here with ALTER TABLE.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for column, ddl in columns:
+                if column not in existing:
+                    connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+                    print(f"Added column {table}.{column}")
@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from instance.storage import from_db_time, to_db_time
+
+DEFAULT_POLICY = {
+    'raw_days': 7,  # 1 Hz ZoneCount rows older than this become minute rollups
+    'minute_days': 90,  # Minute rollups older than this become hourly rollups (kept forever)
+    'chunk_minutes': 10,  # Time span compacted per writer transaction
+    'interval_seconds': 300,  # Pause between compaction passes
+    'vacuum_pages': 1000,  # Pages released per incremental_vacuum step
+}
+
+BUCKET_FORMATS = {
+    'minute': '%Y-%m-%d %H:%M:00.000000',
+    'hour': '%Y-%m-%d %H:00:00.000000',
+}
+
+# {source: (table, peak column, row filter)} for the two compaction steps
+SOURCES = {
+    'raw': ('zone_count', 'current_count', ""),
+    'minute': ('zone_count_rollup', 'peak_count', "resolution = 'minute' AND "),
+}
+
+
+def _rollup_job(connection, source, resolution, start, end):
+    """Writer job: aggregate one time chunk into `resolution` buckets, then delete the source rows.
+
+    `source` is 'raw' (zone_count) or 'minute' (minute rollups). Chunk bounds are
+    aligned to the bucket size, so no bucket spans two chunks.
+    """
+    bucket = f"strftime('{BUCKET_FORMATS[resolution]}', timestamp)"
+    table, peak, row_filter = SOURCES[source]
+    where = f"{row_filter}timestamp >= ? AND timestamp < ?"
+    params = (start, end)
+
+    # Bare columns next to max(timestamp) come from the bucket's last row (SQLite min/max semantics)
+    connection.execute(f"""
+        INSERT INTO zone_count_rollup (zone_id, resolution, timestamp, entries, exits, current_count, peak_count)
+        SELECT last.zone_id, ?, last.bucket, last.entries, last.exits, last.current_count, peaks.peak
+        FROM (SELECT zone_id, {bucket} AS bucket, entries, exits, current_count, max(timestamp)
+              FROM {table} WHERE {where} GROUP BY zone_id, bucket) AS last
+        JOIN (SELECT zone_id, {bucket} AS bucket, max({peak}) AS peak
+              FROM {table} WHERE {where} GROUP BY zone_id, bucket) AS peaks
+          ON peaks.zone_id = last.zone_id AND peaks.bucket = last.bucket
+        ON CONFLICT (resolution, zone_id, timestamp) DO UPDATE SET
+            entries = excluded.entries, exits = excluded.exits, current_count = excluded.current_count,
+            peak_count = max(peak_count, excluded.peak_count)
+    """, (resolution,) + params + params)
+    written = connection.execute("SELECT changes()").fetchone()[0]
+    deleted = connection.execute(f"DELETE FROM {table} WHERE {where}", params).rowcount
+    return written, deleted
+
+
+def _vacuum_job(connection, pages):
+    """Maintenance job: release up to `pages` free pages, returning bytes reclaimed."""
+    page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+    before = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    connection.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    after = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    return (before - after) * page_size, after
+
+
+class RetentionCompactor:
+    """Background job applying the retention policy to the count history.
+
+    Raw 1 Hz rows older than `raw_days` are rolled up into minute buckets and
+    minute buckets older than `minute_days` into hourly buckets. Every chunk of
+    `chunk_minutes` is one small job on the storage writer thread, so count
+    writes interleave with compaction instead of waiting for it. Freed pages
+    are then returned to the filesystem with incremental vacuum.
+    """
+
+    def __init__(self, storage, policy=None):
+        self.storage = storage
+        self.policy = dict(DEFAULT_POLICY, **(policy or {}))
+        self.on_compacted = []  # Callables run after a pass changed the history
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.progress = {
+            'state': 'idle',
+            'last_run': None,
+            'raw_rows_compacted': 0,
+            'minute_rows_compacted': 0,
+            'rollup_rows_written': 0,
+            'reclaimed_bytes': 0,
+            'free_pages': None,
+            'auto_vacuum': None,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    def trigger(self):
+        """Run a pass now instead of waiting for the interval."""
+        self._wake.set()
+
+    def run_once(self):
+        """Apply the policy once: raw -> minute, minute -> hour, then vacuum."""
+        now = datetime.now(pytz.UTC).replace(tzinfo=None)
+        self.progress['state'] = 'compacting raw'
+        raw_cutoff = (now - timedelta(days=self.policy['raw_days'])).replace(second=0, microsecond=0)
+        self._compact('raw', 'minute', raw_cutoff, timedelta(minutes=self.policy['chunk_minutes']))
+
+        self.progress['state'] = 'compacting minutes'
+        minute_cutoff = (now - timedelta(days=self.policy['minute_days'])).replace(minute=0, second=0, microsecond=0)
+        self._compact('minute', 'hour', minute_cutoff, timedelta(hours=1))
+
+        self.progress['state'] = 'vacuuming'
+        self._vacuum()
+        self.progress['state'] = 'idle'
+        self.progress['last_run'] = datetime.now(pytz.UTC).isoformat()
+
+    def _compact(self, source, resolution, cutoff, chunk):
+        """Roll up `source` rows older than `cutoff`, oldest chunk first."""
+        table, _, row_filter = SOURCES[source]
+        oldest_sql = f"SELECT min(timestamp) FROM {table} WHERE {row_filter}timestamp < ?"
+        changed = False
+        while not self._stop_event.is_set():
+            oldest = self.storage.read(oldest_sql, (to_db_time(cutoff),))[0][0]
+            if oldest is None:
+                break
+            start = from_db_time(oldest)
+            start = (start.replace(second=0, microsecond=0) if resolution == 'minute'
+                     else start.replace(minute=0, second=0, microsecond=0))
+            end = min(start + chunk, cutoff)
+            written, deleted = self.storage.write(_rollup_job, source, resolution, to_db_time(start), to_db_time(end))
+            self.progress[f'{source}_rows_compacted'] += deleted
+            self.progress['rollup_rows_written'] += written
+            changed = True
+            time.sleep(0.01)  # Leave the writer to the count writes between chunks
+        if changed:
+            for callback in self.on_compacted:
+                callback()
+
+    def _vacuum(self):
+        auto_vacuum = self.storage.read("PRAGMA auto_vacuum")[0][0]
+        self.progress['auto_vacuum'] = {0: 'none', 1: 'full', 2: 'incremental'}.get(auto_vacuum, auto_vacuum)
+        if auto_vacuum != 2:
+            # Databases created before incremental auto_vacuum was enabled need a one-time
+            # VACUUM (see convert_to_incremental) before free pages can be released in steps
+            self.progress['free_pages'] = self.storage.read("PRAGMA freelist_count")[0][0]
+            return
+        while not self._stop_event.is_set():
+            reclaimed, free_pages = self.storage.submit_maintenance(_vacuum_job, self.policy['vacuum_pages']).result()
+            self.progress['reclaimed_bytes'] += reclaimed
+            self.progress['free_pages'] = free_pages
+            if free_pages == 0 or reclaimed == 0:
+                break
+            time.sleep(0.01)
+
+    def convert_to_incremental(self):
+        """Switch an existing database to incremental auto_vacuum (one full VACUUM, blocks writes while it runs)."""
+        def job(connection):
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute("VACUUM")
+        self.progress['state'] = 'converting to incremental vacuum'
+        self.storage.submit_maintenance(job).result()
+        self.progress['state'] = 'idle'
+
+    def _run_loop(self):
+        """Thread function running a pass every interval_seconds (or when triggered)."""
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.progress['state'] = f'error: {e}'
+                print(f"Error compacting count history: {e}")
+            self._wake.wait(self.policy['interval_seconds'])
+            self._wake.clear()
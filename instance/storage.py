@@ -0,0 +1,377 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from queue import Empty, Queue
+
+import numpy as np
+import pytz
+from sqlalchemy import event
+
+# Applied to every connection, including the Flask-SQLAlchemy ones
+PRAGMAS = [
+    "PRAGMA auto_vacuum=INCREMENTAL",  # Only takes effect for new databases (or after VACUUM)
+    "PRAGMA journal_mode=WAL",  # Readers never block the writer and vice versa
+    "PRAGMA synchronous=NORMAL",  # Durable across application crashes; fsync only at checkpoints
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # 16 MB page cache per connection
+]
+
+DB_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'  # How SQLAlchemy stores DateTime columns in SQLite
+
+
+def to_db_time(dt):
+    """Format a datetime the way SQLAlchemy stores it (naive UTC)."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(pytz.UTC)
+    return dt.strftime(DB_TIME_FORMAT)
+
+
+def from_db_time(value):
+    """Parse a stored DateTime value into a naive UTC datetime."""
+    return datetime.strptime(value, DB_TIME_FORMAT) if '.' in value else datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+
+# Change the database file rather than the connection, so read-only connections skip them
+FILE_PRAGMAS = {"PRAGMA auto_vacuum=INCREMENTAL"}
+
+
+def apply_pragmas(connection, read_only=False):
+    cursor = connection.cursor()
+    for pragma in PRAGMAS:
+        if read_only and pragma in FILE_PRAGMAS:
+            continue
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def configure_engine(engine):
+    """Apply the SQLite pragmas to every connection a SQLAlchemy engine opens."""
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection)
+
+
+class LatencyWindow:
+    """Thread-safe rolling window of latencies with percentile reporting."""
+
+    def __init__(self, size=2000):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, seconds):
+        with self._lock:
+            self._values.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            values = np.array(self._values)
+        if values.size == 0:
+            return None
+        p50, p99 = np.percentile(values, [50, 99]) * 1000
+        return {'p50_ms': round(float(p50), 2), 'p99_ms': round(float(p99), 2),
+                'max_ms': round(float(values.max() * 1000), 2), 'count': self.count}
+
+
+class SQLiteStorage:
+    """Single-writer, pooled-reader access to the SQLite database.
+
+    All writes are queued to one dedicated writer thread, each job running in its
+    own transaction, so writers never contend with each other. Reads use a pool
+    of read-only connections; with WAL they never wait for the writer.
+
+    The single writer is per process: every process that starts a
+    SQLiteStorage (the counting process, and each web worker for edge
+    ingestion) has its own writer thread, and Flask-SQLAlchemy's zone and
+    camera writes use their own connections. Those writers still contend
+    through SQLite's file lock, waiting up to busy_timeout for each other.
+    """
+
+    def __init__(self, db_path, readers=4, queue_size=10000):
+        self.db_path = db_path
+        self._jobs = Queue(maxsize=queue_size)
+        self._readers = Queue()
+        self._num_readers = readers
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.read_latency = LatencyWindow()
+        self.write_latency = LatencyWindow()  # Queue wait + execution
+        self.failed_writes = 0
+
+    def start(self):
+        """Open the writer connection and start the writer thread."""
+        if self._thread is not None:
+            return
+        # The writer connection also switches the database file to WAL mode
+        writer = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        apply_pragmas(writer)
+        for _ in range(self._num_readers):
+            reader = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            apply_pragmas(reader, read_only=True)
+            reader.row_factory = sqlite3.Row
+            self._readers.put(reader)
+        self._thread = threading.Thread(target=self._write_loop, args=(writer,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Drain pending writes and stop the writer thread."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def submit(self, job, *args):
+        """Queue `job(connection, *args)` to run in a transaction on the writer thread.
+
+        Returns a Future resolving to the job's return value.
+        """
+        future = Future()
+        self._jobs.put((job, args, future, time.perf_counter(), True))
+        return future
+
+    def submit_maintenance(self, job, *args):
+        """Like submit, but run the job outside a transaction (VACUUM, incremental_vacuum)."""
+        future = Future()
+        self._jobs.put((job, args, future, time.perf_counter(), False))
+        return future
+
+    def write(self, job, *args, timeout=30.0):
+        """Run a write job and wait for its result."""
+        return self.submit(job, *args).result(timeout=timeout)
+
+    def execute_write(self, sql, params=()):
+        """Queue a single statement, or many if `params` is a list of tuples."""
+        def job(connection):
+            if isinstance(params, list):
+                return connection.executemany(sql, params).rowcount
+            return connection.execute(sql, params).rowcount
+        return self.submit(job)
+
+    def read(self, sql, params=()):
+        """Run a query on a pooled read-only connection and return all rows."""
+        start = time.perf_counter()
+        connection = self._readers.get()
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            self._readers.put(connection)
+            self.read_latency.add(time.perf_counter() - start)
+
+    def read_cursor(self, sql, params=(), batch_size=5000):
+        """Yield rows of a query in batches of `batch_size`, holding one pooled connection."""
+        connection = self._readers.get()
+        try:
+            cursor = connection.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            self._readers.put(connection)
+
+    @contextmanager
+    def read_snapshot(self):
+        """Yield a dedicated read-only connection inside one read transaction.
+
+        For long reads such as exports: they don't hold a pooled reader, and all
+        their queries see the same snapshot even while compaction moves rows.
+        The WAL can't be checkpointed past that snapshot until it is closed.
+        """
+        connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            apply_pragmas(connection, read_only=True)
+            connection.execute("BEGIN")
+            yield connection
+        finally:
+            connection.close()
+
+    def metrics(self):
+        return {
+            'read': self.read_latency.summary(),
+            'write': self.write_latency.summary(),
+            'write_queue': self._jobs.qsize(),
+            'failed_writes': self.failed_writes
+        }
+
+    def _write_loop(self, connection):
+        """Thread function executing queued write jobs one transaction at a time."""
+        while not (self._stop_event.is_set() and self._jobs.empty()):
+            try:
+                job, args, future, queued_at, transactional = self._jobs.get(timeout=0.1)
+            except Empty:
+                continue
+            try:
+                if transactional:
+                    connection.execute("BEGIN IMMEDIATE")
+                result = job(connection, *args)
+                if transactional:
+                    connection.execute("COMMIT")
+                future.set_result(result)
+            except Exception as e:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                self.failed_writes += 1
+                future.set_exception(e)
+            finally:
+                self.write_latency.add(time.perf_counter() - queued_at)
+        connection.close()
+
+
+# Queries used by the web app, on top of SQLiteStorage
+
+# Keeps zone_latest at the newest row per zone, even if writes arrive out of order
+UPSERT_LATEST = """
+    INSERT INTO zone_latest (zone_id, timestamp, entries, exits, current_count) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (zone_id) DO UPDATE SET
+        timestamp = excluded.timestamp, entries = excluded.entries,
+        exits = excluded.exits, current_count = excluded.current_count
+    WHERE excluded.timestamp >= zone_latest.timestamp
+"""
+
+
+def insert_zone_counts(connection, timestamp, stats):
+    """Writer job: insert one ZoneCount row per zone from counter stats and update zone_latest."""
+    rows = [(zone_id, timestamp, data['entry'], data['exit'], data['current'])
+            for zone_id, data in stats.items()]
+    connection.executemany(
+        "INSERT INTO zone_count (zone_id, timestamp, entries, exits, current_count) VALUES (?, ?, ?, ?, ?)",
+        rows)
+    connection.executemany(UPSERT_LATEST, rows)
+    return len(rows)
+
+
+UPSERT_DWELL = """
+    INSERT INTO zone_dwell (zone_id, timestamp, count, mean_seconds, p50_seconds, p90_seconds, p99_seconds, sketch)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (zone_id) DO UPDATE SET
+        timestamp = excluded.timestamp, count = excluded.count, mean_seconds = excluded.mean_seconds,
+        p50_seconds = excluded.p50_seconds, p90_seconds = excluded.p90_seconds,
+        p99_seconds = excluded.p99_seconds, sketch = excluded.sketch
+    WHERE excluded.timestamp >= zone_dwell.timestamp
+"""
+
+
+def upsert_zone_dwell(connection, timestamp, summaries, sketches):
+    """Writer job: store the dwell summary and sketch of each zone in {zone_id: ...}."""
+    rows = [(zone_id, timestamp, summary['count'], summary['mean_s'], summary['p50_s'], summary['p90_s'],
+             summary['p99_s'], json.dumps(sketches[zone_id]))
+            for zone_id, summary in summaries.items() if zone_id in sketches]
+    connection.executemany(UPSERT_DWELL, rows)
+    return len(rows)
+
+
+def ingest_zone_counts(connection, batch_id, worker, received_at, rows):
+    """Writer job: insert an edge worker's batch of (zone_id, timestamp, entries, exits, current_count) rows.
+
+    Returns the number of rows inserted, or None if the batch was already
+    ingested. Rows of unknown zones are skipped.
+    """
+    inserted = connection.execute(
+        "INSERT INTO ingest_batch (batch_id, worker, received_at, rows) VALUES (?, ?, ?, 0) "
+        "ON CONFLICT (batch_id) DO NOTHING", (batch_id, worker, received_at))
+    if inserted.rowcount == 0:
+        return None
+    zone_ids = {row[0] for row in connection.execute("SELECT id FROM zone")}
+    rows = [row for row in rows if row[0] in zone_ids]
+    connection.executemany(
+        "INSERT INTO zone_count (zone_id, timestamp, entries, exits, current_count) VALUES (?, ?, ?, ?, ?)", rows)
+    connection.executemany(UPSERT_LATEST, rows)
+    connection.execute("UPDATE ingest_batch SET rows = ? WHERE batch_id = ?", (len(rows), batch_id))
+    return len(rows)
+
+
+def backfill_zone_latest(connection):
+    """Writer job: fill zone_latest for zones that have history but no row yet.
+
+    Runs once per zone after upgrading a database; each lookup is a seek on the
+    (zone_id, timestamp) index of the raw table, falling back to the rollups.
+    """
+    missing = [row[0] for row in connection.execute(
+        "SELECT id FROM zone WHERE id NOT IN (SELECT zone_id FROM zone_latest)")]
+    filled = 0
+    for zone_id in missing:
+        for table in ('zone_count', 'zone_count_rollup'):
+            row = connection.execute(
+                f"SELECT zone_id, timestamp, entries, exits, current_count FROM {table} "
+                f"WHERE zone_id = ? ORDER BY timestamp DESC LIMIT 1", (zone_id,)).fetchone()
+            if row is not None:
+                connection.execute(UPSERT_LATEST, row)
+                filled += 1
+                break
+    return filled
+
+
+def query_active_zones(storage, camera_id):
+    """Return [(id, name, camera_id)] of a camera's active zones."""
+    return storage.read(
+        "SELECT id, name, camera_id FROM zone WHERE active = 1 AND camera_id = ? ORDER BY id",
+        (camera_id,))
+
+
+def query_latest_counts(storage, zone_ids):
+    """Return {zone_id: row} with the most recent counts of each zone (primary-key lookups on zone_latest)."""
+    if not zone_ids:
+        return {}
+    placeholders = ",".join("?" * len(zone_ids))
+    rows = storage.read(
+        f"SELECT zone_id, timestamp, entries, exits, current_count FROM zone_latest "
+        f"WHERE zone_id IN ({placeholders})",
+        tuple(zone_ids))
+    return {row['zone_id']: row for row in rows}
+
+
+def query_zone_dwell(storage, zone_ids):
+    """Return {zone_id: row} with the stored dwell summary (and JSON sketch) of each zone."""
+    if not zone_ids:
+        return {}
+    placeholders = ",".join("?" * len(zone_ids))
+    rows = storage.read(
+        f"SELECT zone_id, count, mean_seconds, p50_seconds, p90_seconds, p99_seconds, sketch FROM zone_dwell "
+        f"WHERE zone_id IN ({placeholders})",
+        tuple(zone_ids))
+    return {row['zone_id']: row for row in rows}
+
+
+def _history_union(columns, start=None, end=None):
+    """SQL (and params) selecting a zone's raw counts and rollups as one history.
+
+    Compaction moves rows from zone_count into zone_count_rollup, so the two never
+    overlap in time. The filters are repeated in both branches so each uses its index.
+    """
+    where = "zone_id = ?"
+    params = []
+    if start is not None:
+        where += " AND timestamp >= ?"
+        params.append(to_db_time(start))
+    if end is not None:
+        where += " AND timestamp <= ?"
+        params.append(to_db_time(end))
+    raw_columns = columns.replace("peak_count", "current_count AS peak_count")
+    sql = (f"SELECT {raw_columns} FROM zone_count WHERE {where} "
+           f"UNION ALL SELECT {columns} FROM zone_count_rollup WHERE {where}")
+    return sql, params
+
+
+def query_range_summary(storage, zone_id, start, end):
+    """Return (first row, last row, peak current count) of a zone's history in [start, end], or None."""
+    history, params = _history_union("timestamp, entries, exits, current_count, peak_count", start, end)
+    params = (zone_id, *params, zone_id, *params)
+    first = storage.read(f"SELECT * FROM ({history}) ORDER BY timestamp ASC LIMIT 1", params)
+    if not first:
+        return None
+    last = storage.read(f"SELECT * FROM ({history}) ORDER BY timestamp DESC LIMIT 1", params)
+    peak = storage.read(f"SELECT max(peak_count) FROM ({history})", params)
+    return first[0], last[0], peak[0][0]
+
+
+def query_count_series(storage, zone_id, start=None, end=None):
+    """Return a zone's (timestamp, entries, exits, current_count) history in time order, rollups included."""
+    history, params = _history_union("timestamp, entries, exits, current_count", start, end)
+    return storage.read(f"{history} ORDER BY timestamp", (zone_id, *params, zone_id, *params))
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from modules.frame_broadcaster import normalize_variant
+
+BOUNDARY = b'frame'
+
+
+class _VariantPump:
+    """Moves the frames of one variant from the threaded broadcaster into the event loop.
+
+    One pump thread per active variant blocks on the counter's broadcaster; every
+    client of that variant is a coroutine awaiting the pump's frame event, so
+    clients cost no threads.
+    """
+
+    def __init__(self, server, variant):
+        self.server = server
+        self.variant = variant
+        self.clients = 0
+        self.seq = 0
+        self.frame = None  # (jpeg bytes, trace, tracer) of the newest frame
+        self.event = asyncio.Event()  # Replaced after every frame
+        self.stopped = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    async def next_frame(self, last_seq):
+        """Wait for a frame newer than `last_seq`; returns (seq, jpeg bytes, trace, tracer)."""
+        while self.seq <= last_seq:
+            await self.event.wait()
+        return (self.seq, *self.frame)
+
+    def _deliver(self, frame):
+        """Runs in the event loop: publish a frame and wake every waiting client."""
+        self.seq += 1
+        self.frame = frame
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+    def _run(self):
+        """Thread function following the current counter's broadcaster."""
+        width, quality = self.variant
+        subscribed, broadcaster_variant, last_seq = None, None, 0
+        try:
+            while not self.stopped.is_set():
+                current = self.server.get_counter()
+                if current is not subscribed:
+                    if subscribed is not None:
+                        subscribed.broadcaster.unsubscribe(broadcaster_variant)
+                    subscribed, last_seq = current, 0
+                    if subscribed is None:
+                        time.sleep(0.1)
+                        continue
+                    broadcaster_variant = subscribed.broadcaster.subscribe(width, quality)
+
+                item = subscribed.broadcaster.wait_for_frame(broadcaster_variant, last_seq, timeout=1.0)
+                if item is None:
+                    continue
+                last_seq, frame_bytes, trace = item
+                self.server.loop.call_soon_threadsafe(self._deliver, (frame_bytes, trace, subscribed.tracer))
+        finally:
+            if subscribed is not None:
+                subscribed.broadcaster.unsubscribe(broadcaster_variant)
+
+
+class AsyncStreamServer:
+    """asyncio HTTP server for the MJPEG feeds and live stats.
+
+    Serves GET /video_feed (width, quality, max_fps), /setup-feed, /stats/live
+    (JSON snapshot) and /stats/stream (Server-Sent Events) on its own port and
+    event loop thread, next to the Flask app. Every client is a coroutine, so
+    thousands of viewers share one thread; everything else stays in Flask.
+    """
+
+    def __init__(self, get_counter, host='0.0.0.0', port=5001, stats_interval=1.0):
+        self.get_counter = get_counter
+        self.host = host
+        self.port = port
+        self.stats_interval = stats_interval
+        self.loop = None
+        self._server = None
+        self._pumps = {}  # {(width, quality): _VariantPump}
+        self._stats = None  # (seq, JSON bytes) of the newest live stats snapshot
+        self._stats_event = None
+        self._streams = {}  # {task: reader} of open streams, checked for disconnects by _sweep
+        self._ready = threading.Event()
+        self.clients = 0
+        self.frames_sent = 0
+
+    def start(self):
+        """Run the server on a background thread; returns once it is listening."""
+        threading.Thread(target=self._run_loop, daemon=True).start()
+        self._ready.wait(timeout=10.0)
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def metrics(self):
+        return {
+            'clients': self.clients,
+            'frames_sent': self.frames_sent,
+            'variants': {f"{width or 'full'}x{quality}": pump.clients
+                         for (width, quality), pump in list(self._pumps.items())}
+        }
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._stats_event = asyncio.Event()
+        self._server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=4096,
+                             reuse_port=True))  # Several web workers can share the port
+        self.loop.create_task(self._poll_stats())
+        self.loop.create_task(self._sweep())
+        print(f"Async stream server listening on {self.host}:{self.port}")
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        """Serve one HTTP request."""
+        self.clients += 1
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            method, target = request.split(b'\r\n', 1)[0].decode('latin-1').split(' ')[:2]
+            url = urlsplit(target)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if method == 'GET' and url.path in ('/video_feed', '/setup-feed', '/stats/stream'):
+                self._streams[asyncio.current_task()] = reader
+            if method != 'GET':
+                await self._respond(writer, 405, b'Method Not Allowed')
+            elif url.path == '/video_feed':
+                await self._stream_frames(writer, _number(params, 'width', int),
+                                          _number(params, 'quality', int), _number(params, 'max_fps', float))
+            elif url.path == '/setup-feed':
+                await self._stream_frames(writer, None, None, None)
+            elif url.path == '/stats/live':
+                await self._respond(writer, 200, self._stats[1] if self._stats else b'{}', 'application/json')
+            elif url.path == '/stats/stream':
+                await self._stream_stats(writer)
+            else:
+                await self._respond(writer, 404, b'Not Found')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass  # Client went away or sent a malformed request
+        except asyncio.CancelledError:
+            pass  # Disconnected while idle, cancelled by _sweep
+        finally:
+            self.clients -= 1
+            self._streams.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _respond(self, writer, status, body, content_type='text/plain'):
+        reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _stream_frames(self, writer, width, quality, max_fps):
+        """MJPEG stream of one variant, skipping to the newest frame whenever the client is slow."""
+        variant = normalize_variant(width, quality)
+        pump = self._pumps.get(variant)
+        if pump is None:
+            pump = self._pumps[variant] = _VariantPump(self, variant)
+        pump.clients += 1
+        min_interval = 1.0 / max_fps if max_fps else 0
+        last_seq, last_sent = 0, 0
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=" + BOUNDARY +
+                         b"\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            while True:
+                wait = last_sent + min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                last_seq, frame_bytes, trace, tracer = await pump.next_frame(last_seq)
+                last_sent = time.monotonic()
+                writer.write(b'--' + BOUNDARY + b'\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+                await writer.drain()  # Backpressure: a slow client only delays itself
+                tracer.complete(trace, "display")
+                self.frames_sent += 1
+        finally:
+            pump.clients -= 1
+            if pump.clients == 0:
+                pump.stopped.set()
+                del self._pumps[variant]
+
+    async def _sweep(self):
+        """Cancel streams whose client disconnected while they were waiting for data to send."""
+        while True:
+            await asyncio.sleep(5.0)
+            for task, reader in list(self._streams.items()):
+                if reader.at_eof():
+                    task.cancel()
+
+    async def _poll_stats(self):
+        """Sample the live counts once per interval for all stats clients."""
+        seq = 0
+        while True:
+            counter = self.get_counter()
+            if counter is not None:
+                try:
+                    # current_stats may be a broker call in web workers, so keep it off the loop
+                    stats, _ = await self.loop.run_in_executor(None, counter.current_stats)
+                    body = json.dumps(stats).encode()
+                    if self._stats is None or body != self._stats[1]:
+                        seq += 1
+                        self._stats = (seq, body)
+                        event, self._stats_event = self._stats_event, asyncio.Event()
+                        event.set()
+                except Exception as e:
+                    print(f"Error reading live stats: {e}")
+            await asyncio.sleep(self.stats_interval)
+
+    async def _stream_stats(self, writer):
+        """Server-Sent Events stream with a message whenever the live counts change."""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        last_seq = 0
+        while True:
+            while self._stats is None or self._stats[0] <= last_seq:
+                await self._stats_event.wait()
+            last_seq, body = self._stats
+            writer.write(b'data: ' + body + b'\n\n')
+            await writer.drain()
+
+
+def _number(params, key, cast):
+    try:
+        return cast(params[key]) if key in params else None
+    except ValueError:
+        return None
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def process_rss_mb():
+    """Resident memory of this process in MB, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class CameraPool:
+    """Bounded pool of warm camera pipelines, least recently used evicted first.
+
+    The active camera's counter runs at full rate; the other pooled counters stay
+    in standby at `standby_fps`, with their capture open and their tracker state
+    and zones intact, so switching back to them is a pointer swap. The pool holds
+    at most `max_size` counters, and standby counters are evicted while their
+    estimated memory exceeds `memory_limit_mb`. The active counter is never
+    evicted.
+
+    Evicted counters are returned to the caller rather than stopped here, since
+    stopping joins their threads.
+    """
+
+    def __init__(self, max_size=3, memory_limit_mb=None, standby_fps=2.0):
+        self.max_size = max(1, int(max_size))
+        self.memory_limit_mb = memory_limit_mb
+        self.standby_fps = standby_fps
+        self.active_id = None
+        self._entries = OrderedDict()  # {camera_id: entry}, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, camera_id):
+        return camera_id in self._entries
+
+    def get(self, camera_id, config):
+        """Return the pooled counter of a camera if it was built with the same `config`, else None."""
+        with self._lock:
+            entry = self._entries.get(camera_id)
+            if entry is None or entry['config'] != config:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry['counter']
+
+    def activate(self, camera_id, counter=None, config=None, memory_mb=0.0):
+        """Make a camera the active one (adding `counter` to the pool if given) and the others standby.
+
+        With `camera_id` None every pooled counter goes to standby. Returns the
+        evicted [(camera_id, counter)], including a counter `counter` replaced.
+        """
+        evicted = []
+        with self._lock:
+            if counter is not None:
+                previous = self._entries.pop(camera_id, None)
+                if previous is not None and previous['counter'] is not counter:
+                    evicted.append((camera_id, previous['counter']))
+                self._entries[camera_id] = {'counter': counter, 'config': config,
+                                            'memory_mb': max(0.0, memory_mb), 'added': time.time()}
+            self.active_id = camera_id if camera_id in self._entries else None
+            if self.active_id is not None:
+                self._entries.move_to_end(camera_id)
+                self._entries[camera_id]['last_active'] = time.time()
+            evicted.extend(self._enforce_limits())
+            for pooled_id, entry in self._entries.items():
+                entry['counter'].set_standby(None if pooled_id == self.active_id else self.standby_fps)
+        self.evictions += len(evicted)
+        return evicted
+
+    def retain(self, camera_ids):
+        """Evict the counters of cameras not in `camera_ids` (deleted or deactivated); returns them."""
+        with self._lock:
+            evicted = [(camera_id, self._entries.pop(camera_id)['counter'])
+                       for camera_id in list(self._entries) if camera_id not in camera_ids]
+            if self.active_id not in self._entries:
+                self.active_id = None
+        self.evictions += len(evicted)
+        return evicted
+
+    def configure(self, max_size=None, memory_limit_mb=None, standby_fps=None):
+        """Change the limits (a memory limit of 0 removes it); returns the counters evicted to meet them."""
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max(1, int(max_size))
+            if memory_limit_mb is not None:
+                self.memory_limit_mb = memory_limit_mb or None
+            if standby_fps is not None:
+                self.standby_fps = standby_fps
+            evicted = self._enforce_limits()
+            for pooled_id, entry in self._entries.items():
+                if pooled_id != self.active_id:
+                    entry['counter'].set_standby(self.standby_fps)
+        self.evictions += len(evicted)
+        return evicted
+
+    def clear(self):
+        """Empty the pool; returns every counter it held."""
+        with self._lock:
+            evicted = [(camera_id, entry['counter']) for camera_id, entry in self._entries.items()]
+            self._entries.clear()
+            self.active_id = None
+        return evicted
+
+    def counters(self):
+        """Return [(camera_id, counter)] of every pooled counter, active one included."""
+        with self._lock:
+            return [(camera_id, entry['counter']) for camera_id, entry in self._entries.items()]
+
+    def metrics(self):
+        now = time.time()
+        with self._lock:
+            cameras = {camera_id: {
+                'state': 'active' if camera_id == self.active_id else 'standby',
+                'memory_mb': round(entry['memory_mb'], 1),
+                'idle_s': None if camera_id == self.active_id else round(now - entry.get('last_active', entry['added']), 1),
+                'capture': entry['counter'].capture_metrics()
+            } for camera_id, entry in self._entries.items()}
+            memory_mb = sum(entry['memory_mb'] for entry in self._entries.values())
+        rss = process_rss_mb()
+        return {
+            'size': len(cameras),
+            'max_size': self.max_size,
+            'memory_limit_mb': self.memory_limit_mb,
+            'memory_mb': round(memory_mb, 1),
+            'process_rss_mb': round(rss, 1) if rss is not None else None,
+            'standby_fps': self.standby_fps,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'cameras': cameras
+        }
+
+    def _enforce_limits(self):
+        """Pop least recently used standby entries until both limits hold (call with the lock held)."""
+        evicted = []
+        def over_limit():
+            if len(self._entries) > self.max_size:
+                return True
+            memory_mb = sum(entry['memory_mb'] for entry in self._entries.values())
+            return self.memory_limit_mb is not None and memory_mb > self.memory_limit_mb
+
+        while over_limit():
+            victim = next((camera_id for camera_id in self._entries if camera_id != self.active_id), None)
+            if victim is None:
+                break  # Only the active counter is left
+            evicted.append((victim, self._entries.pop(victim)['counter']))
+        return evicted
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+
+import cv2
+
+OPEN_LOCK_TIMEOUT = 10.0  # Seconds to wait for another engine's open before skipping decoder thread discovery
+_open_lock = threading.Lock()  # One open at a time, so each engine finds only its own decoder threads
+
+
+def _task_ids():
+    """Native IDs of this process's threads (Linux), or None."""
+    try:
+        return set(os.listdir('/proc/self/task'))
+    except OSError:
+        return None
+
+
+def _read_proc(path):
+    """Contents of a /proc file, or None if it is gone."""
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class CaptureEngine:
+    """Reads a video source at its own rate, converting only the frames that will be processed.
+
+    cv2.VideoCapture.read() is grab() (demux and decode) followed by
+    retrieve() (conversion to a BGR image). Every source frame is grabbed, so a
+    live stream never backs up in the decoder's buffers, but retrieve() is only
+    called when a frame is due at the requested interval; the other frames skip
+    the conversion, and the caller's resize and queueing. File sources are
+    paced at their own fps, since their grab() never waits.
+
+    `decode_threads` sets the decoder threads of the stream (FFmpeg frame or
+    slice threads; None keeps OpenCV's default of one per CPU, 1 decodes in
+    the capture thread) and `hw_accel` asks for hardware decoding where the
+    backend supports it. With many streams, 1 or 2 threads per stream avoids
+    running streams x CPUs decoder threads.
+
+    Decode CPU is measured per engine: the capture thread's own CPU time
+    (time.thread_time), plus that of the decoder threads the backend starts
+    while opening the source. Those are the threads that appear in
+    /proc/self/task during open() and aren't Python threads; their CPU time is
+    read from /proc (Linux; elsewhere only the capture thread is measured).
+    """
+
+    def __init__(self, source, decode_threads=None, hw_accel=False):
+        self.source = source
+        self.decode_threads = decode_threads
+        self.hw_accel = hw_accel
+        self.cap = None
+        self.paced = isinstance(source, str) and os.path.isfile(source)
+        self.declared_fps = None  # Source fps reported by the backend
+        self.frame_interval = None  # Measured interval between source frames (s)
+        self.next_due = 0.0  # When the next frame is to be retrieved
+        self.next_grab = None  # When a paced source's next frame is to be grabbed
+
+        # Counters
+        self.grabbed = 0
+        self.retrieved = 0
+        self.failures = 0
+
+        # Decode CPU, sampled about once a second by the capture thread
+        self.thread_cpu = {}  # {tid: CPU seconds} of the decoder threads, exited ones keeping their last value
+        self._tick = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._sample = None  # (time, grabbed, cpu seconds) at the start of the current window
+        self.source_fps = 0.0
+        self.decode_cpu_percent = 0.0  # Of one core
+        self.decode_cpu_ms_per_frame = 0.0
+
+    def open(self):
+        """Open the source in the calling thread (the one that will read it); returns the capture object."""
+        if hasattr(self.source, 'read'):
+            self.cap = self.source
+        else:
+            params = []
+            if self.decode_threads:
+                params += [cv2.CAP_PROP_N_THREADS, int(self.decode_threads)]
+            if self.hw_accel:
+                params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+            locked = _open_lock.acquire(timeout=OPEN_LOCK_TIMEOUT)
+            try:
+                before = _task_ids() if locked else None
+                if params:
+                    self.cap = cv2.VideoCapture(self.source, cv2.CAP_ANY, params)
+                else:
+                    self.cap = cv2.VideoCapture(self.source)
+                if before is not None:
+                    python_threads = {str(thread.native_id) for thread in threading.enumerate()}
+                    self.thread_cpu = dict.fromkeys((_task_ids() or set()) - before - python_threads, 0.0)
+            finally:
+                if locked:
+                    _open_lock.release()
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer to reduce latency
+
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if hasattr(self.cap, 'get') else getattr(self.cap, 'fps', 0)
+        self.declared_fps = fps if fps and 0 < fps <= 240 else None
+        self._sample = (time.time(), self.grabbed, self._cpu_seconds())
+        return self.cap
+
+    def read(self, interval):
+        """Grab the next source frame, and retrieve it if it is due `interval` seconds after the last one.
+
+        Returns (ok, frame); frame is None when the frame was only grabbed.
+        """
+        self._pace()
+        if not self.cap.grab():
+            self.failures += 1
+            return False, None
+        now = time.time()
+        self.grabbed += 1
+        self._update_metrics(now)
+
+        # A frame is due if it is nearer to the due time than the next source frame will be
+        frame_interval = self.frame_interval or (1.0 / self.declared_fps if self.declared_fps else 0.0)
+        slack = frame_interval / 2
+        if now < self.next_due - slack:
+            return True, None
+        ret, frame = self.cap.retrieve()
+        if not ret:
+            self.failures += 1
+            return False, None
+        self.retrieved += 1
+        # Keep to the schedule, unless it fell behind by more than an interval
+        self.next_due = self.next_due + interval if self.next_due + interval >= now else now + interval
+        return True, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+    def metrics(self):
+        return {
+            'source_fps': round(self.source_fps, 1),
+            'declared_fps': self.declared_fps,
+            'grabbed': self.grabbed,
+            'retrieved': self.retrieved,
+            'skipped_retrieves': self.grabbed - self.retrieved,
+            'failures': self.failures,
+            'decode_threads': self.decode_threads,
+            'decoder_threads': len(self.thread_cpu),  # Besides the capture thread
+            'hw_accel': self.hw_accel,
+            'decode_cpu_percent': round(self.decode_cpu_percent, 1),
+            'decode_cpu_ms_per_frame': round(self.decode_cpu_ms_per_frame, 2)
+        }
+
+    def _pace(self):
+        """Wait until a paced source's next frame is due at its declared fps."""
+        if not self.paced or not self.declared_fps:
+            return
+        now = time.time()
+        if self.next_grab is None or self.next_grab < now - 1.0:
+            self.next_grab = now  # Start, or resync after a stall
+        elif self.next_grab > now:
+            time.sleep(self.next_grab - now)
+        self.next_grab += 1.0 / self.declared_fps
+
+    def _update_metrics(self, now):
+        """Every second, update the source fps and decode CPU of the window that ended."""
+        start, grabbed, cpu = self._sample
+        if now - start < 1.0:
+            return
+        frames = self.grabbed - grabbed
+        cpu_now = self._cpu_seconds()
+        self.source_fps = frames / (now - start)
+        self.frame_interval = 1.0 / self.source_fps if frames else None
+        self.decode_cpu_percent = (cpu_now - cpu) / (now - start) * 100
+        self.decode_cpu_ms_per_frame = (cpu_now - cpu) / frames * 1000 if frames else 0.0
+        self._sample = (now, self.grabbed, cpu_now)
+
+    def _cpu_seconds(self):
+        """CPU time of the capture thread (the caller) and its decoder threads."""
+        for tid in self.thread_cpu:
+            stat = _read_proc(f"/proc/self/task/{tid}/stat")
+            if stat is None:
+                continue  # Exited
+            fields = stat.rsplit(')', 1)[1].split()
+            seconds = (int(fields[11]) + int(fields[12])) / self._tick  # utime + stime
+            if seconds < self.thread_cpu[tid]:
+                continue  # Exited, and its ID reused by another thread
+            self.thread_cpu[tid] = seconds
+        return time.thread_time() + sum(self.thread_cpu.values())
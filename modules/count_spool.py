@@ -0,0 +1,130 @@
+import gzip
+import json
+import os
+import threading
+import time
+
+
+class CountSpool:
+    """On-disk queue of zone-count batches waiting to be pushed to the central app.
+
+    Rows are collected in memory and seal() writes them as one gzip-compressed
+    JSON batch file, named by creation time so batches are sent in order. A
+    batch file is only deleted once the central app has acknowledged it, so
+    batches survive restarts and outages. Past `max_bytes`, the oldest batches
+    are dropped.
+
+    The last counts of each zone sealed into a batch are also kept on disk
+    (`last_counts.json`), so a restarted worker resumes its cumulative counts
+    from them rather than from a config cached before they were counted.
+    """
+
+    LAST_COUNTS = 'last_counts.json'
+
+    def __init__(self, directory, worker, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.worker = worker
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._rows = []
+        self._lock = threading.Lock()
+        self._last_counts = self._load_last_counts()  # {zone_id: [entries, exits, current_count]}
+        self.rows_spooled = 0
+        self.batches_sent = 0
+        self.batches_dropped = 0
+
+    def append(self, rows):
+        """Queue (zone_id, timestamp, entries, exits, current_count) rows for the next batch."""
+        with self._lock:
+            self._rows.extend(rows)
+
+    def seal(self):
+        """Write the queued rows as a batch file; returns its path, or None if there was nothing to write."""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return None
+        batch_id = f"{self.worker}-{time.time_ns()}"
+        payload = gzip.compress(json.dumps({'worker': self.worker, 'batch_id': batch_id, 'rows': rows}).encode())
+        path = os.path.join(self.directory, f"{batch_id.rsplit('-', 1)[1]}.json.gz")
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(payload)
+        os.replace(temporary, path)
+        self.rows_spooled += len(rows)
+        self._save_last_counts(rows)
+        self._enforce_limit()
+        return path
+
+    def last_counts(self):
+        """{zone_id: (entries, exits, current_count)} last sealed for each zone, across restarts."""
+        return {zone_id: tuple(counts) for zone_id, counts in self._last_counts.items()}
+
+    def pending(self):
+        """Paths of the batches not yet acknowledged, oldest first."""
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.endswith('.json.gz'))
+
+    def read(self, path):
+        """Return the gzip-compressed batch payload."""
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def ack(self, path):
+        """Forget a batch the central app acknowledged."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # Dropped by the size limit meanwhile
+            pass
+        self.batches_sent += 1
+
+    def metrics(self):
+        sizes = self._sizes()
+        return {
+            'pending_batches': len(sizes),
+            'pending_bytes': sum(size for _, size in sizes),
+            'queued_rows': len(self._rows),
+            'rows_spooled': self.rows_spooled,
+            'batches_sent': self.batches_sent,
+            'batches_dropped': self.batches_dropped
+        }
+
+    def _sizes(self):
+        """[(path, bytes)] of the pending batches, skipping any removed while listing."""
+        sizes = []
+        for path in self.pending():
+            try:
+                sizes.append((path, os.path.getsize(path)))
+            except FileNotFoundError:
+                pass
+        return sizes
+
+    def _load_last_counts(self):
+        try:
+            with open(os.path.join(self.directory, self.LAST_COUNTS)) as f:
+                return {int(zone_id): counts for zone_id, counts in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_last_counts(self, rows):
+        """Record the newest counts of the zones in `rows` (written after their batch)."""
+        for zone_id, timestamp, entries, exits, current_count in sorted(rows, key=lambda row: row[1]):
+            self._last_counts[zone_id] = [entries, exits, current_count]
+        path = os.path.join(self.directory, self.LAST_COUNTS)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(self._last_counts, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _enforce_limit(self):
+        sizes = self._sizes()
+        total = sum(size for _, size in sizes)
+        for path, size in sizes:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.batches_dropped += 1
+            print(f"Spool over {self.max_bytes // (1024 * 1024)} MB, dropped batch {os.path.basename(path)}")
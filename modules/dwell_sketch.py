@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+
+MAX_DWELL = 6 * 3600.0  # Seconds; longer stays are counted in the last bucket
+
+
+class DwellSketch:
+    """Constant-memory summary of dwell times: count, mean and quantiles.
+
+    Values are counted in logarithmic buckets whose bounds grow by a factor of
+    (1 + accuracy) / (1 - accuracy) from `min_value` to `max_value` seconds (as
+    in DDSketch), so every quantile is within `accuracy` relative error however
+    many values were added. Values outside the range go to the first or last
+    bucket; the count, mean and maximum stay exact.
+    """
+
+    def __init__(self, accuracy=0.02, min_value=0.1, max_value=MAX_DWELL):
+        self.accuracy = accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+        self._buckets = np.zeros(math.ceil(math.log(max_value / min_value) / self._log_gamma) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def add(self, value):
+        value = max(float(value), 0.0)
+        index = math.ceil(math.log(max(value, self.min_value) / self.min_value) / self._log_gamma)
+        self._buckets[min(index, len(self._buckets) - 1)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Dwell time at quantile `q` (0 to 1), or None if empty."""
+        if not self.count:
+            return None
+        index = int(np.searchsorted(np.cumsum(self._buckets), q * (self.count - 1), side='right'))
+        gamma = math.exp(self._log_gamma)
+        # Midpoint (in relative terms) of the bucket's bounds, never above the exact maximum
+        return min(self.min_value * 2 * gamma ** index / (gamma + 1), self.max)
+
+    def merge(self, other):
+        self._buckets += other._buckets
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self):
+        """{count, mean_s, p50_s, p90_s, p99_s, max_s} for stats responses."""
+        def seconds(value):
+            return round(value, 2) if value is not None else None
+        return {
+            'count': self.count,
+            'mean_s': seconds(self.mean),
+            'p50_s': seconds(self.quantile(0.5)),
+            'p90_s': seconds(self.quantile(0.9)),
+            'p99_s': seconds(self.quantile(0.99)),
+            'max_s': seconds(self.max if self.count else None)
+        }
+
+    def to_dict(self):
+        """JSON-serializable state; only non-empty buckets are listed."""
+        filled = np.nonzero(self._buckets)[0]
+        return {
+            'accuracy': self.accuracy,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+            'buckets': {str(index): int(self._buckets[index]) for index in filled}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['accuracy'], data['min_value'], data['max_value'])
+        for index, count in data['buckets'].items():
+            sketch._buckets[int(index)] = count
+        sketch.count = data['count']
+        sketch.total = data['total']
+        sketch.max = data['max']
+        return sketch
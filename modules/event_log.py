@@ -0,0 +1,183 @@
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+# One fixed-size record per zone entry or exit
+EVENT_DTYPE = np.dtype([
+    ('timestamp', '<f8'),  # Capture time of the frame, seconds since epoch (UTC)
+    ('track_id', '<i8'),
+    ('zone_id', '<i4'),
+    ('kind', 'i1'),  # ENTRY or EXIT
+])
+ENTRY = 1
+EXIT = -1
+MAX_BUCKETS = 10000  # Per zone, for aggregate()
+
+
+class EventLog:
+    """Append-only columnar log of per-track zone entry/exit events.
+
+    Events are buffered in memory and appended in batches to one binary file of
+    EVENT_DTYPE records per UTC hour (`events-YYYYMMDDHH.bin`). Files are never
+    rewritten, so range queries memory-map only the hours they touch and
+    binary-search the timestamp column instead of scanning rows.
+
+    A `read_only` log only answers queries: it creates nothing on disk and
+    must not be started or appended to.
+    """
+
+    def __init__(self, directory, flush_interval=1.0, flush_size=4096, read_only=False):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+
+        self._buffer = []
+        self._lock = threading.Lock()  # Guards _buffer
+        self._write_lock = threading.Lock()  # Serializes flushes
+        self._validated = {}  # {path: (records checked, last timestamp, sorted)}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.events_written = 0
+
+    def append(self, events):
+        """Buffer events given as (timestamp, track_id, zone_id, kind) tuples."""
+        with self._lock:
+            self._buffer.extend(events)
+            should_flush = len(self._buffer) >= self.flush_size
+        if should_flush:
+            self.flush()
+
+    def start(self):
+        """Start the background flush thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write out anything still buffered."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.flush()
+
+    def flush(self):
+        """Append buffered events to their hourly files."""
+        with self._lock:
+            if not self._buffer:
+                return
+            events, self._buffer = self._buffer, []
+
+        records = np.array(events, dtype=EVENT_DTYPE)
+        records = records[np.argsort(records['timestamp'], kind='stable')]
+        hours = (records['timestamp'] // 3600).astype(np.int64)
+        boundaries = np.flatnonzero(np.diff(hours)) + 1
+
+        with self._write_lock:
+            for chunk in np.split(records, boundaries):
+                with open(self._path_for_hour(int(chunk['timestamp'][0] // 3600)), 'ab') as f:
+                    f.write(chunk.tobytes())
+            self.events_written += len(records)
+
+    def query(self, start_ts, end_ts, zone_ids=None):
+        """Return all events with start_ts <= timestamp <= end_ts as a record array."""
+        parts = []
+        for path in self._paths_between(start_ts, end_ts):
+            records = self._load(path)
+            if records.size == 0:
+                continue
+            if self._is_sorted(path, records):
+                lo = np.searchsorted(records['timestamp'], start_ts, side='left')
+                hi = np.searchsorted(records['timestamp'], end_ts, side='right')
+                selected = records[lo:hi]
+            else:
+                ts = records['timestamp']
+                selected = records[(ts >= start_ts) & (ts <= end_ts)]
+            if zone_ids is not None:
+                selected = selected[np.isin(selected['zone_id'], list(zone_ids))]
+            parts.append(np.array(selected))  # Copy out of the memory map
+
+        if not parts:
+            return np.empty(0, dtype=EVENT_DTYPE)
+        return np.concatenate(parts)
+
+    def aggregate(self, start_ts, end_ts, zone_ids=None, bucket_seconds=None):
+        """Count entries and exits per zone, optionally per time bucket.
+
+        Returns {zone_id: {'entries': int, 'exits': int}}, or with `bucket_seconds`
+        {zone_id: {'buckets': [bucket start timestamps], 'entries': [...], 'exits': [...]}}.
+        Raises ValueError for a non-positive bucket or more than MAX_BUCKETS of them.
+        """
+        if bucket_seconds is not None:
+            if bucket_seconds <= 0:
+                raise ValueError("bucket must be positive")
+            if (end_ts - start_ts) // bucket_seconds + 1 > MAX_BUCKETS:
+                raise ValueError(f"At most {MAX_BUCKETS} buckets per query, use a larger bucket or a shorter range")
+        events = self.query(start_ts, end_ts, zone_ids)
+        zones, zone_index = np.unique(events['zone_id'], return_inverse=True)
+        is_entry = events['kind'] == ENTRY
+
+        if not bucket_seconds:
+            entries = np.bincount(zone_index, weights=is_entry, minlength=len(zones))
+            exits = np.bincount(zone_index, weights=~is_entry, minlength=len(zones))
+            return {int(zone_id): {'entries': int(entries[i]), 'exits': int(exits[i])}
+                    for i, zone_id in enumerate(zones)}
+
+        num_buckets = int((end_ts - start_ts) // bucket_seconds) + 1
+        bucket = ((events['timestamp'] - start_ts) // bucket_seconds).astype(np.int64)
+        flat = zone_index * num_buckets + bucket
+        size = len(zones) * num_buckets
+        entries = np.bincount(flat, weights=is_entry, minlength=size).reshape(len(zones), num_buckets)
+        exits = np.bincount(flat, weights=~is_entry, minlength=size).reshape(len(zones), num_buckets)
+        starts = (start_ts + np.arange(num_buckets) * bucket_seconds).tolist()
+        return {int(zone_id): {'buckets': starts,
+                               'entries': entries[i].astype(int).tolist(),
+                               'exits': exits[i].astype(int).tolist()}
+                for i, zone_id in enumerate(zones)}
+
+    def _flush_loop(self):
+        """Thread function flushing the buffer every flush_interval seconds."""
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing event log: {e}")
+
+    def _path_for_hour(self, hour):
+        stamp = datetime.fromtimestamp(hour * 3600, tz=timezone.utc).strftime('%Y%m%d%H')
+        return os.path.join(self.directory, f'events-{stamp}.bin')
+
+    def _paths_between(self, start_ts, end_ts):
+        """Existing hourly files overlapping [start_ts, end_ts]."""
+        first, last = int(start_ts // 3600), int(end_ts // 3600)
+        if not os.path.isdir(self.directory):
+            return []  # Read-only log of a camera without events
+        if last - first > 24 * 366:
+            # Very wide range: list the directory instead of probing every hour
+            hours = sorted(
+                int(datetime.strptime(name[7:17], '%Y%m%d%H').replace(tzinfo=timezone.utc).timestamp()) // 3600
+                for name in os.listdir(self.directory) if name.startswith('events-') and name.endswith('.bin'))
+            hours = [hour for hour in hours if first <= hour <= last]
+        else:
+            hours = range(first, last + 1)
+        return [path for path in map(self._path_for_hour, hours) if os.path.exists(path)]
+
+    def _load(self, path):
+        """Memory-map the complete records of an hourly file."""
+        count = os.path.getsize(path) // EVENT_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=EVENT_DTYPE)
+        return np.memmap(path, dtype=EVENT_DTYPE, mode='r', shape=(count,))
+
+    def _is_sorted(self, path, records):
+        """Whether a file's timestamps are non-decreasing, checking only records appended since last time."""
+        checked, last_ts, is_sorted = self._validated.get(path, (0, -np.inf, True))
+        if is_sorted and checked < len(records):
+            tail = records['timestamp'][checked:]
+            is_sorted = bool(tail[0] >= last_ts and np.all(np.diff(tail) >= 0))
+            self._validated[path] = (len(records), float(tail[-1]), is_sorted)
+        return is_sorted
@@ -0,0 +1,103 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+# Shared by all broadcasters; cv2.imencode/cv2.resize release the GIL so variants encode in parallel
+ENCODER_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 2),
+                                  thread_name_prefix="jpeg-encoder")
+
+DEFAULT_QUALITY = 95  # cv2.imencode default
+MIN_WIDTH = 160
+
+
+def normalize_variant(width=None, quality=None):
+    """Return the (width, quality) key of a stream variant; width 0 means full size."""
+    width = 0 if not width else max(MIN_WIDTH, int(width))
+    quality = DEFAULT_QUALITY if quality is None else min(100, max(10, int(quality)))
+    return width, quality
+
+
+def encode_variant(frame, variant):
+    """Resize (keeping aspect ratio) and JPEG-encode a frame for one variant."""
+    width, quality = variant
+    frame_height, frame_width = frame.shape[:2]
+    if width and width < frame_width:
+        height = int(round(frame_height * width / frame_width))
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ret else None
+
+
+class FrameBroadcaster:
+    """Fan annotated frames out to MJPEG viewers.
+
+    Each distinct (width, quality) variant requested by at least one viewer is
+    encoded exactly once per frame, and viewers block on a condition variable
+    until a newer frame is available instead of polling.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._variants = {}  # {(width, quality): subscriber count}
+        self._latest = {}  # {(width, quality): jpeg bytes} for the current sequence number
+        self._seq = 0
+        self._trace = None
+
+    @property
+    def subscriber_count(self):
+        return sum(self._variants.values())
+
+    def variant_counts(self):
+        """Return {"<width>x<quality>": subscribers} for the active variants."""
+        with self._condition:
+            return {f"{width or 'full'}x{quality}": count
+                    for (width, quality), count in self._variants.items()}
+
+    def subscribe(self, width=None, quality=None):
+        """Register a viewer for a variant and return its key."""
+        variant = normalize_variant(width, quality)
+        with self._condition:
+            self._variants[variant] = self._variants.get(variant, 0) + 1
+        return variant
+
+    def unsubscribe(self, variant):
+        """Unregister a viewer; the variant stops being encoded once unused."""
+        with self._condition:
+            remaining = self._variants.get(variant, 0) - 1
+            if remaining > 0:
+                self._variants[variant] = remaining
+            else:
+                self._variants.pop(variant, None)
+                self._latest.pop(variant, None)
+
+    def publish(self, frame, trace=None):
+        """Encode the frame once per active variant and wake waiting viewers."""
+        with self._condition:
+            variants = list(self._variants)
+        if not variants:
+            return
+
+        if len(variants) == 1:
+            encoded = [encode_variant(frame, variants[0])]
+        else:
+            encoded = list(ENCODER_POOL.map(lambda variant: encode_variant(frame, variant), variants))
+
+        with self._condition:
+            self._seq += 1
+            self._trace = trace
+            self._latest = {variant: data for variant, data in zip(variants, encoded) if data is not None}
+            self._condition.notify_all()
+
+    def wait_for_frame(self, variant, last_seq, timeout=1.0):
+        """Block until a frame newer than `last_seq` is encoded for `variant`.
+
+        Returns (seq, jpeg bytes, trace), or None on timeout.
+        """
+        with self._condition:
+            ready = self._condition.wait_for(
+                lambda: self._seq > last_seq and variant in self._latest, timeout=timeout)
+            if not ready:
+                return None
+            return self._seq, self._latest[variant], self._trace
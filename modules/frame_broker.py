@@ -0,0 +1,329 @@
+import os
+import pickle
+import socket
+import struct
+import threading
+import time
+from queue import Empty, Queue
+
+from modules.frame_broadcaster import normalize_variant
+from modules.frame_tracer import FrameTrace, LatencyTracer
+
+# Every message is a pickled header plus an optional raw payload (JPEG bytes)
+FRAME_HEADER = struct.Struct('!II')  # header length, payload length
+
+
+class BrokerError(RuntimeError):
+    """The counting process is unreachable or a remote call failed there."""
+
+
+def send_message(sock, header, payload=b''):
+    data = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(FRAME_HEADER.pack(len(data), len(payload)) + data + payload)
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Broker connection closed")
+        received += count
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    """Return (header, payload) of the next message."""
+    header_size, payload_size = FRAME_HEADER.unpack(_recv_exactly(sock, FRAME_HEADER.size))
+    header = pickle.loads(_recv_exactly(sock, header_size))
+    payload = _recv_exactly(sock, payload_size) if payload_size else b''
+    return header, payload
+
+
+class BrokerServer:
+    """Unix-socket broker run by the counting process.
+
+    Web worker processes connect to it to stream encoded frames of the current
+    counter and to call named handlers (stats, zone edits, camera switches). The
+    socket is only accessible to the user running the app, since messages are
+    pickled.
+
+    `get_counter` returns the current counter (or None while it is being built);
+    streams follow it across camera and model switches.
+    """
+
+    def __init__(self, socket_path, get_counter, handlers):
+        self.socket_path = socket_path
+        self.get_counter = get_counter
+        self.handlers = handlers  # {name: callable} available to remote calls
+        self._server = None
+        self._stop_event = threading.Event()
+        self.streams = 0
+        self.calls = 0
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Stale socket of a previous run
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._server.listen(128)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        print(f"Frame broker listening on {self.socket_path}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _accept_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        """Thread function serving one worker connection: a frame stream or a series of calls."""
+        try:
+            header, _ = recv_message(connection)
+            if header['op'] == 'subscribe':
+                self._stream(connection, header.get('width'), header.get('quality'))
+                return
+            while True:
+                self._call(connection, header)
+                header, _ = recv_message(connection)
+        except (ConnectionError, OSError, EOFError):
+            pass  # Worker went away
+        finally:
+            connection.close()
+
+    def _call(self, connection, header):
+        self.calls += 1
+        try:
+            result = self.handlers[header['name']](*header.get('args', ()), **header.get('kwargs', {}))
+            send_message(connection, {'result': result})
+        except (ConnectionError, OSError):
+            raise
+        except Exception as e:
+            send_message(connection, {'error': f"{type(e).__name__}: {e}"})
+
+    def _stream(self, connection, width, quality):
+        """Push every newly encoded frame of one variant until the worker disconnects."""
+        self.streams += 1
+        subscribed, variant, last_seq = None, None, 0
+        try:
+            while not self._stop_event.is_set():
+                current = self.get_counter()
+                if current is not subscribed:
+                    if subscribed is not None:
+                        subscribed.broadcaster.unsubscribe(variant)
+                    subscribed, last_seq = current, 0
+                    if subscribed is None:
+                        time.sleep(0.1)
+                        continue
+                    variant = subscribed.broadcaster.subscribe(width, quality)
+
+                item = subscribed.broadcaster.wait_for_frame(variant, last_seq, timeout=1.0)
+                if item is None:
+                    continue
+                last_seq, frame_bytes, trace = item
+                trace_info = (trace.trace_id, trace.capture_time, trace.sampled) if trace is not None else None
+                # A slow worker only blocks this thread; it then skips to the newest frame
+                send_message(connection, {'trace': trace_info}, frame_bytes)
+        finally:
+            self.streams -= 1
+            if subscribed is not None:
+                subscribed.broadcaster.unsubscribe(variant)
+
+
+class RemoteBroadcaster:
+    """Worker-side stand-in for FrameBroadcaster, fed from the broker.
+
+    Each variant watched by at least one viewer in this worker has a single
+    upstream stream, fanned out locally to all its viewers.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._condition = threading.Condition()
+        self._variants = {}  # {(width, quality): subscriber count}
+        self._latest = {}  # {(width, quality): (seq, jpeg bytes, trace)}
+        self._upstreams = {}  # {(width, quality): {'socket': ...}} of the variant's reader thread
+
+    @property
+    def subscriber_count(self):
+        return sum(self._variants.values())
+
+    def variant_counts(self):
+        with self._condition:
+            return {f"{width or 'full'}x{quality}": count
+                    for (width, quality), count in self._variants.items()}
+
+    def subscribe(self, width=None, quality=None):
+        variant = normalize_variant(width, quality)
+        with self._condition:
+            self._variants[variant] = self._variants.get(variant, 0) + 1
+            upstream = None
+            if variant not in self._upstreams:
+                upstream = self._upstreams[variant] = {'socket': None}
+        if upstream is not None:
+            threading.Thread(target=self._read_upstream, args=(variant, upstream), daemon=True).start()
+        return variant
+
+    def unsubscribe(self, variant):
+        with self._condition:
+            remaining = self._variants.get(variant, 0) - 1
+            if remaining > 0:
+                self._variants[variant] = remaining
+                return
+            self._variants.pop(variant, None)
+            self._latest.pop(variant, None)
+            upstream = self._upstreams.pop(variant, None)
+        if upstream is not None and upstream['socket'] is not None:
+            try:
+                upstream['socket'].shutdown(socket.SHUT_RDWR)  # Wakes and ends the reader thread
+            except OSError:
+                pass
+
+    def wait_for_frame(self, variant, last_seq, timeout=1.0):
+        """Block until a frame newer than `last_seq` arrives for `variant`; same contract as FrameBroadcaster."""
+        with self._condition:
+            ready = self._condition.wait_for(
+                lambda: self._latest.get(variant, (0,))[0] > last_seq, timeout=timeout)
+            if not ready:
+                return None
+            return self._latest[variant]
+
+    def _read_upstream(self, variant, upstream):
+        """Thread function receiving one variant from the broker, reconnecting until unsubscribed."""
+        seq = 0
+        while True:
+            with self._condition:
+                if self._upstreams.get(variant) is not upstream:
+                    return
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                with self._condition:
+                    if self._upstreams.get(variant) is not upstream:
+                        return
+                    upstream['socket'] = sock
+                send_message(sock, {'op': 'subscribe', 'width': variant[0], 'quality': variant[1]})
+                while True:
+                    header, frame_bytes = recv_message(sock)
+                    trace = None
+                    if header['trace'] is not None:
+                        trace_id, capture_time, sampled = header['trace']
+                        trace = FrameTrace(trace_id, capture_time, sampled)
+                    seq += 1
+                    with self._condition:
+                        if self._upstreams.get(variant) is not upstream:
+                            return
+                        self._latest[variant] = (seq, frame_bytes, trace)
+                        self._condition.notify_all()
+            except (ConnectionError, OSError, EOFError):
+                time.sleep(0.5)  # Counting process restarting, or we unsubscribed
+            finally:
+                sock.close()
+
+
+class RemoteTracer(LatencyTracer):
+    """Records capture-to-display latency in the worker; the other spans come from the counting process."""
+
+    def __init__(self, remote):
+        super().__init__(sample_rate=0.0)  # Traces arrive already sampled upstream
+        self.remote = remote
+
+    def summary(self):
+        summary = self.remote.call('latency') or {}
+        summary['capture_to_display'] = super().summary()['capture_to_display']
+        return summary
+
+
+class RemoteCounter:
+    """Web-worker proxy for the PeopleCounterNew running in the counting process.
+
+    Offers the parts of the counter API the web routes use; frames come from a
+    RemoteBroadcaster and everything else is a call to the broker.
+    """
+
+    def __init__(self, socket_path, pool_size=4, timeout=10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.broadcaster = RemoteBroadcaster(socket_path)
+        self.tracer = RemoteTracer(self)
+        self._connections = Queue()
+        for _ in range(pool_size):
+            self._connections.put(None)  # Connected lazily
+
+    def call(self, handler, /, *args, **kwargs):
+        """Call a broker handler in the counting process and return its result."""
+        try:
+            sock = self._connections.get(timeout=self.timeout)
+        except Empty:
+            raise BrokerError("No free broker connection")
+        try:
+            if sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+            send_message(sock, {'op': 'call', 'name': handler, 'args': args, 'kwargs': kwargs})
+            header, _ = recv_message(sock)
+        except (ConnectionError, OSError, EOFError) as e:
+            if sock is not None:
+                sock.close()
+            sock = None
+            raise BrokerError(f"Counting process unavailable: {e}")
+        finally:
+            self._connections.put(sock)
+        if 'error' in header:
+            raise BrokerError(header['error'])
+        return header['result']
+
+    # The web process never runs the pipeline itself
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @property
+    def frame_count(self):
+        return self.call('counter', 'frame_count')
+
+    @property
+    def debug_overlay(self):
+        return self.call('counter', 'debug_overlay')
+
+    @debug_overlay.setter
+    def debug_overlay(self, enabled):
+        self.call('set_debug_overlay', enabled)
+
+    def current_stats(self):
+        result = self.call('counter', 'current_stats')
+        return (result[0] if result else {}), None  # Traces stay in the counting process
+
+    def annotation_metrics(self):
+        return self.call('counter', 'annotation_metrics')
+
+    def capture_metrics(self):
+        return self.call('counter', 'capture_metrics')
+
+    def update_zones(self, zones):
+        return self.call('counter', 'update_zones', zones)
+
+    def update_single_zone(self, zone_id, **kwargs):
+        return self.call('counter', 'update_single_zone', zone_id, **kwargs)
+
+    def add_single_zone(self, *args, **kwargs):
+        return self.call('counter', 'add_single_zone', *args, **kwargs)
+
+    def delete_zone(self, zone_id):
+        return self.call('counter', 'delete_zone', zone_id)
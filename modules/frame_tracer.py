@@ -0,0 +1,97 @@
+import itertools
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class FrameTrace:
+    """Trace ID and per-stage timestamps that travel with a frame through the pipeline."""
+    __slots__ = ("trace_id", "sampled", "stages")
+
+    def __init__(self, trace_id, capture_time, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.stages = {"capture": capture_time}
+
+    @property
+    def capture_time(self):
+        return self.stages["capture"]
+
+    def mark(self, stage, timestamp=None):
+        """Record the time a frame reached a pipeline stage."""
+        self.stages[stage] = time.time() if timestamp is None else timestamp
+
+    def age(self, now=None):
+        """Seconds elapsed since the frame was captured."""
+        return (time.time() if now is None else now) - self.capture_time
+
+
+class LatencyTracer:
+    """Sampling tracer reporting latency percentiles between pipeline stages.
+
+    Every frame gets a trace ID, but only one in `1 / sample_rate` frames has its
+    stage latencies recorded so the tracer stays cheap at full frame rate.
+    """
+
+    # Stage pairs reported by summary(), in pipeline order
+    SPANS = [
+        ("capture_queue", "capture", "inference_start"),
+        ("inference", "inference_start", "inference_end"),
+        ("results_queue", "inference_end", "counted"),
+        ("annotation", "counted", "annotated"),
+        ("capture_to_display", "capture", "display"),
+        ("capture_to_persist", "capture", "persist"),
+    ]
+
+    def __init__(self, sample_rate=0.1, window=1000):
+        self.sample_rate = sample_rate
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._samples = {name: deque(maxlen=window) for name, _, _ in self.SPANS}
+
+    def new_trace(self, capture_time=None):
+        """Create a trace for a freshly captured frame."""
+        capture_time = time.time() if capture_time is None else capture_time
+        sampled = random.random() < self.sample_rate
+        return FrameTrace(next(self._ids), capture_time, sampled)
+
+    def record_pipeline(self, trace):
+        """Record the in-process spans once a frame has left the output stage."""
+        if trace is None or not trace.sampled:
+            return
+        with self._lock:
+            for name, start, end in self.SPANS[:4]:
+                if start in trace.stages and end in trace.stages:
+                    self._samples[name].append(trace.stages[end] - trace.stages[start])
+
+    def complete(self, trace, stage, timestamp=None):
+        """Mark a terminal stage ("display" or "persist") and record its capture-to-stage latency."""
+        if trace is None:
+            return
+        trace.mark(stage, timestamp)
+        if not trace.sampled:
+            return
+        with self._lock:
+            self._samples[f"capture_to_{stage}"].append(trace.stages[stage] - trace.capture_time)
+
+    def summary(self):
+        """Return p50/p99/max latency in milliseconds for each span."""
+        with self._lock:
+            snapshot = {name: np.array(values) for name, values in self._samples.items()}
+
+        summary = {}
+        for name, values in snapshot.items():
+            if values.size == 0:
+                summary[name] = None
+                continue
+            p50, p99 = np.percentile(values, [50, 99]) * 1000
+            summary[name] = {
+                "p50_ms": round(float(p50), 2),
+                "p99_ms": round(float(p99), 2),
+                "max_ms": round(float(values.max() * 1000), 2),
+                "samples": int(values.size),
+            }
+        return summary
@@ -0,0 +1,117 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+
+class HLSOutput:
+    """Encode annotated frames into rolling H.264 HLS segments with ffmpeg.
+
+    Frames are piped raw into a single ffmpeg process that writes `index.m3u8`
+    and its `.ts` segments into `output_dir`, deleting segments that fall out of
+    the playlist. A writer thread feeds ffmpeg at a constant `fps`, repeating the
+    latest frame when the pipeline is slower, so the pipeline never blocks on it.
+    """
+
+    PLAYLIST = "index.m3u8"
+
+    def __init__(self, output_dir, fps=15, segment_seconds=2, playlist_size=6, bitrate="1500k"):
+        self.ffmpeg = shutil.which("ffmpeg")
+        if self.ffmpeg is None:
+            raise RuntimeError("ffmpeg is required for HLS output but was not found on PATH")
+
+        self.output_dir = output_dir
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.playlist_size = playlist_size
+        self.bitrate = bitrate
+
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._process = None
+        self._thread = None
+        self.frames_written = 0
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.output_dir, self.PLAYLIST)
+
+    def write(self, frame):
+        """Hand the latest annotated frame to the encoder (never blocks)."""
+        with self._lock:
+            self._latest = frame
+        if self._thread is None:
+            self._start(frame.shape)
+
+    def close(self):
+        """Stop the writer thread and let ffmpeg finalize the playlist."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=5.0)
+            except (OSError, subprocess.TimeoutExpired):
+                self._process.kill()
+
+    def status(self):
+        return {
+            'running': self._process is not None and self._process.poll() is None,
+            'fps': self.fps,
+            'segment_seconds': self.segment_seconds,
+            'playlist_size': self.playlist_size,
+            'bitrate': self.bitrate,
+            'frames_written': self.frames_written
+        }
+
+    def _start(self, frame_shape):
+        """Launch ffmpeg sized to the first frame and start the writer thread."""
+        height, width = frame_shape[:2]
+
+        # Start from an empty directory so stale segments are never served
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        gop = max(1, int(self.fps * self.segment_seconds))  # One keyframe per segment
+        command = [
+            self.ffmpeg, "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+            "-r", str(self.fps), "-i", "-",
+            "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency",
+            "-pix_fmt", "yuv420p", "-b:v", self.bitrate, "-maxrate", self.bitrate,
+            "-bufsize", self.bitrate, "-g", str(gop), "-keyint_min", str(gop),
+            "-sc_threshold", "0",
+            "-f", "hls", "-hls_time", str(self.segment_seconds),
+            "-hls_list_size", str(self.playlist_size),
+            "-hls_flags", "delete_segments+independent_segments",
+            "-hls_segment_filename", os.path.join(self.output_dir, "segment_%05d.ts"),
+            self.playlist_path,
+        ]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self._thread = threading.Thread(target=self._write_frames, daemon=True)
+        self._thread.start()
+
+    def _write_frames(self):
+        """Thread function feeding ffmpeg the latest frame at a constant rate."""
+        interval = 1.0 / self.fps
+        next_tick = time.time()
+
+        while not self._stop_event.is_set():
+            with self._lock:
+                frame = self._latest
+            try:
+                self._process.stdin.write(frame.tobytes())
+                self.frames_written += 1
+            except (BrokenPipeError, OSError) as e:
+                print(f"HLS encoder stopped: {e}")
+                break
+
+            next_tick += interval
+            delay = next_tick - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.time()  # Fell behind, don't try to catch up
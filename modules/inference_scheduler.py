@@ -0,0 +1,208 @@
+import threading
+import time
+from collections import deque
+
+DEFAULT_COST = 0.05  # Seconds per inference assumed until a camera has been measured
+
+
+class CameraBudget:
+    """A camera's share of an InferenceScheduler.
+
+    The camera's inference thread calls acquire() once it has a frame to
+    infer, and release() after the inference. `target_fps`, `min_fps` and `priority` (higher is more
+    important) are the camera's settings; `limit_fps` additionally caps the
+    rate, e.g. while the camera is in standby.
+    """
+
+    def __init__(self, scheduler, key, target_fps, min_fps, priority):
+        self.scheduler = scheduler
+        self.key = key
+        self.target_fps = target_fps
+        self.min_fps = min_fps
+        self.priority = priority
+        self.limit_fps = None
+        self.allocated_fps = target_fps
+        self.cost = None  # Moving average of inference seconds
+        self.last_start = 0.0
+        self.waiting = False
+        self.registered_at = time.time()
+        self.completed = deque()  # Finish times of the inferences in the last window
+        self.skipped_frames = 0  # Older frames replaced by a fresher one before inference
+
+    @property
+    def rate_fps(self):
+        """The rate this camera asks for: its target, capped by limit_fps."""
+        return self.target_fps if self.limit_fps is None else min(self.target_fps, self.limit_fps)
+
+    def acquire(self, timeout=None):
+        """Block until this camera may run an inference; False on timeout."""
+        return self.scheduler._acquire(self, timeout)
+
+    def release(self, elapsed=None):
+        """Return the slot; `elapsed` is the inference time, or None if the inference failed."""
+        self.scheduler._release(self, elapsed)
+
+    def update(self, target_fps=None, min_fps=None, priority=None):
+        with self.scheduler._condition:
+            if target_fps is not None:
+                self.target_fps = target_fps
+            if min_fps is not None:
+                self.min_fps = min_fps
+            if priority is not None:
+                self.priority = priority
+            self.scheduler._allocate()
+            self.scheduler._condition.notify_all()
+
+    def limit(self, fps=None):
+        """Cap the rate below the target (None removes the cap)."""
+        with self.scheduler._condition:
+            self.limit_fps = fps
+            self.scheduler._allocate()
+            self.scheduler._condition.notify_all()
+
+    def close(self):
+        self.scheduler.unregister(self)
+
+
+class InferenceScheduler:
+    """Shares a fixed number of inference slots between cameras by earliest deadline.
+
+    Each camera's inference cost is measured, and the slots' time is allocated
+    first to every camera's minimum fps, then up to its target fps, highest
+    priority first in both rounds. When the CPU (or GPU) is saturated, the
+    lower-priority cameras are the ones degraded towards their minimum.
+
+    A camera's deadline is its last start plus 1 / allocated fps. A free slot goes
+    to the waiting camera with the earliest deadline among those not ahead of
+    their target rate, so spare capacity is still used up to the targets.
+    """
+
+    def __init__(self, slots=1, window=5.0):
+        self.slots = max(1, int(slots))
+        self.window = window  # Seconds over which achieved fps is measured
+        self._free = self.slots
+        self._budgets = []
+        self._condition = threading.Condition()
+        self._last_allocation = 0.0
+
+    def register(self, key, target_fps, min_fps=1.0, priority=0):
+        """Add a camera and return its CameraBudget."""
+        budget = CameraBudget(self, key, target_fps, min(min_fps, target_fps), priority)
+        with self._condition:
+            self._budgets.append(budget)
+            self._allocate()
+        return budget
+
+    def unregister(self, budget):
+        with self._condition:
+            if budget in self._budgets:
+                self._budgets.remove(budget)
+                self._allocate()
+                self._condition.notify_all()
+
+    def set_slots(self, slots):
+        with self._condition:
+            slots = max(1, int(slots))
+            self._free += slots - self.slots
+            self.slots = slots
+            self._allocate()
+            self._condition.notify_all()
+
+    def metrics(self):
+        now = time.time()
+        with self._condition:
+            cameras = {}
+            busy_time = 0.0
+            for budget in self._budgets:
+                achieved = self._achieved_fps(budget, now)
+                busy_time += achieved * (budget.cost or 0.0)
+                cameras[budget.key] = {
+                    'priority': budget.priority,
+                    'target_fps': budget.rate_fps,
+                    'min_fps': budget.min_fps,
+                    'allocated_fps': round(budget.allocated_fps, 2),
+                    'achieved_fps': round(achieved, 2),
+                    'avg_inference_ms': round(budget.cost * 1000, 1) if budget.cost is not None else None,
+                    'skipped_frames': budget.skipped_frames
+                }
+            return {
+                'slots': self.slots,
+                'busy_slots': self.slots - self._free,
+                'utilization': round(busy_time / self.slots, 2),
+                'cameras': cameras
+            }
+
+    def _achieved_fps(self, budget, now):
+        while budget.completed and budget.completed[0] < now - self.window:
+            budget.completed.popleft()
+        span = min(self.window, now - budget.registered_at)
+        return len(budget.completed) / span if span > 0 else 0.0
+
+    def _allocate(self):
+        """Split the slots' time between cameras: minimums first, then targets, by priority (lock held)."""
+        self._last_allocation = time.time()
+        known = [budget.cost for budget in self._budgets if budget.cost is not None]
+        default_cost = sum(known) / len(known) if known else DEFAULT_COST
+        capacity = float(self.slots)  # Inference seconds available per second
+        ordered = sorted(self._budgets, key=lambda budget: -budget.priority)
+        for budget in ordered:
+            budget.allocated_fps = 0.0
+        for share in ('min', 'target'):
+            for budget in ordered:
+                cost = budget.cost or default_cost
+                wanted = min(budget.min_fps, budget.rate_fps) if share == 'min' else budget.rate_fps
+                extra = min(max(0.0, wanted - budget.allocated_fps), capacity / cost)
+                budget.allocated_fps += extra
+                capacity -= extra * cost
+
+    def _next_budget(self, now):
+        """The waiting camera to serve now, or (None, seconds until one becomes eligible)."""
+        best, wake = None, None
+        for budget in self._budgets:
+            if not budget.waiting:
+                continue
+            eligible_at = budget.last_start + 1.0 / budget.rate_fps
+            if eligible_at > now:
+                wake = eligible_at - now if wake is None else min(wake, eligible_at - now)
+                continue
+            deadline = budget.last_start + 1.0 / max(budget.allocated_fps, 0.01)
+            if best is None or (deadline, -budget.priority) < best[0]:
+                best = ((deadline, -budget.priority), budget)
+        return (best[1], None) if best else (None, wake)
+
+    def _acquire(self, budget, timeout):
+        end = None if timeout is None else time.time() + timeout
+        with self._condition:
+            budget.waiting = True
+            self._condition.notify_all()  # A slot may be free and this camera next in line
+            try:
+                while True:
+                    now = time.time()
+                    if self._free > 0:
+                        chosen, wake = self._next_budget(now)
+                        if chosen is budget:
+                            self._free -= 1
+                            budget.last_start = now
+                            return True
+                        if chosen is not None:
+                            self._condition.notify_all()  # Hand the slot to the chosen camera
+                    else:
+                        wake = None
+                    if end is not None:
+                        if now >= end:
+                            return False
+                        wake = end - now if wake is None else min(wake, end - now)
+                    self._condition.wait(wake)
+            finally:
+                budget.waiting = False
+
+    def _release(self, budget, elapsed):
+        with self._condition:
+            self._free += 1
+            # A failed inference (elapsed None) still used its turn, so the camera's deadline stays put
+            if elapsed is not None:
+                budget.cost = elapsed if budget.cost is None else 0.9 * budget.cost + 0.1 * elapsed
+                budget.completed.append(time.time())
+                if time.time() - self._last_allocation >= 1.0:
+                    self._allocate()  # Follow changes in the measured costs
+            self._condition.notify_all()
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+CELL_SIZE = 16  # Pixels per grid cell at the pipeline's 1280x720
+
+
+class OccupancyHeatmap:
+    """Decaying occupancy of a camera's scene on a low-resolution grid.
+
+    Every frame's track centroids are binned into `cell`-pixel cells with one
+    np.bincount and weighted by the seconds since the previous frame, so each
+    cell holds the person-seconds spent in it. The whole grid decays with a
+    half-life of `half_life` seconds, so recent lingering dominates and old
+    patterns fade out.
+    """
+
+    def __init__(self, frame_size=(1280, 720), cell=CELL_SIZE, half_life=3600.0, max_step=1.0):
+        self.frame_size = frame_size
+        self.cell = cell
+        self.half_life = half_life
+        self.max_step = max_step  # Longest gap between frames credited as presence, seconds
+        self.columns = -(-frame_size[0] // cell)
+        self.rows = -(-frame_size[1] // cell)
+        self._grid = np.zeros(self.rows * self.columns, dtype=np.float64)
+        self._last_time = None
+        self._lock = threading.Lock()
+
+    def add(self, centroids, timestamp):
+        """Accumulate one frame of (N, 2) centroids in frame pixels."""
+        step = 0.0 if self._last_time is None else min(max(timestamp - self._last_time, 0.0), self.max_step)
+        self._last_time = timestamp
+        if step == 0.0:
+            return
+        cells = None
+        if len(centroids):
+            columns = np.clip((centroids[:, 0] // self.cell).astype(np.intp), 0, self.columns - 1)
+            rows = np.clip((centroids[:, 1] // self.cell).astype(np.intp), 0, self.rows - 1)
+            cells = np.bincount(rows * self.columns + columns, minlength=self._grid.size)
+        with self._lock:
+            self._grid *= 0.5 ** (step / self.half_life)
+            if cells is not None:
+                self._grid += cells * step
+
+    def snapshot(self):
+        """Return a copy of the grid as a (rows, columns) array of person-seconds."""
+        with self._lock:
+            return self._grid.reshape(self.rows, self.columns).copy()
+
+    def reset(self):
+        with self._lock:
+            self._grid[:] = 0.0
+
+    def save(self, path):
+        """Write the grid to `path` (.npz), replacing the previous snapshot atomically."""
+        grid = self.snapshot()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.tmp.npz"
+        np.savez(temporary, grid=grid, cell=self.cell, half_life=self.half_life, saved_at=time.time())
+        os.replace(temporary, path)
+
+    def load(self, path):
+        """Restore a saved grid, decayed for the time since it was saved; False if missing or incompatible."""
+        try:
+            with np.load(path) as data:
+                grid, cell, saved_at = data['grid'], int(data['cell']), float(data['saved_at'])
+        except (OSError, KeyError, ValueError):
+            return False
+        if cell != self.cell or grid.shape != (self.rows, self.columns):
+            return False
+        with self._lock:
+            self._grid = grid.ravel() * 0.5 ** (max(time.time() - saved_at, 0.0) / self.half_life)
+        return True
+
+
+def render_heatmap(grid, width=None):
+    """Encode a grid as a color-mapped PNG, scaled to `width` pixels (the grid's own size if None)."""
+    peak = grid.max()
+    image = (grid / peak * 255).astype(np.uint8) if peak > 0 else np.zeros(grid.shape, dtype=np.uint8)
+    image = cv2.applyColorMap(image, cv2.COLORMAP_INFERNO)
+    if width:
+        height = max(1, round(width * grid.shape[0] / grid.shape[1]))
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_LINEAR)
+    ok, png = cv2.imencode('.png', image)
+    return png.tobytes() if ok else None
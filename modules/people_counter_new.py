@@ -1,27 +1,58 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 import cv2
 import numpy as np
-import torch
-from ultralytics import YOLO
 import threading
 import time
-from queue import Queue
+from queue import Empty, Queue
+
+from modules.capture_engine import CaptureEngine
+from modules.frame_broadcaster import FrameBroadcaster
+from modules.dwell_sketch import MAX_DWELL, DwellSketch
+from modules.event_log import ENTRY, EXIT
+from modules.frame_tracer import LatencyTracer
+from modules.occupancy_heatmap import OccupancyHeatmap
+from modules.tripwire import TripwireCounter
+from modules.zone_compositor import ZoneCompositor
+from modules.zone_snapshot import ZoneSnapshot
+
+TRACK_IDLE_SECONDS = 10.0  # Zone history of a track unseen for this long is dropped (like TripwireCounter's)
+TRACK_PRUNE_INTERVAL = 5.0  # Seconds between scans for lost tracks
+
+def load_backends():
+    """Import torch and ultralytics (slow, so deferred until the first pipeline is built)."""
+    import torch
+    from ultralytics import YOLO
+    return torch, YOLO
 
 class PeopleCounterNew:
     def __init__(self, video_source=0, model_path="yolov11n.pt", 
-                 target_fps=30, buffer_size=5, zones=[]):
-        """Initialize the people counter system with optimized pipeline."""
+                 target_fps=30, buffer_size=5, zones=[], trace_sample_rate=0.1,
+                 tripwire_hysteresis=8.0, model=None, decode_threads=None, hw_accel=False):
+        """Initialize the people counter system with optimized pipeline.
+
+        `model` replaces the YOLO model loaded from `model_path` with any object
+        offering its track() method, and `video_source` may be a capture object
+        with cv2.VideoCapture's grab/retrieve/set/release (e.g. the benchmark
+        stubs). `decode_threads` and `hw_accel` configure the decoder (see
+        CaptureEngine).
+        """
         # Threading and queues
         self.frame_queue = Queue(maxsize=buffer_size)
         self.results_queue = Queue(maxsize=buffer_size)
-        self.output_queue = Queue(maxsize=buffer_size)
         self.stop_event = threading.Event()
         
-        # Initialize YOLO model
-        self.model = YOLO(model_path)
-        if torch.cuda.is_available():
-            self.model.to('cuda')
-            torch.backends.cudnn.benchmark = True  # Enable for improved performance
+        # Initialize YOLO model (torch/ultralytics are imported here so importing this module stays cheap)
+        if model is not None:
+            self.model = model
+        else:
+            torch, YOLO = load_backends()
+            self.model = YOLO(model_path)
+            if torch.cuda.is_available():
+                self.model.to('cuda')
+                torch.backends.cudnn.benchmark = True  # Enable for improved performance
+                print(f"Using device: cuda ({torch.cuda.get_device_name()})")
+            else:
+                print("Using device: cpu")
         
         # Model parameters
         self.model.conf = 0.5  # Confidence threshold
@@ -30,123 +61,216 @@ class PeopleCounterNew:
         # Video parameters
         self.video_source = video_source
         self.target_fps = target_fps
+        self.standby_fps = None  # Reduced processing rate while parked in a CameraPool
+        self.inference_budget = None  # CameraBudget of an InferenceScheduler shared with other cameras
+        self.stale_frames = 0  # Captured frames replaced by a newer one before inference
+        self.dropped_results = 0  # Inference results lost because the output thread lagged behind
+        self.decode_threads = decode_threads
+        self.hw_accel = hw_accel
+        self.capture = None  # CaptureEngine, created in the capture thread
         self.cap = None  # Will be initialized in the capture thread
         
         # Initialize tracking and counting
-        self.polygons = {}  # {zone_id: {points: [], name: str, entry: int, exit: int, current: int}}
+        self.zones = ZoneSnapshot()  # Replaced, never modified, on every zone edit
+        self.zone_edit_lock = threading.Lock()  # Serializes editors; the counting thread never takes it
+        self.counted_zones = None  # Snapshot the per-track state below was last updated for
+        self.count_overrides = deque()  # (zone_id, {count: value}) set by editors, applied by the counting thread
         self.track_history = defaultdict(lambda: {})  # {track_id: {zone_id: [history]}}
-        self.polygon_arrays = {}  # Pre-computed numpy arrays for polygons
+        self.track_last_seen = {}  # {track_id: timestamp}, to forget the history of lost tracks
+        self.last_track_prune = 0.0
+        self.zone_compositor = ZoneCompositor()
+        self.tripwires = TripwireCounter(hysteresis=tripwire_hysteresis)  # Line-crossing zones
+        self.event_sink = None  # Optional callable receiving [(timestamp, track_id, zone_id, kind)]
+        self.heatmap = OccupancyHeatmap()  # Where people linger, from every frame's centroids
+        self.zone_entered = {}  # {(track_id, zone_id): timestamp} of tracks currently inside a zone
+        self.last_dwell_prune = 0.0
         
         # Performance metrics
-        self.processing_times = []
+        self.processing_times = deque(maxlen=100)
+        self.processing_time_total = 0.0  # Running sum of processing_times
         self.frame_count = 0
         self.start_time = None
         self.output_fps = 0
         
+        # Latency tracing
+        self.tracer = LatencyTracer(sample_rate=trace_sample_rate)
+        self.latest_trace = None  # Trace of the frame the current counts come from
+        self.debug_overlay = False
+        
+        # Viewer-aware annotation
+        self.broadcaster = FrameBroadcaster()  # MJPEG viewers
+        self.annotated_frames = 0
+        self.skipped_annotations = 0
+        self.avg_annotation_time = 0.0
+        self.annotation_time_saved = 0.0
+        
         # Output writer
         self.writer = None
         self.output_url = None
+        self.outputs = []  # Additional outputs with write(frame)/close(), e.g. HLSOutput
 
         # Add initial zones
         self.update_zones(zones)
 
+    def set_standby(self, standby_fps=None):
+        """Process only `standby_fps` frames per second (None: back to target_fps).
+
+        The capture keeps reading the source at full rate so it stays live, but
+        frames that are not processed are only grabbed (see CaptureEngine).
+        """
+        self.standby_fps = standby_fps
+        if self.inference_budget is not None:
+            self.inference_budget.limit(standby_fps)
+
     def set_output(self, output_url):
         """Set output streaming URL"""
         self.output_url = output_url
 
-    def add_zone(self, points, name=None, id=None, initial_entries=0, initial_exits=0, initial_count=0):
-        """Add a new counting zone with initial counts."""
-        zone_id = id if id is not None else len(self.polygons)
-        # Convert points to integers if they aren't already
-        points = [[int(x), int(y)] for x, y in points]
-        
-        self.polygons[zone_id] = {
-            "points": points,
-            "name": name or f"Zone {zone_id + 1}",
-            "entry": initial_entries,
-            "exit": initial_exits,
-            "current": 0
-        }
-        self.polygon_arrays[zone_id] = np.array(points)
+    def add_output(self, output):
+        """Attach an output that receives every annotated frame."""
+        self.outputs = self.outputs + [output]
+
+    def remove_output(self, output):
+        """Detach and close an output."""
+        self.outputs = [o for o in self.outputs if o is not output]
+        output.close()
+
+    @property
+    def zones_version(self):
+        return self.zones.version
+
+    def _publish_zones(self, zones, counts, dwell):
+        """Compile the zones into a new snapshot and swap it in (editors hold zone_edit_lock)."""
+        self.zones = ZoneSnapshot(zones, counts, dwell, self.zones.version + 1, self.zones.frame_size)
+
+    def add_zone(self, points, name=None, id=None, initial_entries=0, initial_exits=0, initial_count=0,
+                 zone_type="polygon", initial_dwell=None):
+        """Add a new counting zone (polygon or two-point tripwire line) with initial counts and dwell sketch."""
+        with self.zone_edit_lock:
+            current = self.zones
+            zone_id = id if id is not None else len(current.zones)
+            zones, counts, dwell = dict(current.zones), dict(current.counts), dict(current.dwell)
+            zones[zone_id] = {
+                "points": [[int(x), int(y)] for x, y in points],
+                "name": name or f"Zone {zone_id + 1}",
+                "type": zone_type
+            }
+            counts[zone_id] = {"entry": initial_entries, "exit": initial_exits, "current": 0}
+            dwell.pop(zone_id, None)
+            if zone_type != "line":
+                dwell[zone_id] = DwellSketch.from_dict(initial_dwell) if initial_dwell else DwellSketch()
+            self._publish_zones(zones, counts, dwell)
         return zone_id
     
     def update_zones(self, zones_data):
-        """Update zones from web interface data."""
-        self.clear_zones()
-        for zone in zones_data:
-            # Convert points format if needed
-            if isinstance(zone.get('points', [])[0], dict):
-                points = [[p['x'], p['y']] for p in zone['points']]
-            else:
-                points = zone['points']
-            
-            # Add zone with initial counts if available
-            self.add_zone(
-                points=points,
-                name=zone.get('name', f'Zone {len(self.polygons) + 1}'),
-                id=zone.get('id'),
-                initial_entries=zone.get('initial_entries', 0),
-                initial_exits=zone.get('initial_exits', 0),
-                initial_count=zone.get('initial_count', 0)
-            )
+        """Replace all zones with the web interface data in one snapshot.
+
+        Zones that keep their ID and type keep their live counts and dwell
+        sketch unless initial counts are given, and their tracks' history unless
+        their points changed.
+        """
+        with self.zone_edit_lock:
+            current = self.zones
+            zones, counts, dwell = {}, {}, {}
+            for zone in zones_data:
+                # Convert points format if needed
+                if isinstance(zone.get('points', [])[0], dict):
+                    points = [[p['x'], p['y']] for p in zone['points']]
+                else:
+                    points = zone['points']
+                zone_id = zone.get('id') if zone.get('id') is not None else len(zones)
+                zone_type = zone.get('type', 'polygon')
+                zones[zone_id] = {
+                    "points": [[int(x), int(y)] for x, y in points],
+                    "name": zone.get('name', f'Zone {len(zones) + 1}'),
+                    "type": zone_type
+                }
+                
+                previous = current.zones.get(zone_id)
+                if 'initial_entries' not in zone and previous is not None and previous["type"] == zone_type:
+                    counts[zone_id] = current.counts[zone_id]
+                    if zone_id in current.dwell:
+                        dwell[zone_id] = current.dwell[zone_id]
+                    continue
+                
+                # Add zone with initial counts if available
+                counts[zone_id] = {
+                    "entry": zone.get('initial_entries', 0),
+                    "exit": zone.get('initial_exits', 0),
+                    "current": 0
+                }
+                if zone_type != "line":
+                    initial_dwell = zone.get('initial_dwell')
+                    dwell[zone_id] = DwellSketch.from_dict(initial_dwell) if initial_dwell else DwellSketch()
+            self._publish_zones(zones, counts, dwell)
             
-    def add_single_zone(self, points, name=None, id=None, initial_entries=0, initial_exits=0, initial_count=0):
+    def add_single_zone(self, points, name=None, id=None, initial_entries=0, initial_exits=0, initial_count=0,
+                        zone_type="polygon"):
         """Add a single new counting zone without affecting existing zones."""
-        zone_id = id if id is not None else max(self.polygons.keys(), default=-1) + 1
-        points = [[int(x), int(y)] for x, y in points]
-        
-        self.polygons[zone_id] = {
-            "points": points,
-            "name": name or f"Zone {zone_id + 1}",
-            "entry": initial_entries,
-            "exit": initial_exits,
-            "current": initial_count
-        }
-        self.polygon_arrays[zone_id] = np.array(points)
+        with self.zone_edit_lock:
+            current = self.zones
+            zone_id = id if id is not None else max(current.zones.keys(), default=-1) + 1
+            zones, counts, dwell = dict(current.zones), dict(current.counts), dict(current.dwell)
+            zones[zone_id] = {
+                "points": [[int(x), int(y)] for x, y in points],
+                "name": name or f"Zone {zone_id + 1}",
+                "type": zone_type
+            }
+            counts[zone_id] = {"entry": initial_entries, "exit": initial_exits, "current": initial_count}
+            dwell.pop(zone_id, None)
+            if zone_type != "line":
+                dwell[zone_id] = DwellSketch()
+            self._publish_zones(zones, counts, dwell)
         return zone_id
 
     def update_single_zone(self, zone_id, **kwargs):
         """Update an existing zone's properties without affecting other zones."""
-        if zone_id not in self.polygons:
-            raise ValueError(f"Zone {zone_id} does not exist")
+        with self.zone_edit_lock:
+            current = self.zones
+            if zone_id not in current.zones:
+                raise ValueError(f"Zone {zone_id} does not exist")
             
-        if 'points' in kwargs:
-            points = [[int(x), int(y)] for x, y in kwargs['points']]
-            self.polygons[zone_id]['points'] = points
-            self.polygon_arrays[zone_id] = np.array(points)
+            zones = dict(current.zones)
+            config = dict(zones[zone_id])
+            if 'points' in kwargs:
+                config["points"] = [[int(x), int(y)] for x, y in kwargs['points']]
+            if 'name' in kwargs:
+                config["name"] = kwargs['name']
+            zones[zone_id] = config
+            # The zone keeps its live counts, so nothing counted meanwhile is lost
+            self._publish_zones(zones, current.counts, current.dwell)
             
-        if 'name' in kwargs:
-            self.polygons[zone_id]['name'] = kwargs['name']
-
-        # Don't update counts unless explicitly provided
-        if 'initial_entries' in kwargs:
-            self.polygons[zone_id]['entry'] = kwargs['initial_entries']
-        if 'initial_exits' in kwargs:
-            self.polygons[zone_id]['exit'] = kwargs['initial_exits']
-        if 'initial_count' in kwargs:
-            self.polygons[zone_id]['current'] = kwargs['initial_count']
+            # Counts are only overwritten when explicitly provided, by the counting thread
+            overrides = {key: kwargs[argument] for argument, key in
+                         (('initial_entries', "entry"), ('initial_exits', "exit"), ('initial_count', "current"))
+                         if argument in kwargs}
+            if overrides:
+                self.count_overrides.append((zone_id, overrides))
+                if not (hasattr(self, 'output_thread') and self.output_thread.is_alive()):
+                    self._apply_count_overrides()
 
     def delete_zone(self, zone_id):
         """Delete a specific zone without affecting others."""
-        if zone_id in self.polygons:
-            del self.polygons[zone_id]
-            del self.polygon_arrays[zone_id]
-            # Clean up track history for this zone
-            for track in self.track_history.values():
-                if zone_id in track:
-                    del track[zone_id]
+        with self.zone_edit_lock:
+            current = self.zones
+            if zone_id in current.zones:
+                zones, counts, dwell = dict(current.zones), dict(current.counts), dict(current.dwell)
+                del zones[zone_id]
+                del counts[zone_id]
+                dwell.pop(zone_id, None)
+                self._publish_zones(zones, counts, dwell)
 
     def clear_zones(self):
         """Clear all counting zones."""
-        self.polygons.clear()
-        self.polygon_arrays.clear()
-        self.track_history.clear()
+        with self.zone_edit_lock:
+            self._publish_zones({}, {}, {})
 
     def point_in_zone(self, point, zone_id):
         """Check if a point is inside a specific zone."""
-        if zone_id not in self.polygon_arrays:
+        zones = self.zones
+        if zone_id not in zones.polygon_ids:
             return False
-        return cv2.pointPolygonTest(self.polygon_arrays[zone_id], point, False) >= 0
+        return bool(zones.inside(np.array([point]))[0, zones.polygon_ids.index(zone_id)])
 
     def start(self):
         """Start all processing threads"""
@@ -176,55 +300,75 @@ class PeopleCounterNew:
             self.output_thread.join(timeout=1.0)
         
         # Release resources
-        if self.cap is not None:
-            self.cap.release()
+        if self.capture is not None:
+            self.capture.release()
         if self.writer is not None:
             self.writer.release()
+        if self.inference_budget is not None:
+            self.inference_budget.close()
+        for output in self.outputs:
+            output.close()
 
     def capture_frames(self):
         """Thread function to capture frames from source"""
-        # Initialize video capture
-        self.cap = cv2.VideoCapture(self.video_source)
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Minimize buffer to reduce latency
-        
-        frame_time = 1.0 / self.target_fps
-        prev_time = time.time()
+        # Opened in this thread, so the decoder threads it starts are measured as this camera's
+        self.capture = CaptureEngine(self.video_source, self.decode_threads, self.hw_accel)
+        self.cap = self.capture.open()
         
         while not self.stop_event.is_set():
+            # Every source frame is grabbed; only those due at the processing rate are decoded to images
+            # (in standby, at standby_fps)
+            ret, frame = self.capture.read(1.0 / (self.standby_fps or self.target_fps))
+            if not ret:
+                print("Failed to read frame from source")
+                time.sleep(0.1)  # Wait before retrying
+                continue
+            if frame is None:
+                continue
             current_time = time.time()
             
-            # Maintain consistent capture rate
-            if current_time - prev_time >= frame_time:
-                ret, frame = self.cap.read()
-                if not ret:
-                    print("Failed to read frame from source")
-                    time.sleep(0.1)  # Wait before retrying
-                    continue
-                
-                # Resize for faster processing
-                # frame = cv2.resize(frame, (640, 480))
-                frame = cv2.resize(frame, (1280, 720))
-                
-                # If queue is full, skip frame to avoid backing up
-                if not self.frame_queue.full():
-                    self.frame_queue.put((frame, current_time))
-                else:
-                    print("Warning: Frame queue full, dropping frame")
-                
-                prev_time = current_time
-            else:
-                # Small sleep to avoid busy waiting
-                time.sleep(0.001)
+            # Resize for faster processing
+            # frame = cv2.resize(frame, (640, 480))
+            frame = cv2.resize(frame, (1280, 720))
+            
+            # If inference lags behind, replace the oldest queued frame so the newest is never lost
+            if self.frame_queue.full():
+                try:
+                    self.frame_queue.get_nowait()
+                    self._count_stale_frame()
+                except Empty:
+                    pass
+            self.frame_queue.put_nowait((frame, self.tracer.new_trace(current_time)))
 
     def process_frames(self):
         """Thread function to process frames with YOLO detection and tracking"""
         while not self.stop_event.is_set():
             try:
                 # Get frame from queue with timeout
-                frame, timestamp = self.frame_queue.get(timeout=0.1)
+                frame, trace = self.frame_queue.get(timeout=0.1)
+            except Empty:
+                continue  # No frame yet (e.g. in standby, or the source is offline)
+            
+            # Wait for this camera's turn when the inference is shared with other cameras. Only cameras
+            # with a frame ask for a turn, so a stalled source never holds up the others
+            budget = self.inference_budget
+            if budget is not None:
+                while not budget.acquire(timeout=0.5):
+                    if self.stop_event.is_set():
+                        return
+            process_time = None
+            try:
+                # Always run on the freshest frame; older ones queued meanwhile are skipped
+                while True:
+                    try:
+                        frame, trace = self.frame_queue.get_nowait()
+                    except Empty:
+                        break
+                    self._count_stale_frame()
                 
                 # Start processing timer
                 start_process = time.time()
+                trace.mark("inference_start", start_process)
                 
                 # Run detection and tracking
                 results = self.model.track(
@@ -236,17 +380,21 @@ class PeopleCounterNew:
                 )
                 
                 # Record processing time
-                process_time = time.time() - start_process
-                self.processing_times.append(process_time)
+                end_process = time.time()
+                process_time = end_process - start_process
+                trace.mark("inference_end", end_process)
                 
-                # Keep only last 100 measurements for stats
-                if len(self.processing_times) > 100:
-                    self.processing_times.pop(0)
+                # Keep only last 100 measurements for stats, with a running sum for the average
+                if len(self.processing_times) == self.processing_times.maxlen:
+                    self.processing_time_total -= self.processing_times[0]
+                self.processing_times.append(process_time)
+                self.processing_time_total += process_time
                 
                 # Put results in queue if not full
                 if not self.results_queue.full():
-                    self.results_queue.put((frame, results, timestamp, process_time))
+                    self.results_queue.put((frame, results, trace, process_time))
                 else:
+                    self.dropped_results += 1
                     print("Warning: Results queue full, dropping processed frame")
                 
                 self.frame_count += 1
@@ -255,91 +403,230 @@ class PeopleCounterNew:
                 if not self.stop_event.is_set():  # Only print if not stopping
                     print(f"Error processing frame: {e}")
                     time.sleep(0.1)
+            finally:
+                if budget is not None:
+                    budget.release(process_time)
+
+    def _count_stale_frame(self):
+        self.stale_frames += 1
+        if self.inference_budget is not None:
+            self.inference_budget.skipped_frames += 1
 
     def generate_output(self):
-        """Thread function to generate annotated output frames"""
+        """Thread function to update zone counts and generate annotated output frames"""
         target_interval = 1.0 / self.target_fps
         last_write_time = time.time()
         
         while not self.stop_event.is_set():
+            if self.count_overrides:
+                self._apply_count_overrides()
             try:
                 # Get processed results with timeout
-                frame, results, timestamp, process_time = self.results_queue.get(timeout=0.1)
-                
-                # Create annotated frame
-                annotated_frame = frame.copy()
-                
-                # Reset current counts for all zones
-                for zone_data in self.polygons.values():
-                    zone_data["current"] = 0
+                frame, results, trace, process_time = self.results_queue.get(timeout=0.1)
                 
-                # Process detections if any
-                if results and hasattr(results[0].boxes, 'id') and results[0].boxes.id is not None:
-                    boxes = results[0].boxes.xywh.cpu().numpy()
-                    track_ids = results[0].boxes.id.cpu().numpy().astype(int)
-                    
-                    # Process each detection
-                    for box, track_id in zip(boxes, track_ids):
-                        x, y, w, h = box
-                        centroid = (int(x), int(y))
-                        
-                        # Check each zone
-                        for zone_id in self.polygons:
-                            is_inside = self.point_in_zone(centroid, zone_id)
-                            
-                            # Initialize track history for this zone
-                            if zone_id not in self.track_history[track_id]:
-                                self.track_history[track_id][zone_id] = []
-                            
-                            # Update track history
-                            self.track_history[track_id][zone_id].append(is_inside)
-                            history = self.track_history[track_id][zone_id]
-                            
-                            # Update counts
-                            if len(history) > 1:
-                                if not history[-2] and history[-1]:  # Entered zone
-                                    self.polygons[zone_id]["entry"] += 1
-                                elif history[-2] and not history[-1]:  # Exited zone
-                                    self.polygons[zone_id]["exit"] += 1
-                            
-                            # Update current count
-                            if is_inside:
-                                self.polygons[zone_id]["current"] += 1
-                            
-                            # Limit history length
-                            if len(history) > 5:
-                                self.track_history[track_id][zone_id].pop(0)
-                        
-                        # Draw detection box
-                        x1, y1 = int(x - w/2), int(y - h/2)
-                        x2, y2 = int(x + w/2), int(y + h/2)
-                        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 1)
-                        cv2.putText(annotated_frame, f"ID: {track_id}", (x1, y1 - 5),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+                # Counting always runs, whether or not anyone is watching
+                boxes, track_ids = self._extract_detections(results)
+                self._count_detections(boxes, track_ids, trace.capture_time)
+                trace.mark("counted")
+                self.latest_trace = trace
                 
-                # Draw zones and counts
-                self._draw_zones(annotated_frame)
-                
-                # Add performance metrics to frame
-                self._add_performance_metrics(annotated_frame, process_time)
+                # Skip the frame copy, drawing and publishing when nobody consumes the output
+                if not self.annotation_active:
+                    self.skipped_annotations += 1
+                    self.annotation_time_saved += self.avg_annotation_time
+                    continue
                 
-                # Get stats to return
-                stats = self._get_stats()
+                start_annotate = time.time()
+                annotated_frame = self._annotate_frame(frame, boxes, track_ids, process_time, trace)
+                trace.mark("annotated")
                 
-                # Put in output queue
-                self.output_queue.put((annotated_frame, stats))
+                self.broadcaster.publish(annotated_frame, trace)
+                self.tracer.record_pipeline(trace)
                 
                 # Write to stream if configured
                 current_time = time.time()
                 if self.output_url and current_time - last_write_time >= target_interval:
                     self._write_to_stream(annotated_frame)
                     last_write_time = current_time
+                for output in self.outputs:
+                    output.write(annotated_frame)
                 
+                # Exponential moving average of the annotation cost, used to estimate time saved
+                annotate_time = time.time() - start_annotate
+                if self.annotated_frames == 0:
+                    self.avg_annotation_time = annotate_time
+                else:
+                    self.avg_annotation_time = 0.9 * self.avg_annotation_time + 0.1 * annotate_time
+                self.annotated_frames += 1
+                
+            except Empty:
+                continue
             except Exception as e:
                 if not self.stop_event.is_set():  # Only print if not stopping
                     print(f"Error generating output: {e}")
                     time.sleep(0.1)
 
+    def _extract_detections(self, results):
+        """Return (xywh boxes, track IDs) from tracking results, or empty arrays."""
+        if results and hasattr(results[0].boxes, 'id') and results[0].boxes.id is not None:
+            boxes = results[0].boxes.xywh.cpu().numpy()
+            track_ids = results[0].boxes.id.cpu().numpy().astype(int)
+            return boxes, track_ids
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=int)
+
+    def _count_detections(self, boxes, track_ids, timestamp=None):
+        """Update per-zone entry, exit and current counts from one frame of tracks."""
+        timestamp = time.time() if timestamp is None else timestamp
+        events = []  # (timestamp, track_id, zone_id, kind) for the event sink
+        self.heatmap.add(boxes[:, :2], timestamp)
+        
+        # One consistent zone configuration for the whole frame, however it is edited meanwhile
+        zones = self.zones
+        if zones is not self.counted_zones:
+            self._forget_edited_zones(zones)
+        counts = zones.counts
+        
+        # Tripwires: one vectorized crossing test for all tracks and lines
+        if self.tripwires.version != zones.version:
+            self.tripwires.set_lines(zones.lines, zones.version)
+        if self.tripwires.zone_ids:
+            entries, exits, crossings = self.tripwires.update(track_ids, boxes[:, :2])
+            for zone_id, entered, exited in zip(self.tripwires.zone_ids, entries, exits):
+                counts[zone_id]["entry"] += int(entered)
+                counts[zone_id]["exit"] += int(exited)
+            events.extend((timestamp, track_id, zone_id, ENTRY if direction == 1 else EXIT)
+                          for track_id, zone_id, direction in crossings)
+        
+        # Polygons: every centroid is looked up in the precompiled zone raster at once
+        inside = zones.inside(boxes[:, :2])
+        for index, zone_id in enumerate(zones.polygon_ids):
+            counts[zone_id]["current"] = int(inside[:, index].sum())
+        
+        # Process each detection
+        for track_id, track_inside in zip(track_ids, inside.tolist()):
+            self.track_last_seen[track_id] = timestamp
+            track_history = self.track_history[track_id]
+            for zone_id, is_inside in zip(zones.polygon_ids, track_inside):
+                # Initialize track history for this zone
+                if zone_id not in track_history:
+                    track_history[zone_id] = []
+                
+                # Update track history
+                history = track_history[zone_id]
+                history.append(is_inside)
+                
+                # Update counts
+                if len(history) > 1:
+                    if not history[-2] and history[-1]:  # Entered zone
+                        counts[zone_id]["entry"] += 1
+                        events.append((timestamp, int(track_id), zone_id, ENTRY))
+                        self.zone_entered[(track_id, zone_id)] = timestamp
+                    elif history[-2] and not history[-1]:  # Exited zone
+                        counts[zone_id]["exit"] += 1
+                        events.append((timestamp, int(track_id), zone_id, EXIT))
+                        entered = self.zone_entered.pop((track_id, zone_id), None)
+                        if entered is not None:  # Tracks first seen inside have no known dwell
+                            zones.dwell[zone_id].add(timestamp - entered)
+                
+                # Limit history length
+                if len(history) > 5:
+                    history.pop(0)
+        
+        if timestamp - self.last_track_prune >= TRACK_PRUNE_INTERVAL:
+            self._prune_track_history(timestamp)
+        if timestamp - self.last_dwell_prune >= 60:
+            self._prune_zone_entered(timestamp)
+        
+        if events and self.event_sink is not None:
+            self.event_sink(events)
+    
+    def _apply_count_overrides(self):
+        """Overwrite the counts editors set explicitly (counting thread, so no increment races them)."""
+        while True:
+            try:
+                zone_id, overrides = self.count_overrides.popleft()
+            except IndexError:
+                return
+            counts = self.zones.counts.get(zone_id)
+            if counts is not None:
+                counts.update(overrides)
+
+    def _forget_edited_zones(self, zones):
+        """Drop per-track state of zones deleted or reshaped since the last counted frame (counting thread)."""
+        previous = self.counted_zones
+        self.counted_zones = zones
+        if previous is None:
+            return
+        edited = {zone_id for zone_id, config in previous.zones.items() if zone_id not in zones.zones
+                  or (zones.zones[zone_id]["points"], zones.zones[zone_id]["type"]) != (config["points"], config["type"])}
+        if not edited:
+            return
+        for history in self.track_history.values():
+            for zone_id in edited & history.keys():
+                del history[zone_id]
+        self.zone_entered = {key: entered for key, entered in self.zone_entered.items() if key[1] not in edited}
+
+    def _prune_track_history(self, timestamp):
+        """Forget the zone history of tracks not seen for TRACK_IDLE_SECONDS (the tracker has dropped them)."""
+        self.last_track_prune = timestamp
+        cutoff = timestamp - TRACK_IDLE_SECONDS
+        lost = [track_id for track_id, seen in self.track_last_seen.items() if seen < cutoff]
+        for track_id in lost:
+            del self.track_last_seen[track_id]
+            self.track_history.pop(track_id, None)
+
+    def _prune_zone_entered(self, timestamp):
+        """Forget entries of tracks lost inside a zone for longer than any dwell the sketches keep."""
+        self.last_dwell_prune = timestamp
+        cutoff = timestamp - MAX_DWELL
+        self.zone_entered = {key: entered for key, entered in self.zone_entered.items() if entered >= cutoff}
+
+    def _annotate_frame(self, frame, boxes, track_ids, process_time, trace):
+        """Return a copy of the frame with detections, zones and metrics drawn on it."""
+        annotated_frame = frame.copy()
+        
+        # Draw detection boxes
+        for (x, y, w, h), track_id in zip(boxes, track_ids):
+            x1, y1 = int(x - w/2), int(y - h/2)
+            x2, y2 = int(x + w/2), int(y + h/2)
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 1)
+            cv2.putText(annotated_frame, f"ID: {track_id}", (x1, y1 - 5),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        
+        # Draw zones and counts
+        self._draw_zones(annotated_frame)
+        
+        # Add performance metrics to frame
+        self._add_performance_metrics(annotated_frame, process_time)
+        if self.debug_overlay:
+            self._draw_trace_overlay(annotated_frame, trace)
+        return annotated_frame
+
+    @property
+    def annotation_active(self):
+        """True while a viewer or stream output consumes annotated frames."""
+        return (self.broadcaster.subscriber_count > 0 or self.output_url is not None or bool(self.outputs))
+
+    def annotation_metrics(self):
+        """Return viewer counts and how much annotation work was skipped."""
+        return {
+            'subscribers': self.broadcaster.subscriber_count,
+            'variants': self.broadcaster.variant_counts(),
+            'annotating': self.annotation_active,
+            'annotated_frames': self.annotated_frames,
+            'skipped_frames': self.skipped_annotations,
+            'avg_annotation_ms': round(self.avg_annotation_time * 1000, 2),
+            'time_saved_s': round(self.annotation_time_saved, 2)
+        }
+
+    def capture_metrics(self):
+        """Return the capture's frame rates, skipped retrieves and decode CPU."""
+        return self.capture.metrics() if self.capture is not None else None
+
+    def current_stats(self):
+        """Return the live zone stats and the trace of the frame they were counted from."""
+        return self._get_stats(), self.latest_trace
+
     def _write_to_stream(self, frame):
         """Write frame to output stream"""
         if self.writer is None:
@@ -352,66 +639,56 @@ class PeopleCounterNew:
 
     def _draw_zones(self, frame):
         """Draw zones and their stats on the frame."""
-        for zone_id, zone_data in self.polygons.items():
-            points = self.polygon_arrays[zone_id]
-            
-            # Draw zone polygon
-            cv2.polylines(frame, [points], True, (255, 0, 0), 2)
-            
-            # Calculate centroid for text placement
-            centroid = np.mean(points, axis=0).astype(int)
-            
-            # Draw zone information
-            info = [
-                zone_data["name"],
-                f"In: {zone_data['entry']} Out: {zone_data['exit']}",
-                f"Current: {zone_data['current']}"
-            ]
-            
-            for i, text in enumerate(info):
-                cv2.putText(frame, text, (centroid[0], centroid[1] + i*15 - 20),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+        # Static geometry and names come from the cached overlay, only counts are drawn here
+        self.zone_compositor.render(frame, self.zones)
 
     def _add_performance_metrics(self, frame, process_time):
         """Add performance metrics to the frame"""
         # Calculate fps
         if self.processing_times:
-            avg_process_time = np.mean(self.processing_times)
+            avg_process_time = self.processing_time_total / len(self.processing_times)
             self.output_fps = 1.0 / avg_process_time if avg_process_time > 0 else 0
         
         # Add text to frame
         metrics = [
             f"FPS: {self.output_fps:.1f}",
             f"Process time: {process_time*1000:.1f}ms",
-            f"Queue sizes: {self.frame_queue.qsize()}/{self.results_queue.qsize()}/{self.output_queue.qsize()}"
+            f"Queue sizes: {self.frame_queue.qsize()}/{self.results_queue.qsize()}"
         ]
         
         for i, text in enumerate(metrics):
             cv2.putText(frame, text, (10, 20 + i*20),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
 
+    def _draw_trace_overlay(self, frame, trace):
+        """Draw the frame's trace ID and per-stage latencies (debug overlay)."""
+        stages = trace.stages
+        lines = [
+            f"Trace #{trace.trace_id}",
+            f"Capture queue: {(stages['inference_start'] - stages['capture'])*1000:.1f}ms",
+            f"Inference: {(stages['inference_end'] - stages['inference_start'])*1000:.1f}ms",
+            f"Results queue: {(stages['counted'] - stages['inference_end'])*1000:.1f}ms",
+            f"Frame age: {trace.age()*1000:.1f}ms",
+        ]
+        
+        height = frame.shape[0]
+        for i, text in enumerate(lines):
+            cv2.putText(frame, text, (10, height - 20 - (len(lines) - 1 - i)*20),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
     def _get_stats(self):
         """Get current statistics for all zones."""
+        zones = self.zones
         return {
             zone_id: {
-                'name': data['name'],
-                'entry': data['entry'],
-                'exit': data['exit'],
-                'current': data['current']
-            } for zone_id, data in self.polygons.items()
+                'name': config['name'],
+                'entry': zones.counts[zone_id]['entry'],
+                'exit': zones.counts[zone_id]['exit'],
+                'current': zones.counts[zone_id]['current'],
+                **({'dwell': zones.dwell[zone_id].summary()} if zone_id in zones.dwell else {})
+            } for zone_id, config in zones.zones.items()
         }
 
-    def process_frame(self):
-        """Process a single frame and return the annotated frame with stats (non-threaded version)."""
-        # Check if there's a processed frame available
-        try:
-            # Non-blocking get
-            frame, stats = self.output_queue.get_nowait()
-            return frame, stats
-        except:
-            # Return placeholder if no processed frame is available
-            return None, self._get_stats()
-
     def monitor_performance(self):
         """Thread function to monitor and print performance metrics"""
         while not self.stop_event.is_set():
@@ -419,18 +696,32 @@ class PeopleCounterNew:
             
             # Calculate metrics
             if self.processing_times:
-                avg_process_time = np.mean(self.processing_times)
+                avg_process_time = self.processing_time_total / len(self.processing_times)
                 avg_fps = 1.0 / avg_process_time if avg_process_time > 0 else 0
                 elapsed = time.time() - self.start_time
                 overall_fps = self.frame_count / elapsed if elapsed > 0 else 0
                 
                 queue_status = (
                     f"Capture queue: {self.frame_queue.qsize()}/{self.frame_queue.maxsize}, "
-                    f"Results queue: {self.results_queue.qsize()}/{self.results_queue.maxsize}, "
-                    f"Output queue: {self.output_queue.qsize()}/{self.output_queue.maxsize}"
+                    f"Results queue: {self.results_queue.qsize()}/{self.results_queue.maxsize}"
                 )
                 
                 print(f"Performance: {avg_fps:.1f} FPS (instant), {overall_fps:.1f} FPS (average)")
                 print(f"Processing time: {avg_process_time*1000:.1f}ms per frame")
                 print(queue_status)
+                print(f"Stale frames skipped: {self.stale_frames}")
+                capture = self.capture_metrics()
+                if capture is not None:
+                    print(f"Capture: source {capture['source_fps']:.1f} FPS, "
+                          f"{capture['skipped_retrieves']} frames grabbed without retrieving, "
+                          f"decode CPU {capture['decode_cpu_percent']:.0f}% "
+                          f"({capture['decode_cpu_ms_per_frame']:.1f}ms per frame)")
+                print(f"Viewers: {self.broadcaster.subscriber_count}, annotation skipped for "
+                      f"{self.skipped_annotations} frames (~{self.annotation_time_saved:.1f}s saved)")
+                
+                latency = self.tracer.summary()
+                for span in ("capture_to_display", "capture_to_persist"):
+                    if latency[span]:
+                        print(f"Latency {span}: p50 {latency[span]['p50_ms']:.1f}ms, "
+                              f"p99 {latency[span]['p99_ms']:.1f}ms")
                 print("-" * 50)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+ENTRY_OVERHEAD = 200  # Approximate bytes of bookkeeping per entry besides its body
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of serialized responses, bounded by total bytes.
+
+    Entries are tagged with the camera and time window they were computed
+    from, so writes into the past (edge ingest) and edits only drop the
+    entries they affect. Entries put with a `ttl` expire after that many
+    seconds (live-edge windows); the others stay until evicted or
+    invalidated (fully historical windows).
+
+    A response computed while an invalidation happened may be stale, so put()
+    takes the `generation` read before computing and ignores the response if
+    the cache was invalidated since.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.generation = 0  # Bumped by every invalidation
+        self._entries = OrderedDict()  # {key: (body, expires_at, camera_id, start, end)}, least recent first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached body, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, body, generation, ttl=None, camera_id=None, start=None, end=None):
+        """Cache `body` (bytes) computed for `camera_id` over [start, end] (epoch seconds, None: unbounded)."""
+        size = len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + ttl if ttl is not None else None
+            self._entries[key] = (body, expires_at, camera_id,
+                                  -math.inf if start is None else start, math.inf if end is None else end)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, camera_id=None, start=None, end=None):
+        """Drop the entries of `camera_id` (all cameras if None) whose window overlaps [start, end]."""
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            stale = [key for key, (_, _, entry_camera, entry_start, entry_end) in self._entries.items()
+                     if (camera_id is None or entry_camera == camera_id) and entry_start <= end and entry_end >= start]
+            for key in stale:
+                self._remove(key)
+            return len(stale)
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, key):
+        body = self._entries.pop(key)[0]
+        self._bytes -= len(body) + ENTRY_OVERHEAD
@@ -0,0 +1,117 @@
+import numpy as np
+
+
+class TripwireCounter:
+    """Directional line-crossing counter for all tripwire zones of one camera.
+
+    Each tripwire is a segment from its first to its second point. Looking along it
+    on screen (image y axis pointing down), crossing from its right-hand side to
+    its left-hand side counts as an entry and the opposite as an exit; reverse the
+    points to flip the direction.
+
+    A track is only considered to be on a side once its centroid is more than
+    `hysteresis` pixels from the line, and a crossing is counted when the
+    committed side flips and the segment from the last committed position
+    (anchor) to the current centroid intersects the tripwire. Tracks jittering
+    along the line therefore never count, and all tracks are tested against all
+    tripwires in one NumPy pass per frame.
+    """
+
+    def __init__(self, hysteresis=8.0, max_idle_frames=300):
+        self.hysteresis = hysteresis
+        self.max_idle_frames = max_idle_frames
+        self.zone_ids = []
+        self.version = None  # Zones version the lines were built from
+        self._starts = np.empty((0, 2))
+        self._directions = np.empty((0, 2))
+        self._lengths = np.empty(0)
+        self._tracks = {}  # {track_id: (sides (K,) int8, anchors (K, 2), last seen frame)}
+        self._frame_index = 0
+
+    def set_lines(self, lines, version=None):
+        """Rebuild the tripwire arrays from {zone_id: [[x1, y1], [x2, y2]]}.
+
+        Per-track state is kept for tripwires that still exist.
+        """
+        old_index = {zone_id: i for i, zone_id in enumerate(self.zone_ids)}
+        self.zone_ids = list(lines)
+        segments = np.array([lines[zone_id] for zone_id in self.zone_ids], dtype=np.float64).reshape(-1, 2, 2)
+        self._starts = segments[:, 0]
+        self._directions = segments[:, 1] - segments[:, 0]
+        self._lengths = np.maximum(np.linalg.norm(self._directions, axis=1), 1e-9)
+        self.version = version
+
+        # Carry committed sides and anchors over to the new line order
+        keep = [(new, old_index[zone_id]) for new, zone_id in enumerate(self.zone_ids) if zone_id in old_index]
+        new_cols = np.array([new for new, _ in keep], dtype=int)
+        old_cols = np.array([old for _, old in keep], dtype=int)
+        for track_id, (sides, anchors, last_seen) in self._tracks.items():
+            new_sides = np.zeros(len(self.zone_ids), dtype=np.int8)
+            new_anchors = np.zeros((len(self.zone_ids), 2))
+            new_sides[new_cols] = sides[old_cols]
+            new_anchors[new_cols] = anchors[old_cols]
+            self._tracks[track_id] = (new_sides, new_anchors, last_seen)
+
+    def update(self, track_ids, centroids):
+        """Advance all tracks by one frame.
+
+        Returns (entries, exits, crossings): arrays with the number of crossings per
+        tripwire in `zone_ids` order, and a list of (track_id, zone_id, direction)
+        with direction 1 for an entry and -1 for an exit.
+        """
+        num_lines = len(self.zone_ids)
+        self._frame_index += 1
+        if num_lines == 0 or len(track_ids) == 0:
+            self._prune()
+            return np.zeros(num_lines, dtype=int), np.zeros(num_lines, dtype=int), []
+
+        points = np.asarray(centroids, dtype=np.float64)  # (N, 2)
+
+        # Previous committed sides/anchors; new tracks start undecided at their first position
+        sides = np.zeros((len(track_ids), num_lines), dtype=np.int8)
+        anchors = np.repeat(points[:, None, :], num_lines, axis=1)  # (N, K, 2)
+        for i, track_id in enumerate(track_ids):
+            state = self._tracks.get(track_id)
+            if state is not None:
+                sides[i] = state[0]
+                anchors[i] = state[1]
+
+        # Signed distance of every centroid to every tripwire: (N, K)
+        offsets = points[:, None, :] - self._starts[None, :, :]
+        distance = (self._directions[:, 0] * offsets[..., 1]
+                    - self._directions[:, 1] * offsets[..., 0]) / self._lengths
+        new_sides = np.where(distance > self.hysteresis, 1,
+                             np.where(distance < -self.hysteresis, -1, 0)).astype(np.int8)
+
+        flipped = (sides != 0) & (new_sides != 0) & (new_sides != sides)
+
+        # Anchor -> centroid must pass between the tripwire's endpoints
+        motion = points[:, None, :] - anchors  # (N, K, 2)
+        to_start = self._starts[None, :, :] - anchors
+        to_end = (self._starts + self._directions)[None, :, :] - anchors
+        side_of_start = motion[..., 0] * to_start[..., 1] - motion[..., 1] * to_start[..., 0]
+        side_of_end = motion[..., 0] * to_end[..., 1] - motion[..., 1] * to_end[..., 0]
+        crossed = flipped & (side_of_start * side_of_end <= 0)
+
+        entries = np.count_nonzero(crossed & (sides == 1), axis=0)
+        exits = np.count_nonzero(crossed & (sides == -1), axis=0)
+        rows, cols = np.nonzero(crossed)
+        crossings = [(int(track_ids[row]), self.zone_ids[col], int(sides[row, col]))
+                     for row, col in zip(rows, cols)]
+
+        # Commit sides and anchors only where the track is clear of the hysteresis band
+        committed = new_sides != 0
+        sides = np.where(committed, new_sides, sides)
+        anchors = np.where(committed[..., None], points[:, None, :], anchors)
+        for i, track_id in enumerate(track_ids):
+            self._tracks[track_id] = (sides[i], anchors[i], self._frame_index)
+
+        self._prune()
+        return entries, exits, crossings
+
+    def _prune(self):
+        """Drop state of tracks that have not been seen for a while."""
+        if self._frame_index % 100:
+            return
+        cutoff = self._frame_index - self.max_idle_frames
+        self._tracks = {track_id: state for track_id, state in self._tracks.items() if state[2] >= cutoff}
@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+
+class ZoneCompositor:
+    """Draws zones onto frames from a cached overlay of the static geometry.
+
+    Zone outlines and names only change when zones are edited, so they are rendered
+    once into an overlay and copied onto each frame through a cached pixel mask.
+    Only the live entry/exit/current text is drawn per frame.
+    """
+
+    def __init__(self, color=(255, 0, 0), thickness=2):
+        self.color = color
+        self.thickness = thickness
+        self._key = None  # (zones version, frame shape) the cache was built for
+        self._indices = None  # Flat pixel indices covered by the overlay
+        self._pixels = None  # Overlay colors at those indices
+        self._label_positions = {}  # {zone_id: (x, y)} of the zone's text block
+
+    def invalidate(self):
+        """Force a rebuild on the next frame."""
+        self._key = None
+
+    def rebuild(self, frame_shape, zones):
+        """Pre-render the outlines and names of a ZoneSnapshot's zones into the cached overlay."""
+        height, width = frame_shape[:2]
+        overlay = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        self._label_positions = {}
+
+        for zone_id, zone_data in zones.zones.items():
+            points = zones.arrays[zone_id]
+            is_line = zone_data["type"] == "line"
+            cv2.polylines(overlay, [points], not is_line, self.color, self.thickness)
+            cv2.polylines(mask, [points], not is_line, 255, self.thickness)
+            if is_line:
+                self._draw_entry_arrow(overlay, mask, points)
+
+            # Text block is anchored at the zone centroid
+            centroid = np.mean(points, axis=0).astype(int)
+            position = (int(centroid[0]), int(centroid[1]))
+            self._label_positions[zone_id] = position
+
+            name_origin = (position[0], position[1] - 20)
+            cv2.putText(overlay, zone_data["name"], name_origin,
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, self.color, 2)
+            cv2.putText(mask, zone_data["name"], name_origin,
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, 255, 2)
+
+        self._indices = np.flatnonzero(mask)
+        self._pixels = overlay.reshape(-1, 3)[self._indices]
+
+    def _draw_entry_arrow(self, overlay, mask, points):
+        """Mark a tripwire's entry direction with an arrow from its midpoint."""
+        start, end = points[0].astype(float), points[1].astype(float)
+        direction = end - start
+        length = np.linalg.norm(direction)
+        if length == 0:
+            return
+        # Entries cross towards the on-screen left-hand side of start -> end
+        normal = np.array([direction[1], -direction[0]]) / length
+        tail = (start + end) / 2
+        tip = tail + normal * 25
+        tail, tip = tuple(tail.astype(int).tolist()), tuple(tip.astype(int).tolist())
+        cv2.arrowedLine(overlay, tail, tip, self.color, self.thickness, tipLength=0.4)
+        cv2.arrowedLine(mask, tail, tip, 255, self.thickness, tipLength=0.4)
+
+    def render(self, frame, zones):
+        """Blend the static overlay of a ZoneSnapshot onto `frame` and draw the live counts."""
+        key = (zones.version, frame.shape)
+        if key != self._key:
+            self.rebuild(frame.shape, zones)
+            self._key = key
+
+        # Copy every overlay pixel in one vectorized assignment
+        frame.reshape(-1, 3)[self._indices] = self._pixels
+
+        for zone_id, (x, y) in self._label_positions.items():
+            counts = zones.counts[zone_id]
+            cv2.putText(frame, f"In: {counts['entry']} Out: {counts['exit']}", (x, y - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, self.color, 2)
+            cv2.putText(frame, f"Current: {counts['current']}", (x, y + 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, self.color, 2)
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+
+class ZoneSnapshot:
+    """Compiled zone configuration of one camera, never modified once built.
+
+    Zone edits build a new snapshot and publish it by replacing the counter's
+    reference, so the counting thread reads one consistent configuration per
+    frame without locking. Polygon membership is precompiled into a raster of
+    region labels (one label per distinct set of overlapping polygons), so the
+    zones of all centroids are looked up with one indexing operation instead of
+    one pointPolygonTest per track and zone.
+
+    `counts` ({zone_id: {entry, exit, current}}) and `dwell` ({zone_id:
+    DwellSketch}) hold live state: their per-zone values are shared with the
+    next snapshot when a zone is carried over, so counting continues across
+    edits.
+    """
+
+    def __init__(self, zones=None, counts=None, dwell=None, version=0, frame_size=(1280, 720)):
+        self.zones = zones or {}  # {zone_id: {points: [[x, y]], name: str, type: str}}
+        self.counts = counts or {}
+        self.dwell = dwell or {}
+        self.version = version
+        self.frame_size = frame_size
+        self.arrays = {}  # {zone_id: (K, 2) int32 points}
+        for zone_id, config in self.zones.items():
+            points = np.array(config['points'], dtype=np.int32).reshape(-1, 2)
+            points.flags.writeable = False
+            self.arrays[zone_id] = points
+        self.polygon_ids = tuple(zone_id for zone_id, config in self.zones.items() if config['type'] != 'line')
+        self.lines = {zone_id: config['points'] for zone_id, config in self.zones.items() if config['type'] == 'line'}
+        self.raster, self.membership = self._rasterize()
+
+    def _rasterize(self):
+        """Return the (height, width) region labels and the (regions, polygons) membership matrix."""
+        width, height = self.frame_size
+        raster = np.zeros((height, width), dtype=np.int32)
+        regions = [np.zeros(len(self.polygon_ids), dtype=bool)]  # Label 0: inside no zone
+        for index, zone_id in enumerate(self.polygon_ids):
+            points = self.arrays[zone_id]
+            x, y, w, h = cv2.boundingRect(points)
+            x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            local = points - np.array([x0, y0], dtype=np.int32)
+            mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+            cv2.fillPoly(mask, [local], 1)
+            # fillPoly's rasterization of the edges differs from pointPolygonTest by up to a pixel,
+            # so pixels along the edges are settled with the exact test
+            edges = np.zeros_like(mask)
+            cv2.polylines(edges, [local], True, 1, 3)
+            for row, column in zip(*(index.tolist() for index in np.nonzero(edges))):
+                mask[row, column] = cv2.pointPolygonTest(local, (column, row), False) >= 0
+            window = raster[y0:y1, x0:x1]
+            covered = mask.astype(bool)
+
+            # Every region the polygon overlaps is split into a new region that also includes it
+            labels, inverse = np.unique(window[covered], return_inverse=True)
+            for label in labels:
+                region = regions[label].copy()
+                region[index] = True
+                regions.append(region)
+            window[covered] = (len(regions) - len(labels) + inverse).astype(np.int32)
+        raster.flags.writeable = False
+        return raster, np.array(regions).reshape(len(regions), len(self.polygon_ids))
+
+    def inside(self, centroids):
+        """(N, polygons) bool matrix of which polygon zones, in `polygon_ids` order, contain each centroid.
+
+        Centroids are truncated to pixels and tested like cv2.pointPolygonTest
+        (edges count as inside); points outside the frame are inside no zone.
+        """
+        xs = centroids[:, 0].astype(np.intp)
+        ys = centroids[:, 1].astype(np.intp)
+        width, height = self.frame_size
+        valid = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        labels = np.zeros(len(xs), dtype=np.intp)
+        labels[valid] = self.raster[ys[valid], xs[valid]]
+        return self.membership[labels]
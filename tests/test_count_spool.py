@@ -0,0 +1,65 @@
+import gzip
+import json
+import os
+
+from modules.count_spool import CountSpool
+
+
+def rows(zone_id, count, start=0.0):
+    return [(zone_id, start + i, i, i // 2, i % 5) for i in range(count)]
+
+
+def test_seal_writes_a_batch_and_ack_removes_it(tmp_path):
+    spool = CountSpool(str(tmp_path), 'edge-1')
+    assert spool.seal() is None
+    spool.append(rows(1, 3))
+    path = spool.seal()
+    assert spool.pending() == [path]
+    payload = json.loads(gzip.decompress(spool.read(path)))
+    assert payload['worker'] == 'edge-1' and payload['batch_id'].startswith('edge-1-')
+    assert [tuple(row) for row in payload['rows']] == rows(1, 3)
+    spool.ack(path)
+    spool.ack(path)  # Already gone
+    assert spool.pending() == []
+
+
+def test_batches_pending_oldest_first(tmp_path):
+    spool = CountSpool(str(tmp_path), 'edge-1')
+    paths = []
+    for zone_id in range(5):
+        spool.append(rows(zone_id, 1))
+        paths.append(spool.seal())
+    assert spool.pending() == paths
+
+
+def test_size_limit_drops_oldest_batches(tmp_path):
+    spool = CountSpool(str(tmp_path), 'edge-1')
+    spool.append(rows(1, 200))
+    batch_size = os.path.getsize(spool.seal())
+    spool.max_bytes = int(batch_size * 3.5)
+    paths = []
+    for zone_id in range(2, 7):
+        spool.append(rows(zone_id, 200))
+        paths.append(spool.seal())
+    pending = spool.pending()
+    assert pending == paths[-len(pending):]  # The newest are kept
+    assert sum(os.path.getsize(path) for path in pending) <= spool.max_bytes
+    assert spool.batches_dropped == 6 - len(pending)
+    assert spool.metrics()['pending_batches'] == len(pending)
+
+
+def test_last_counts_survive_a_restart(tmp_path):
+    spool = CountSpool(str(tmp_path), 'edge-1')
+    spool.append([(1, 10.0, 5, 3, 2), (2, 10.0, 1, 0, 1), (1, 11.0, 6, 3, 3)])
+    spool.seal()
+    spool.append([(2, 12.0, 2, 1, 1)])
+    spool.seal()
+    restarted = CountSpool(str(tmp_path), 'edge-1')
+    assert restarted.last_counts() == {1: (6, 3, 3), 2: (2, 1, 1)}
+    # Not a batch, and not dropped by the size limit
+    assert all(path.endswith('.json.gz') for path in restarted.pending())
+
+
+def test_unreadable_last_counts_are_ignored(tmp_path):
+    (tmp_path / CountSpool.LAST_COUNTS).write_text('{not json')
+    assert CountSpool(str(tmp_path), 'edge-1').last_counts() == {}
@@ -0,0 +1,64 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from modules.dwell_sketch import DwellSketch
+
+
+def exact_quantile(values, q):
+    """The value at the rank DwellSketch.quantile estimates."""
+    return np.sort(values)[math.floor(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.02, 0.05])
+def test_quantiles_within_relative_accuracy(accuracy):
+    rng = np.random.default_rng(0)
+    values = np.clip(rng.lognormal(mean=3.0, sigma=1.5, size=20000), 0.1, 6 * 3600)
+    sketch = DwellSketch(accuracy=accuracy)
+    for value in values:
+        sketch.add(value)
+    for q in (0.0, 0.1, 0.5, 0.9, 0.99, 0.999, 1.0):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= accuracy * exact + 1e-9
+
+
+def test_count_mean_and_max_are_exact():
+    sketch = DwellSketch()
+    for value in (0.01, 2.5, 40.0, 10 * 3600):  # Below and above the bucket range too
+        sketch.add(value)
+    assert sketch.count == 4
+    assert sketch.mean == pytest.approx((0.01 + 2.5 + 40.0 + 10 * 3600) / 4)
+    assert sketch.max == 10 * 3600
+    assert sketch.quantile(1.0) <= sketch.max
+
+
+def test_empty_sketch():
+    sketch = DwellSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.summary() == {'count': 0, 'mean_s': None, 'p50_s': None, 'p90_s': None, 'p99_s': None,
+                                'max_s': None}
+
+
+def test_merge_matches_one_sketch_of_all_values():
+    rng = np.random.default_rng(1)
+    first, second = rng.exponential(30.0, 5000), rng.exponential(300.0, 5000)
+    merged, combined, other = DwellSketch(), DwellSketch(), DwellSketch()
+    for value in first:
+        merged.add(value)
+        combined.add(value)
+    for value in second:
+        other.add(value)
+        combined.add(value)
+    merged.merge(other)
+    assert merged.summary() == combined.summary()
+
+
+def test_dict_round_trip():
+    sketch = DwellSketch()
+    for value in (1.0, 5.0, 5.0, 120.0):
+        sketch.add(value)
+    restored = DwellSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.summary() == sketch.summary()
+    assert np.array_equal(restored._buckets, sketch._buckets)
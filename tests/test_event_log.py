@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from modules.event_log import ENTRY, EXIT, MAX_BUCKETS, EventLog
+
+HOUR = 3600.0
+T0 = 1740830400.0  # 2025-03-01 12:00 UTC
+
+
+def test_events_are_written_to_hourly_files(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append([(T0 + HOUR + 5, 2, 1, EXIT), (T0 + 10, 1, 1, ENTRY), (T0 + HOUR - 1, 3, 2, ENTRY)])
+    log.flush()
+    assert sorted(os.listdir(tmp_path)) == ['events-2025030112.bin', 'events-2025030113.bin']
+    assert log.query(T0, T0 + 2 * HOUR)['track_id'].tolist() == [1, 3, 2]
+    assert log.events_written == 3
+
+
+def test_query_range_is_inclusive_and_filters_zones(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append([(T0 + second, second, second % 3, ENTRY) for second in range(100)])
+    log.flush()
+    assert log.query(T0 + 10, T0 + 20)['track_id'].tolist() == list(range(10, 21))
+    assert log.query(T0 + 10, T0 + 20, zone_ids=[0])['track_id'].tolist() == [12, 15, 18]
+    assert log.query(T0 + 200, T0 + 300).size == 0
+
+
+def test_out_of_order_flushes_are_still_queried_correctly(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append([(T0 + 50, 1, 1, ENTRY)])
+    log.flush()
+    log.append([(T0 + 20, 2, 1, ENTRY), (T0 + 60, 3, 1, EXIT)])
+    log.flush()
+    assert sorted(log.query(T0 + 10, T0 + 55)['track_id'].tolist()) == [1, 2]
+
+
+def test_aggregate_totals_and_buckets(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append([(T0 + 5, 1, 1, ENTRY), (T0 + 65, 1, 1, EXIT), (T0 + 70, 2, 1, ENTRY), (T0 + 10, 3, 2, EXIT)])
+    log.flush()
+    assert log.aggregate(T0, T0 + 119) == {1: {'entries': 2, 'exits': 1}, 2: {'entries': 0, 'exits': 1}}
+    buckets = log.aggregate(T0, T0 + 119, zone_ids=[1], bucket_seconds=60)
+    assert buckets == {1: {'buckets': [T0, T0 + 60], 'entries': [1, 1], 'exits': [0, 1]}}
+
+
+def test_aggregate_rejects_bad_buckets(tmp_path):
+    log = EventLog(str(tmp_path))
+    with pytest.raises(ValueError):
+        log.aggregate(T0, T0 + 60, bucket_seconds=0)
+    with pytest.raises(ValueError):
+        log.aggregate(T0, T0 + MAX_BUCKETS, bucket_seconds=1)
+    assert log.aggregate(T0, T0 + MAX_BUCKETS - 1, bucket_seconds=1) == {}
+
+
+def test_read_only_log_creates_nothing(tmp_path):
+    directory = tmp_path / 'camera-7'
+    log = EventLog(str(directory), read_only=True)
+    assert log.query(T0, T0 + HOUR).size == 0
+    assert log.aggregate(T0, T0 + HOUR) == {}
+    assert not directory.exists()
@@ -0,0 +1,74 @@
+import pytest
+
+from modules import response_cache
+from modules.response_cache import ENTRY_OVERHEAD, ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for the cache module."""
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResponseCache(max_bytes=3 * (100 + ENTRY_OVERHEAD))
+    for key in 'abc':
+        cache.put(key, b'x' * 100, cache.generation)
+    assert cache.get('a') is not None  # 'b' is now least recently used
+    cache.put('d', b'x' * 100, cache.generation)
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in 'acd')
+    assert cache.metrics()['evictions'] == 1
+    assert cache.metrics()['bytes'] == 3 * (100 + ENTRY_OVERHEAD)
+
+
+def test_body_larger_than_the_cache_is_not_stored():
+    cache = ResponseCache(max_bytes=1000)
+    cache.put('small', b'x' * 10, cache.generation)
+    cache.put('huge', b'x' * 1000, cache.generation)
+    assert cache.get('huge') is None
+    assert cache.get('small') is not None
+
+
+def test_ttl_expiry(clock):
+    cache = ResponseCache()
+    cache.put('live', b'1', cache.generation, ttl=2.0)
+    cache.put('historical', b'2', cache.generation)
+    clock[0] += 1.9
+    assert cache.get('live') == b'1'
+    clock[0] += 0.1
+    assert cache.get('live') is None
+    assert cache.get('historical') == b'2'
+    assert cache.metrics()['expirations'] == 1
+    assert cache.metrics()['bytes'] == 1 + ENTRY_OVERHEAD
+
+
+def test_put_after_invalidation_is_ignored():
+    cache = ResponseCache()
+    generation = cache.generation
+    cache.invalidate(camera_id=1)
+    cache.put('stale', b'x', generation)
+    assert cache.get('stale') is None
+
+
+def test_invalidate_only_overlapping_windows_of_the_camera():
+    cache = ResponseCache()
+    cache.put('early', b'x', cache.generation, camera_id=1, start=0, end=100)
+    cache.put('late', b'x', cache.generation, camera_id=1, start=200, end=300)
+    cache.put('open', b'x', cache.generation, camera_id=1, start=250)
+    cache.put('other', b'x', cache.generation, camera_id=2, start=0, end=300)
+    assert cache.invalidate(camera_id=1, start=150, end=260) == 2
+    assert cache.get('early') is not None and cache.get('other') is not None
+    assert cache.get('late') is None and cache.get('open') is None
+    assert cache.invalidate() == 2
+
+
+def test_replacing_a_key_keeps_the_byte_count():
+    cache = ResponseCache()
+    cache.put('key', b'x' * 10, cache.generation)
+    cache.put('key', b'x' * 20, cache.generation)
+    assert cache.get('key') == b'x' * 20
+    assert cache.metrics()['entries'] == 1
+    assert cache.metrics()['bytes'] == 20 + ENTRY_OVERHEAD
@@ -0,0 +1,78 @@
+import numpy as np
+
+from modules.tripwire import TripwireCounter
+
+# Horizontal line along +x: below it (larger y) is its right-hand side, so moving up is an entry
+LINE = [[0, 100], [200, 100]]
+
+
+def walk(counter, track_id, ys, x=100):
+    """Feed one track's positions frame by frame; returns total (entries, exits)."""
+    entries = exits = 0
+    for y in ys:
+        line_entries, line_exits, _ = counter.update([track_id], np.array([[x, y]], dtype=float))
+        entries += int(line_entries.sum())
+        exits += int(line_exits.sum())
+    return entries, exits
+
+
+def test_crossing_direction():
+    counter = TripwireCounter(hysteresis=8.0)
+    counter.set_lines({1: LINE})
+    assert walk(counter, 1, [150, 120, 80, 50]) == (1, 0)
+    assert walk(counter, 2, [50, 80, 120, 150]) == (0, 1)
+
+
+def test_crossings_report_track_zone_and_direction():
+    counter = TripwireCounter()
+    counter.set_lines({7: LINE})
+    counter.update([3], np.array([[100, 150]], dtype=float))
+    _, _, crossings = counter.update([3], np.array([[100, 50]], dtype=float))
+    assert crossings == [(3, 7, 1)]
+
+
+def test_jitter_inside_hysteresis_band_never_counts():
+    counter = TripwireCounter(hysteresis=8.0)
+    counter.set_lines({1: LINE})
+    jitter = [150] + [100 + offset for offset in (-7, 7, -5, 6, -7, 3, -2, 7)] * 10
+    assert walk(counter, 1, jitter) == (0, 0)
+
+
+def test_jitter_after_crossing_counts_once():
+    counter = TripwireCounter(hysteresis=8.0)
+    counter.set_lines({1: LINE})
+    assert walk(counter, 1, [150, 50] + [100 + offset for offset in (7, -7)] * 10) == (1, 0)
+
+
+def test_crossing_beyond_the_endpoints_is_ignored():
+    counter = TripwireCounter()
+    counter.set_lines({1: LINE})
+    assert walk(counter, 1, [150, 50], x=300) == (0, 0)
+
+
+def test_start_inside_band_is_undecided():
+    counter = TripwireCounter(hysteresis=8.0)
+    counter.set_lines({1: LINE})
+    # First committed side is the far one, so there is nothing to cross
+    assert walk(counter, 1, [103, 50]) == (0, 0)
+
+
+def test_idle_tracks_are_pruned():
+    counter = TripwireCounter(max_idle_frames=300)
+    counter.set_lines({1: LINE})
+    counter.update([1], np.array([[100, 150]], dtype=float))
+    for _ in range(299):
+        counter.update([], np.empty((0, 2)))
+    assert 1 in counter._tracks
+    for _ in range(100):
+        counter.update([], np.empty((0, 2)))
+    assert counter._tracks == {}
+
+
+def test_set_lines_keeps_state_of_remaining_lines():
+    counter = TripwireCounter()
+    counter.set_lines({1: LINE, 2: [[0, 300], [200, 300]]})
+    counter.update([1], np.array([[100, 150]], dtype=float))
+    counter.set_lines({3: [[500, 0], [500, 200]], 1: LINE})  # Line 2 removed, line 1 reordered
+    entries, exits, _ = counter.update([1], np.array([[100, 50]], dtype=float))
+    assert entries.tolist() == [0, 1] and exits.tolist() == [0, 0]
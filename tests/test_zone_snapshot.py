@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+
+from modules.zone_snapshot import ZoneSnapshot
+
+ZONES = {
+    1: {'name': 'Door', 'type': 'polygon', 'points': [[100, 100], [400, 120], [380, 400], [90, 350]]},
+    2: {'name': 'Aisle', 'type': 'polygon', 'points': [[300, 50], [700, 60], [650, 500], [250, 300]]},
+    3: {'name': 'Corner', 'type': 'polygon', 'points': [[1200, 600], [1400, 600], [1400, 800], [1200, 800]]},
+    4: {'name': 'Line', 'type': 'line', 'points': [[0, 700], [600, 700]]},
+}
+
+
+def point_polygon_test(snapshot, centroids):
+    """Reference membership: one cv2.pointPolygonTest per centroid and polygon."""
+    return np.array([[cv2.pointPolygonTest(snapshot.arrays[zone_id], (int(x), int(y)), False) >= 0
+                      for zone_id in snapshot.polygon_ids] for x, y in centroids], dtype=bool)
+
+
+def test_inside_matches_point_polygon_test():
+    snapshot = ZoneSnapshot(ZONES)
+    rng = np.random.default_rng(0)
+    centroids = rng.uniform([0, 0], [1280, 720], size=(20000, 2))
+    assert np.array_equal(snapshot.inside(centroids), point_polygon_test(snapshot, centroids))
+
+
+def test_inside_matches_on_polygon_edges():
+    snapshot = ZoneSnapshot(ZONES)
+    edges = []
+    for zone_id in snapshot.polygon_ids:
+        points = snapshot.arrays[zone_id].astype(float)
+        for start, end in zip(points, np.roll(points, -1, axis=0)):
+            edges.extend(start + (end - start) * t for t in np.linspace(0, 1, 200))
+    centroids = np.array(edges)
+    centroids = centroids[(centroids[:, 0] < 1280) & (centroids[:, 1] < 720)]
+    assert np.array_equal(snapshot.inside(centroids), point_polygon_test(snapshot, centroids))
+
+
+def test_points_outside_the_frame_are_in_no_zone():
+    snapshot = ZoneSnapshot({5: {'name': 'All', 'type': 'polygon', 'points': [[0, 0], [1279, 0], [1279, 719],
+                                                                              [0, 719]]}})
+    inside = snapshot.inside(np.array([[-1.0, 10.0], [10.0, -1.0], [1280.0, 10.0], [10.0, 720.0], [10.0, 10.0]]))
+    assert inside[:, 0].tolist() == [False, False, False, False, True]
+
+
+def test_lines_and_polygons_are_separated():
+    snapshot = ZoneSnapshot(ZONES)
+    assert snapshot.polygon_ids == (1, 2, 3)
+    assert snapshot.lines == {4: [[0, 700], [600, 700]]}
+    assert snapshot.inside(np.empty((0, 2))).shape == (0, 3)
+
+
+def test_snapshot_arrays_are_read_only():
+    snapshot = ZoneSnapshot(ZONES)
+    assert not snapshot.raster.flags.writeable
+    assert not any(points.flags.writeable for points in snapshot.arrays.values())